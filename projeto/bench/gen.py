@@ -0,0 +1,86 @@
+"""Gerador de programas Pascal sintéticos para benchmarks do compilador."""
+
+
+def statement_list(n, name='Longo'):
+    '''Programa com um único bloco begin ... end de n atribuições/condicionais.'''
+    lines = [f'program {name};', 'var', '  a, b, c: integer;', 'begin', '  a := 0;']
+    for i in range(n):
+        if i % 3 == 0:
+            lines.append(f'  a := a + {i};')
+        elif i % 3 == 1:
+            lines.append(f'  b := (a * 2) - {i} div 3;')
+        else:
+            lines.append('  if a > b then c := a else c := b;')
+    lines.append('  writeln(a, b, c)')
+    lines.append('end.')
+    return '\n'.join(lines) + '\n'
+
+
+def deep_expressions(n, depth=50, name='Profundo'):
+    '''n atribuições, cada uma com uma expressão aninhada com depth níveis de parênteses.'''
+    ops = ('+', '*', '-', 'div')
+    lines = [f'program {name};', 'var', '  a, b: integer;', 'begin', '  a := 1;', '  b := 2;']
+    for i in range(n):
+        expr = 'a'
+        for d in range(depth):
+            op = ops[(i + d) % len(ops)]
+            operand = 'b' if d % 2 else str(d % 7 + 1)
+            expr = f'({expr} {op} {operand})'
+        lines.append(f'  a := {expr} mod 1000;')
+    lines.append('  writeln(a)')
+    lines.append('end.')
+    return '\n'.join(lines) + '\n'
+
+
+def many_subprograms(n, name='Muitos'):
+    '''n funções e procedimentos pequenos, todos chamados a partir do programa principal.'''
+    lines = [f'program {name};', 'var', '  total: integer;']
+    for i in range(n):
+        if i % 2 == 0:
+            lines += [f'function f{i}(x: integer; y: integer): integer;', 'var', '  t: integer;',
+                      'begin', f'  t := x * {i % 13 + 1} + y;',
+                      '  if t > 1000 then t := t mod 1000;', f'  f{i} := t', 'end;']
+        else:
+            lines += [f'procedure p{i}(x: integer);', 'begin',
+                      f'  total := total + x + f{i - 1}(x, {i})', 'end;']
+    lines += ['begin', '  total := 0;']
+    for i in range(n):
+        if i % 2 == 0:
+            lines.append(f'  total := total + f{i}(total, {i});')
+        else:
+            lines.append(f'  p{i}({i});')
+    lines.append('  writeln(total)')
+    lines.append('end.')
+    return '\n'.join(lines) + '\n'
+
+
+def big_arrays(n, size=1000, name='Arrays'):
+    '''n arrays globais de size elementos, preenchidos e somados em ciclos for.'''
+    names = [f'v{i}' for i in range(n)]
+    lines = [f'program {name};', 'var', '  i, s: integer;']
+    lines += [f'  {v}: array[1..{size}] of integer;' for v in names]
+    lines += ['begin', '  s := 0;']
+    for k, v in enumerate(names):
+        lines += [f'  for i := 1 to {size} do', f'    {v}[i] := i * {k + 1};',
+                  f'  for i := {size} downto 1 do', f'    s := s + {v}[i] mod 10;']
+    lines.append('  writeln(s)')
+    lines.append('end.')
+    return '\n'.join(lines) + '\n'
+
+
+def string_heavy(n, name='Textos'):
+    '''n instruções com literais, concatenação, length e indexação de strings.'''
+    lines = [f'program {name};', 'var', '  s, t: string;', '  k: integer;',
+             'begin', "  s := 'abc';", '  k := 0;']
+    for i in range(n):
+        if i % 4 == 0:
+            lines.append(f"  t := s + 'linha {i}';")
+        elif i % 4 == 1:
+            lines.append(f"  writeln('valor ', {i}, ': ', t);")
+        elif i % 4 == 2:
+            lines.append("  if t[1] = 'a' then k := k + length(t);")
+        else:
+            lines.append(f"  s := 'x{i}';")
+    lines.append('  writeln(k)')
+    lines.append('end.')
+    return '\n'.join(lines) + '\n'
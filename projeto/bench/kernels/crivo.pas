@@ -0,0 +1,28 @@
+program Crivo;
+var
+  primo: array[1..5000] of integer;
+  i, j, n, total: integer;
+begin
+  n := 5000;
+  for i := 1 to n do
+    primo[i] := 1;
+  primo[1] := 0;
+  i := 2;
+  while i * i <= n do
+  begin
+    if primo[i] = 1 then
+    begin
+      j := i * i;
+      while j <= n do
+      begin
+        primo[j] := 0;
+        j := j + i;
+      end;
+    end;
+    i := i + 1;
+  end;
+  total := 0;
+  for i := 1 to n do
+    total := total + primo[i];
+  writeln('Primos ate ', n, ': ', total);
+end.
@@ -0,0 +1,14 @@
+program Fibonacci;
+function fib(n: integer): integer;
+begin
+  if n < 2 then
+    fib := n
+  else
+    fib := fib(n - 1) + fib(n - 2);
+end;
+var
+  i: integer;
+begin
+  for i := 1 to 15 do
+    writeln('fib(', i, ') = ', fib(i));
+end.
@@ -0,0 +1,25 @@
+program Matriz;
+var
+  a, b, c: array[0..899] of integer;
+  i, j, k, n, s: integer;
+begin
+  n := 30;
+  for i := 0 to n - 1 do
+    for j := 0 to n - 1 do
+    begin
+      a[i * n + j] := i + j;
+      b[i * n + j] := i - j;
+    end;
+  for i := 0 to n - 1 do
+    for j := 0 to n - 1 do
+    begin
+      s := 0;
+      for k := 0 to n - 1 do
+        s := s + a[i * n + k] * b[k * n + j];
+      c[i * n + j] := s;
+    end;
+  s := 0;
+  for i := 0 to n * n - 1 do
+    s := s + c[i];
+  writeln('Soma de A*B: ', s);
+end.
@@ -0,0 +1,23 @@
+program Numerico;
+var
+  i, j, k, t: integer;
+  h, x, soma: real;
+  grelha: array[0..63] of integer;
+begin
+  soma := 0;
+  h := 1 / 1000;
+  for i := 0 to 999 do
+  begin
+    x := i * h;
+    soma := soma + (4 / (1 + x * x) + 4 / (1 + (x + h) * (x + h))) / 2 * h;
+  end;
+  writeln('pi ~ ', soma);
+  for k := 1 to 40 do
+    for i := 0 to 7 do
+      for j := 0 to 7 do
+        grelha[(i * 8 + j) mod 64] := grelha[i * 8 + j] + (i * j) mod 50 + (i + j) div 15 + k mod 64;
+  t := 0;
+  for i := 0 to 63 do
+    t := t + grelha[i];
+  writeln('grelha: ', grelha[0], ' ', grelha[63], ' total ', t);
+end.
@@ -0,0 +1,32 @@
+program Ordena;
+var
+  v: array[1..300] of integer;
+  i, j, t, semente, continua: integer;
+begin
+  semente := 12345;
+  for i := 1 to 300 do
+  begin
+    semente := (semente * 1103 + 12849) mod 65536;
+    v[i] := semente mod 1000;
+  end;
+  for i := 2 to 300 do
+  begin
+    t := v[i];
+    j := i - 1;
+    continua := 1;
+    while continua = 1 do
+    begin
+      if j < 1 then
+        continua := 0
+      else if v[j] <= t then
+        continua := 0
+      else
+      begin
+        v[j + 1] := v[j];
+        j := j - 1;
+      end;
+    end;
+    v[j + 1] := t;
+  end;
+  writeln(v[1], ' ', v[150], ' ', v[300]);
+end.
@@ -0,0 +1,30 @@
+program Parametros;
+var
+  a: array[1..5] of integer;
+  b: array[0..4] of integer;
+  i: integer;
+function soma(v: array[1..5] of integer): integer;
+var
+  k, t: integer;
+begin
+  t := 0;
+  for k := 1 to 5 do
+    t := t + v[k];
+  soma := t;
+end;
+procedure dobra(v: array[1..5] of integer);
+var
+  k: integer;
+begin
+  for k := 1 to 5 do
+    v[k] := v[k] * 2;
+end;
+begin
+  for i := 1 to 5 do
+    a[i] := i * 10;
+  writeln(soma(a), ' / ', a[2], ' ', a[5]);
+  dobra(a);
+  writeln(soma(a), ' / ', a[1], ' ', a[5]);
+  b := a;
+  writeln(b[0], ' ', b[4]);
+end.
@@ -0,0 +1,38 @@
+program Tabela;
+function potencia(b, e: integer): integer;
+var
+  i, r: integer;
+begin
+  r := 1;
+  for i := 1 to e do
+    r := r * b;
+  potencia := r;
+end;
+function digitos(n: integer): integer;
+var
+  c: integer;
+begin
+  c := 0;
+  repeat
+    c := c + 1;
+    n := n div 10;
+  until n = 0;
+  digitos := c;
+end;
+function fatorial(n: integer): integer;
+begin
+  if n <= 1 then
+    fatorial := 1
+  else
+    fatorial := n * fatorial(n - 1);
+end;
+var
+  i, s: integer;
+begin
+  s := 0;
+  for i := 1 to 3000 do
+    s := (s + i * potencia(3, 7) + digitos(fatorial(10))) mod potencia(10, 6);
+  writeln('soma = ', s);
+  writeln('potencia(2, i) = ', potencia(2, i mod 20));
+  writeln('10! = ', fatorial(10), ', digitos = ', digitos(-fatorial(9)));
+end.
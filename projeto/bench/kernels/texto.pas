@@ -0,0 +1,19 @@
+program Texto;
+var
+  s: string;
+  i, vogais: integer;
+begin
+  s := '';
+  for i := 1 to 200 do
+  begin
+    if i mod 3 = 0 then
+      s := s + 'a'
+    else
+      s := s + 'xy';
+  end;
+  vogais := 0;
+  for i := 1 to length(s) do
+    if s[i] = 'a' then
+      vogais := vogais + 1;
+  writeln('Tamanho ', length(s), ', vogais ', vogais);
+end.
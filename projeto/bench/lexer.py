@@ -0,0 +1,118 @@
+"""Comparação diferencial e benchmark dos backends de lexer (PLY vs. scanner re).
+
+Uso: python -m bench.lexer [--statements 50000] [--repeat 3]
+
+Verifica primeiro que ambos os backends produzem o mesmo fluxo de tokens (tipo, valor,
+grafia, linha e posição) para todos os tests/*.pas e para um programa gerado, e que o
+parser dá a mesma mensagem de erro sintático com o PLY, o backend rápido e o lexer em
+streaming; termina com erro se houver diferenças. Depois mede o tempo de lexing de cada
+backend.
+"""
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+from src.lexer import build_lexer, StreamLexer
+from src.parser import build_parser
+
+from .gen import statement_list
+
+TESTS_DIR = Path(__file__).resolve().parent.parent / 'tests'
+# fonte inválida -> mensagem do parser (o lexema de um ID vem com a grafia original)
+SYNTAX_ERRORS = [
+    ('program t;\nvar a: integer;\nbegin\n  a := ;\nend.\n', "Syntax error at ';' (line 4)"),
+    ('program t;\nbegin\n  writeln(1 Then)\nend.\n', "Syntax error at 'Then' (line 3)"),
+    ('program t;\nbegin\n  writeln(1 2)\nend.\n', "Syntax error at '2' (line 3)"),
+    ("program t;\nbegin\n  writeln('a' 'b')\nend.\n", "Syntax error at 'b' (line 3)"),
+    ('program t;\nbegin\n  writeln(1)\nend\n', 'Unexpected end of input'),
+]
+
+
+def token_stream(source, backend):
+    lexer = build_lexer(backend)
+    lexer.input(source)
+    stream = []
+    while True:
+        tok = lexer.token()
+        if tok is None:
+            return stream
+        stream.append((tok.type, tok.value, getattr(tok, 'spelling', None), tok.lineno, tok.lexpos))
+
+
+def differential(sources):
+    ok = True
+    for name, source in sources:
+        expected = token_stream(source, 'ply')
+        found = token_stream(source, 'fast')
+        if expected != found:
+            ok = False
+            for i, (a, b) in enumerate(zip(expected, found)):
+                if a != b:
+                    print(f'{name}: token {i} differs: ply={a} fast={b}')
+                    break
+            else:
+                print(f'{name}: token counts differ ({len(expected)} vs {len(found)})')
+        else:
+            print(f'{name}: {len(expected)} tokens match')
+    return ok
+
+
+def syntax_error(source, backend):
+    parser = build_parser()
+    try:
+        if backend == 'stream':
+            parser.parse(lexer=StreamLexer(io.StringIO(source)))
+        else:
+            parser.parse(source, lexer=build_lexer(backend))
+    except SyntaxError as exc:
+        return str(exc)
+    return None
+
+
+def error_messages(cases):
+    '''Cada fonte inválida tem de dar a mensagem esperada com todos os backends.'''
+    ok = True
+    for source, expected in cases:
+        for backend in ('ply', 'fast', 'stream'):
+            found = syntax_error(source, backend)
+            if found != expected:
+                ok = False
+                print(f'{backend}: {source!r}: expected {expected!r}, got {found!r}')
+    print(f'{len(cases)} syntax errors checked')
+    return ok
+
+
+def time_backend(source, backend, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        token_stream(source, backend)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Lexer backends: differential check and benchmark')
+    ap.add_argument('--statements', type=int, default=50000)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    generated = statement_list(args.statements)
+    sources = [(p.name, p.read_text(encoding='utf-8')) for p in sorted(TESTS_DIR.glob('*.pas'))]
+    sources.append(('generated', generated))
+    if not differential(sources) or not error_messages(SYNTAX_ERRORS):
+        sys.exit(1)
+
+    t_ply = time_backend(generated, 'ply', args.repeat)
+    t_fast = time_backend(generated, 'fast', args.repeat)
+    size = len(generated) / 1e6
+    print(f'ply   {t_ply:7.3f} s  {size / t_ply:6.2f} MB/s')
+    print(f'fast  {t_fast:7.3f} s  {size / t_fast:6.2f} MB/s  ({t_ply / t_fast:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Benchmark do parser em programas sintéticos de 10k a 100k instruções.
+
+Uso: python -m bench.parser [--sizes 10000 20000 50000 100000] [--repeat 3]
+
+Mostra o tempo de parsing e o custo por instrução; com listas construídas em tempo
+linear o custo por instrução deve manter-se aproximadamente constante.
+"""
+
+import argparse
+import time
+
+from src.lexer import build_lexer
+from src.parser import build_parser
+
+from .gen import statement_list
+
+
+def time_parse(source, repeat):
+    parser = build_parser()
+    best = None
+    for _ in range(repeat):
+        lexer = build_lexer()
+        start = time.perf_counter()
+        parser.parse(source, lexer=lexer)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Parser scaling benchmark')
+    ap.add_argument('--sizes', type=int, nargs='+', default=[10000, 20000, 50000, 100000])
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    first = None
+    print(f'{"statements":>10} {"parse (s)":>10} {"us/stmt":>8} {"scaling":>8}')
+    for n in args.sizes:
+        elapsed = time_parse(statement_list(n), args.repeat)
+        per_stmt = elapsed / n * 1e6
+        first = first or per_stmt
+        print(f'{n:>10} {elapsed:>10.3f} {per_stmt:>8.2f} {per_stmt / first:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Qualidade do código gerado: kernels Pascal executados no executor local (src.vm).
+
+Uso: python -m bench.runtime [--levels 0 1 2] [--only crivo matriz] [--codegen stack slots]
+                             [--backend aot] [--output res.json]
+
+Para cada kernel, gerador de código (--codegen) e nível de otimização mostra o nº de
+instruções estáticas, as instruções executadas, a profundidade máxima da pilha e as
+alocações na heap. A saída do programa tem de ser igual em todas as combinações; caso
+contrário o script termina com código 1. Com
+--backend aot os kernels correm traduzidos para Python (o tempo inclui a tradução) e a
+saída é também comparada com a do interpretador.
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+from src.codegen_vm import OPT_LEVELS
+from src.codegen_slots import CODEGENS
+from src.main import compile_source
+from src.vm import BACKENDS, VM, VMError
+from src.vmcode import parse_text
+
+ROOT = Path(__file__).resolve().parent.parent
+KERNELS_DIR = Path(__file__).resolve().parent / 'kernels'
+
+# nome -> (ficheiro .pas, linhas de entrada)
+KERNELS = {
+    'fatorial': (ROOT / 'tests' / 'fatorial.pas', ['12']),
+    'primo': (ROOT / 'tests' / 'primo.pas', ['7919']),
+    'soma_array': (ROOT / 'tests' / 'soma_array.pas', ['3', '14', '15', '92', '65']),
+    'binario': (ROOT / 'tests' / 'binario.pas', ['1011011101111']),
+    'crivo': (KERNELS_DIR / 'crivo.pas', []),
+    'ordena': (KERNELS_DIR / 'ordena.pas', []),
+    'matriz': (KERNELS_DIR / 'matriz.pas', []),
+    'texto': (KERNELS_DIR / 'texto.pas', []),
+    'fibonacci': (KERNELS_DIR / 'fibonacci.pas', []),
+    'tabela': (KERNELS_DIR / 'tabela.pas', []),
+    'numerico': (KERNELS_DIR / 'numerico.pas', []),
+    'parametros': (KERNELS_DIR / 'parametros.pas', []),
+}
+
+
+def run_kernel(source, input_lines, opt_level, backend='interp', codegen='stack'):
+    program = parse_text(compile_source(source, opt_level=opt_level, codegen=codegen))
+    out = io.StringIO()
+    vm = VM(program, input_lines, out=out)
+    start = time.perf_counter()
+    vm.run(backend)
+    elapsed = time.perf_counter() - start
+    if backend != 'interp':
+        reference = io.StringIO()
+        VM(program, input_lines, out=reference).run()
+        if reference.getvalue() != out.getvalue():
+            raise VMError(f'{backend} output differs from the interpreter')
+    return out.getvalue(), {
+        'static': len(program.code),
+        'dynamic': vm.steps,
+        'peak_stack': vm.peak_stack,
+        'heap_allocs': vm.allocs,
+        'heap_cells': vm.alloc_cells,
+        'heap_peak': vm.peak_cells,
+        'seconds': round(elapsed, 6),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Generated code quality on the local VM')
+    ap.add_argument('--levels', type=int, nargs='+', choices=OPT_LEVELS, default=list(OPT_LEVELS))
+    ap.add_argument('--only', nargs='+', choices=sorted(KERNELS), help='Run only these kernels')
+    ap.add_argument('--codegen', nargs='+', choices=CODEGENS, default=['stack'],
+                    help='Code generators to compare')
+    ap.add_argument('--backend', choices=BACKENDS, default='interp', help='VM execution backend')
+    ap.add_argument('--output', help='Write results as JSON to this file')
+    args = ap.parse_args()
+
+    results = {}
+    failed = False
+    print(f'{"kernel":<12} {"codegen":<7} {"-O":>2} {"static":>7} {"dynamic":>10} {"ratio":>7} '
+          f'{"stack":>6} {"allocs":>6} {"cells":>7} {"time (s)":>9}')
+    for name in args.only or KERNELS:
+        path, input_lines = KERNELS[name]
+        source = path.read_text(encoding='utf-8')
+        outputs = {}
+        results[name] = {}
+        first = None
+        for codegen, level in [(c, lv) for c in args.codegen for lv in args.levels]:
+            try:
+                output, metrics = run_kernel(source, input_lines, level, args.backend, codegen)
+            except VMError as e:
+                print(f'{name:<12} {codegen:<7} {level:>2} vm error: {e}')
+                failed = True
+                continue
+            outputs[codegen, level] = output
+            # keys stay O<n> for the default generator so older result files still compare
+            key = f'O{level}' if codegen == 'stack' else f'{codegen}-O{level}'
+            results[name][key] = metrics
+            first = first or metrics
+            ratio = metrics['dynamic'] / first['dynamic']
+            print(f'{name:<12} {codegen:<7} {level:>2} {metrics["static"]:>7} {metrics["dynamic"]:>10} {ratio:>7.2f} '
+                  f'{metrics["peak_stack"]:>6} {metrics["heap_allocs"]:>6} {metrics["heap_cells"]:>7} '
+                  f'{metrics["seconds"]:>9.3f}')
+        if len(set(outputs.values())) > 1:
+            print(f'{name}: output differs between optimisation levels or code generators')
+            failed = True
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + '\n', encoding='utf-8')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
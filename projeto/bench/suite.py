@@ -0,0 +1,128 @@
+"""Suite de benchmarks do compilador com limiar de regressão.
+
+Uso: python -m bench.suite [--scale 1.0] [--repeat 3] [--output resultados.json]
+                           [--baseline bench/baseline.json] [--threshold 0.2]
+                           [--update-baseline]
+
+Gera programas sintéticos (expressões profundas, listas longas de instruções, muitos
+subprogramas, arrays grandes e código com muitas strings), mede o débito de compile_source
+de ponta a ponta (linhas/s, melhor de --repeat) e o tempo de cada fase (src.stats, sem
+tracemalloc). Os resultados podem ser gravados em JSON; com uma baseline guardada, termina
+com código 1 se alguma carga ficar mais de --threshold abaixo do débito de referência.
+A baseline depende da máquina: regenerar com --update-baseline ao mudar de ambiente.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+from src.main import compile_source
+from src.stats import CompileStats, compile_with_stats
+
+from . import gen
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+# nome -> (gerador, argumentos na escala 1.0; o primeiro é multiplicado por --scale)
+WORKLOADS = {
+    'deep_expressions': (gen.deep_expressions, (200, 60)),
+    'statement_list': (gen.statement_list, (20000,)),
+    'many_subprograms': (gen.many_subprograms, (1000,)),
+    'big_arrays': (gen.big_arrays, (200, 1000)),
+    'string_heavy': (gen.string_heavy, (10000,)),
+}
+
+
+def make_source(name, scale):
+    fn, args = WORKLOADS[name]
+    return fn(max(1, int(args[0] * scale)), *args[1:])
+
+
+def measure(source, repeat):
+    best = None
+    phases = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compile_source(source)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        stats = CompileStats()
+        compile_with_stats(stats, source=source)
+        for phase, sec, _ in stats.phases:
+            phases[phase] = min(sec, phases.get(phase, sec))
+    lines = source.count('\n')
+    return {
+        'lines': lines,
+        'seconds': round(best, 6),
+        'lines_per_sec': round(lines / best, 1),
+        'phases': {phase: round(sec, 6) for phase, sec in phases.items()},
+    }
+
+
+def compare(results, baseline, threshold):
+    '''Lista de (carga, débito atual, débito de referência) abaixo do limiar.'''
+    regressions = []
+    for name, result in results['workloads'].items():
+        ref = baseline.get('workloads', {}).get(name)
+        if ref is None:
+            continue
+        if result['lines_per_sec'] < ref['lines_per_sec'] * (1 - threshold):
+            regressions.append((name, result['lines_per_sec'], ref['lines_per_sec']))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Compiler benchmark suite')
+    ap.add_argument('--scale', type=float, default=1.0, help='Workload size multiplier')
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--only', nargs='+', choices=sorted(WORKLOADS), help='Run only these workloads')
+    ap.add_argument('--output', help='Write results as JSON to this file')
+    ap.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+    ap.add_argument('--threshold', type=float, default=0.2,
+                    help='Allowed throughput drop vs. baseline, as a fraction (default: %(default)s)')
+    ap.add_argument('--update-baseline', action='store_true', help='Store these results as the baseline')
+    args = ap.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'scale': args.scale,
+        'workloads': {},
+    }
+    print(f'{"workload":<18} {"lines":>8} {"time (s)":>9} {"lines/s":>10}  phases (ms)')
+    for name in args.only or WORKLOADS:
+        result = measure(make_source(name, args.scale), args.repeat)
+        results['workloads'][name] = result
+        phases = ' '.join(f'{p}={sec * 1000:.0f}' for p, sec in result['phases'].items())
+        print(f'{name:<18} {result["lines"]:>8} {result["seconds"]:>9.3f} '
+              f'{result["lines_per_sec"]:>10.0f}  {phases}')
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.write_text(text + '\n', encoding='utf-8')
+        print(f'baseline written to {baseline_path}')
+        return
+    if not baseline_path.exists():
+        print(f'no baseline at {baseline_path}; skipping regression check')
+        return
+    baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+    if baseline.get('scale') != args.scale:
+        print(f'baseline was recorded at scale {baseline.get("scale")}; skipping regression check')
+        return
+    regressions = compare(results, baseline, args.threshold)
+    for name, current, ref in regressions:
+        print(f'REGRESSION {name}: {current:.0f} lines/s vs baseline {ref:.0f} '
+              f'(-{(1 - current / ref) * 100:.1f}%, threshold {args.threshold * 100:.0f}%)')
+    if regressions:
+        sys.exit(1)
+    print(f'no regressions beyond {args.threshold * 100:.0f}% of baseline')
+
+
+if __name__ == '__main__':
+    main()
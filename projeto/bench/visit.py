@@ -0,0 +1,47 @@
+"""Benchmark do custo por nó das travessias da AST (Analyzer e CodeGen).
+
+Uso: python -m bench.visit [--statements 50000] [--repeat 5]
+
+O tempo do CodeGen inclui a análise semântica que generate() executa primeiro.
+"""
+
+import argparse
+import time
+
+from src import ast
+from src.main import parse_source
+from src.sema import Analyzer
+from src.codegen_vm import CodeGen
+
+from .gen import statement_list
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description='AST walk per-node overhead')
+    ap.add_argument('--statements', type=int, default=50000)
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+
+    tree = parse_source(statement_list(args.statements))
+    nodes = sum(1 for _ in ast.walk(tree))
+    t_sema = best_of(lambda: Analyzer().analyze(tree), args.repeat)
+    t_gen = best_of(lambda: CodeGen().generate(tree), args.repeat)
+    print(f'{nodes} nodes')
+    print(f'Analyzer.analyze  {t_sema:8.3f} s  {t_sema / nodes * 1e9:8.0f} ns/node')
+    print(f'CodeGen.generate  {t_gen:8.3f} s  {t_gen / nodes * 1e9:8.0f} ns/node')
+    t_emit = max(t_gen - t_sema, 0.0)
+    print(f'  emission only   {t_emit:8.3f} s  {t_emit / nodes * 1e9:8.0f} ns/node')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,98 +1,183 @@
 class Node:
-    pass
+    # _fields: filhos/atributos estruturais; os restantes slots guardam posição e anotações
+    _fields = ()
+    __slots__ = ('lineno', 'col')
+
+    def __init__(self, lineno=None, col=None):
+        self.lineno = lineno
+        self.col = col
+
+
+class Expr(Node):
+    __slots__ = ('etype',)  # tipo resolvido pelo Analyzer
+
+    def __init__(self, lineno=None, col=None):
+        super().__init__(lineno, col)
+        self.etype = None
 
 
 class Program(Node):
-    def __init__(self, name, block):
+    _fields = ('name', 'block')
+    __slots__ = _fields
+
+    def __init__(self, name, block, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.name = name
         self.block = block
 
 
 class Subprograms(Node):
-    def __init__(self, items):
+    _fields = ('items',)
+    __slots__ = _fields
+
+    def __init__(self, items, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.items = items
 
 
 class Block(Node):
-    def __init__(self, declarations, subprograms, statements):
+    _fields = ('declarations', 'subprograms', 'statements')
+    __slots__ = _fields
+
+    def __init__(self, declarations, subprograms, statements, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.declarations = declarations  # list of VarDecl
         self.subprograms = subprograms    # list of ProcedureDecl/FunctionDecl
         self.statements = statements      # list of Statement
 
 
 class VarDecl(Node):
-    def __init__(self, name, vartype, size=None):
+    _fields = ('name', 'vartype', 'size')
+    __slots__ = _fields + ('spelling',)
+
+    def __init__(self, name, vartype, size=None, lineno=None, col=None, spelling=None):
+        super().__init__(lineno, col)
         self.name = name
+        self.spelling = spelling or name
         self.vartype = vartype  # Type
         self.size = size        # for arrays (low, high)
 
 
 class Param(Node):
-    def __init__(self, name, vartype, byref=False):
+    _fields = ('name', 'vartype', 'byref')
+    __slots__ = _fields + ('spelling',)
+
+    def __init__(self, name, vartype, byref=False, lineno=None, col=None, spelling=None):
+        super().__init__(lineno, col)
         self.name = name
+        self.spelling = spelling or name
         self.vartype = vartype
         self.byref = byref
 
 
 class ProcedureDecl(Node):
-    def __init__(self, name, params, block):
+    _fields = ('name', 'params', 'block')
+    __slots__ = _fields + ('spelling', 'frame_size', 'local_arrays')
+
+    def __init__(self, name, params, block, lineno=None, col=None, spelling=None):
+        super().__init__(lineno, col)
         self.name = name
+        self.spelling = spelling or name
         self.params = params  # list[Param]
         self.block = block
+        self.frame_size = None  # nº de slots locais, calculado pelo Analyzer
+        self.local_arrays = []  # símbolos dos arrays locais, idem
 
 
 class FunctionDecl(Node):
-    def __init__(self, name, params, return_type, block):
+    _fields = ('name', 'params', 'return_type', 'block')
+    __slots__ = _fields + ('spelling', 'frame_size', 'local_arrays', 'ret_sym')
+
+    def __init__(self, name, params, return_type, block, lineno=None, col=None, spelling=None):
+        super().__init__(lineno, col)
         self.name = name
+        self.spelling = spelling or name
         self.params = params
         self.return_type = return_type
         self.block = block
+        self.frame_size = None
+        self.local_arrays = []
+        self.ret_sym = None
 
 
 class Type(Node):
-    def __init__(self, name, base=None, range_bounds=None):
+    _fields = ('name', 'base', 'range_bounds')
+    __slots__ = _fields
+
+    def __init__(self, name, base=None, range_bounds=None, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.name = name
         self.base = base
         self.range_bounds = range_bounds
 
 
 class Compound(Node):
-    def __init__(self, statements):
+    _fields = ('statements',)
+    __slots__ = _fields
+
+    def __init__(self, statements, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.statements = statements
 
 
 class Assign(Node):
-    def __init__(self, target, expr):
+    _fields = ('target', 'expr')
+    __slots__ = _fields
+
+    def __init__(self, target, expr, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.target = target
         self.expr = expr
 
 
-class Var(Node):
-    def __init__(self, name):
+class Var(Expr):
+    _fields = ('name',)
+    __slots__ = _fields + ('spelling', 'sym')
+
+    def __init__(self, name, lineno=None, col=None, spelling=None):
+        super().__init__(lineno, col)
         self.name = name
+        self.spelling = spelling or name  # grafia do identificador na fonte (diagnósticos)
+        self.sym = None  # Symbol resolvido pelo Analyzer
+
 
+class ArrayAccess(Expr):
+    _fields = ('array', 'index')
+    __slots__ = _fields
 
-class ArrayAccess(Node):
-    def __init__(self, array, index):
+    def __init__(self, array, index, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.array = array
         self.index = index
 
 
 class If(Node):
-    def __init__(self, cond, then_body, else_body=None):
+    _fields = ('cond', 'then_body', 'else_body')
+    __slots__ = _fields
+
+    def __init__(self, cond, then_body, else_body=None, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.cond = cond
         self.then_body = then_body
         self.else_body = else_body
 
 
 class While(Node):
-    def __init__(self, cond, body):
+    _fields = ('cond', 'body')
+    __slots__ = _fields
+
+    def __init__(self, cond, body, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.cond = cond
         self.body = body
 
 
 class For(Node):
-    def __init__(self, var, start, end, body, downto=False):
+    _fields = ('var', 'start', 'end', 'body', 'downto')
+    __slots__ = _fields
+
+    def __init__(self, var, start, end, body, downto=False, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.var = var
         self.start = start
         self.end = end
@@ -101,41 +186,95 @@ class For(Node):
 
 
 class Repeat(Node):
-    def __init__(self, body, cond):
+    _fields = ('body', 'cond')
+    __slots__ = _fields
+
+    def __init__(self, body, cond, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.body = body
         self.cond = cond
 
 
 class ProcCall(Node):
-    def __init__(self, name, args):
+    _fields = ('name', 'args')
+    __slots__ = _fields + ('spelling',)
+
+    def __init__(self, name, args, lineno=None, col=None, spelling=None):
+        super().__init__(lineno, col)
         self.name = name
+        self.spelling = spelling or name
         self.args = args
 
 
-class FuncCall(Node):
-    def __init__(self, name, args):
+class FuncCall(Expr):
+    _fields = ('name', 'args')
+    __slots__ = _fields + ('spelling',)
+
+    def __init__(self, name, args, lineno=None, col=None, spelling=None):
+        super().__init__(lineno, col)
         self.name = name
+        self.spelling = spelling or name
         self.args = args
 
 
 class NoOp(Node):
-    pass
+    _fields = ()
+    __slots__ = _fields
 
 
-class BinOp(Node):
-    def __init__(self, left, op, right):
+class BinOp(Expr):
+    _fields = ('left', 'op', 'right')
+    __slots__ = _fields
+
+    def __init__(self, left, op, right, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.left = left
         self.op = op
         self.right = right
 
 
-class UnOp(Node):
-    def __init__(self, op, expr):
+class UnOp(Expr):
+    _fields = ('op', 'expr')
+    __slots__ = _fields
+
+    def __init__(self, op, expr, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.op = op
         self.expr = expr
 
 
-class Literal(Node):
-    def __init__(self, value, typ):
+class Literal(Expr):
+    _fields = ('value', 'typ')
+    __slots__ = _fields
+
+    def __init__(self, value, typ, lineno=None, col=None):
+        super().__init__(lineno, col)
         self.value = value
         self.typ = typ
+
+
+def iter_fields(node):
+    # posição e anotações ficam de fora: não fazem parte da estrutura da árvore
+    return ((name, getattr(node, name)) for name in type(node)._fields)
+
+
+def dump(node):
+    '''Representação textual canónica de uma subárvore (usada como impressão digital).'''
+    if isinstance(node, Node):
+        fields = ', '.join(f'{k}={dump(v)}' for k, v in iter_fields(node))
+        return f'{type(node).__name__}({fields})'
+    if isinstance(node, (list, tuple)):
+        return '[' + ', '.join(dump(v) for v in node) + ']'
+    return repr(node)
+
+
+def walk(node):
+    '''Percorre em profundidade todos os nós de uma subárvore.'''
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Node):
+            yield item
+            stack.extend(v for _, v in iter_fields(item))
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
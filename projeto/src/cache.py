@@ -0,0 +1,155 @@
+"""Cache de compilação endereçada por conteúdo.
+
+A chave é o SHA-256 do texto fonte, das opções de compilação e de uma impressão digital
+do próprio compilador (hash de todos os módulos em src/, o que cobre parser.py, sema.py e
+codegen_vm.py). Cada entrada guarda o texto VM resultante num ficheiro; o mtime serve de
+relógio LRU e as entradas mais antigas são removidas quando o tamanho total excede o
+limite configurado.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+STATS_FILE = 'stats.json'
+
+_fingerprint = None
+
+
+def default_cache_dir():
+    env = os.environ.get('PASCALVM_CACHE_DIR')
+    if env:
+        return Path(env)
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'pascal-vm'
+
+
+def compiler_fingerprint():
+    '''Hash dos módulos do compilador; muda sempre que o código gerado pode mudar.'''
+    global _fingerprint
+    if _fingerprint is None:
+        h = hashlib.sha256()
+        here = Path(__file__).resolve().parent
+        for path in sorted(here.glob('*.py')):
+            h.update(path.name.encode())
+            h.update(path.read_bytes())
+        _fingerprint = h.hexdigest()
+    return _fingerprint
+
+
+class CompileCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory) if directory else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, source, options=None):
+        h = hashlib.sha256()
+        h.update(compiler_fingerprint().encode())
+        h.update(json.dumps(options or {}, sort_keys=True).encode())
+        h.update(source.encode('utf-8'))
+        return h.hexdigest()
+
+    def path_for(self, key):
+        return self.directory / key[:2] / f'{key}.vm'
+
+    def lookup(self, key):
+        '''Caminho da entrada (marcada como usada recentemente) ou None num miss.'''
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def get(self, key):
+        path = self.lookup(key)
+        if path is None:
+            return None
+        return path.read_text(encoding='utf-8').removesuffix('\n')
+
+    def store_with(self, key, write):
+        '''Cria a entrada chamando write(ficheiro) e devolve o seu caminho.'''
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            # os ficheiros .tmp não contam como entradas: a remoção LRU nunca os apagaria
+            tmp.unlink(missing_ok=True)
+            raise
+        self.evict(keep=path)
+        return path
+
+    def put(self, key, output):
+        return self.store_with(key, lambda f: f.write(output + '\n'))
+
+    def entries(self):
+        '''Lista (mtime, tamanho, caminho) de todas as entradas.'''
+        found = []
+        if not self.directory.is_dir():
+            return found
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.vm'):
+                    st = entry.stat()
+                    found.append((st.st_mtime, st.st_size, entry.path))
+        return found
+
+    def evict(self, keep=None):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if keep is not None and path == str(keep):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def record_stats(self):
+        '''Acumula os contadores desta execução no ficheiro de estatísticas da cache.'''
+        totals = self.load_stats()
+        totals['hits'] += self.hits
+        totals['misses'] += self.misses
+        totals['evictions'] += self.evictions
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / STATS_FILE).write_text(json.dumps(totals), encoding='utf-8')
+        return totals
+
+    def load_stats(self):
+        totals = {'hits': 0, 'misses': 0, 'evictions': 0}
+        try:
+            totals.update(json.loads((self.directory / STATS_FILE).read_text(encoding='utf-8')))
+        except (FileNotFoundError, ValueError):
+            pass
+        return totals
+
+    def summary(self):
+        totals = self.load_stats()
+        entries = self.entries()
+        size = sum(s for _, s, _ in entries)
+        return (f'cache {self.directory}: {self.hits} hit(s), {self.misses} miss(es) this run; '
+                f'{totals["hits"]} hits, {totals["misses"]} misses, {totals["evictions"]} evictions total; '
+                f'{len(entries)} entries, {size} bytes')
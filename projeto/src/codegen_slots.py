@@ -0,0 +1,459 @@
+from . import ast
+from .codegen_vm import CodeGen, DEFAULT_OPT_LEVEL, escaping_names, has_call
+from .ranges import assigned_names, has_user_call, trunc_div
+
+
+# Alternative backend (--codegen slots): frame slots (global slots in the main block) act
+# as virtual registers, and expressions go through a small tree-tiling selector whose
+# cost model counts emitted instructions. Per pattern it picks the cheapest sequence:
+#   - constant subtrees fold to one PUSHI; x+0, x-0, x*1, x div 1 drop the operation;
+#   - a[e+c] folds c into the bound adjustment, and global arrays with a small positive
+#     lower bound that are only ever indexed (never passed or assigned whole) are
+#     allocated with `low` spare cells so the adjustment disappears;
+#   - -e is PUSHI 0 / e / SUB and integer operands of real operations get ITOF in place,
+#     with no SWAP; not (a < b) becomes a >= b; an if on not c / a <> b branches on c / a = b;
+#   - a function epilogue stores its result slot straight to the return global.
+# Slot form is chosen instead of stack form when it is cheaper:
+#   - a pure subexpression repeated within a statement is computed once into a register
+#     (STORE r, then PUSH r per use) when (uses - 1) * (cost - 1) > 2;
+#   - a loop-invariant for bound costing more than one instruction is evaluated once
+#     into a register instead of on every iteration.
+# largest lower bound handled by allocating spare cells instead of adjusting indexes
+MAX_BIAS = 64
+
+_INVERSE = {'<': '>=', '<=': '>', '>': '<=', '>=': '<', '<>': '='}
+_CSE_TYPES = ('integer', 'real', 'boolean')
+
+
+def constant(expr):
+    # integer/boolean value of a constant subtree, or None
+    if isinstance(expr, ast.Literal):
+        return int(expr.value) if expr.typ in ('integer', 'boolean') else None
+    if isinstance(expr, ast.UnOp):
+        value = constant(expr.expr)
+        if value is None or expr.etype not in ('integer', 'boolean'):
+            return None
+        return -value if expr.op == '-' else int(not value)
+    if not isinstance(expr, ast.BinOp) or expr.etype not in ('integer', 'boolean'):
+        return None
+    a = constant(expr.left)
+    if a is None:
+        return None
+    b = constant(expr.right)
+    if b is None:
+        return None
+    op = expr.op
+    if op in ('div', 'mod'):
+        if b == 0:
+            return None
+        q = trunc_div(a, b)
+        return q if op == 'div' else a - b * q
+    if op in ('and', 'or'):
+        return int(bool(a) and bool(b)) if op == 'and' else int(bool(a) or bool(b))
+    ops = {'+': a + b, '-': a - b, '*': a * b, '<': a < b, '<=': a <= b, '>': a > b,
+           '>=': a >= b, '=': a == b, '<>': a != b}
+    return int(ops[op]) if op in ops else None
+
+
+def identity_operand(expr):
+    # x+0, 0+x, x-0, x*1, 1*x, x div 1 on integers -> x
+    if not isinstance(expr, ast.BinOp) or expr.etype != 'integer':
+        return None
+    op = expr.op
+    left, right = expr.left, expr.right
+    if left.etype != 'integer' or right.etype != 'integer':
+        return None
+    rc = constant(right)
+    if (op in ('+', '-') and rc == 0) or (op in ('*', 'div') and rc == 1):
+        return left
+    lc = constant(left)
+    if (op == '+' and lc == 0) or (op == '*' and lc == 1):
+        return right
+    return None
+
+
+def char_compare(expr):
+    # comparisons with a one-character string literal are rewritten by CodeGen.emit_binop
+    return expr.op in ('=', '<>') and any(
+        isinstance(side, ast.Literal) and side.typ == 'string' and len(str(side.value)) == 1
+        for side in (expr.left, expr.right))
+
+
+def children(expr):
+    if isinstance(expr, ast.BinOp):
+        return (expr.left, expr.right)
+    if isinstance(expr, ast.UnOp):
+        return (expr.expr,)
+    if isinstance(expr, ast.ArrayAccess):
+        return (expr.index,)
+    if isinstance(expr, ast.FuncCall):
+        return tuple(expr.args)
+    return ()
+
+
+class SlotCodeGen(CodeGen):
+    def __init__(self, sink=None, opt_level=DEFAULT_OPT_LEVEL, source_map=False):
+        super().__init__(sink, opt_level, source_map)
+        self.reg_base = 0
+        self.reg_kind = 'global'
+        self.reg_depth = 0
+        self.main_registers = 0
+        self.reg_nodes = {}    # id(expr) -> register holding its value (planned CSE)
+        self.reg_ready = set()
+        self.escaping_globals = set()  # global arrays used whole somewhere: no spare cells
+
+    # --- registers ---------------------------------------------------------------
+
+    def emit_program(self, program, analyzer):
+        self.main_registers = self.registers_needed(program.block.statements)
+        # a block passed to a parameter or assigned to another array is indexed there with
+        # its declared lower bound, so it cannot carry spare leading cells
+        self.escaping_globals = escaping_names(program).union(*(
+            escaping_names(sub) for sub in ast.walk(program.block)
+            if isinstance(sub, (ast.ProcedureDecl, ast.FunctionDecl))))
+        return super().emit_program(program, analyzer)
+
+    def layout_registers(self, offset):
+        # main-block registers live in global slots, right after the return slot
+        self.reg_base = offset
+        return offset + self.main_registers
+
+    def emit_register_load(self, reg):
+        self.emit_load_offset(self.reg_base + reg, self.reg_kind)
+
+    def emit_register_store(self, reg):
+        self.emit_store_offset(self.reg_base + reg, self.reg_kind)
+
+    def registers_needed(self, statements):
+        return max((self.statement_registers(s) for s in statements), default=0)
+
+    def statement_registers(self, stmt):
+        own = len(set(self.plan(self.statement_exprs(stmt)).values()))
+        if isinstance(stmt, ast.For):
+            nested = int(self.hoistable(stmt)) + self.statement_registers(stmt.body)
+        elif isinstance(stmt, ast.If):
+            nested = max(self.statement_registers(stmt.then_body),
+                         self.statement_registers(stmt.else_body) if stmt.else_body else 0)
+        elif isinstance(stmt, ast.While):
+            nested = self.statement_registers(stmt.body)
+        elif isinstance(stmt, ast.Repeat):
+            nested = self.registers_needed(stmt.body)
+        elif isinstance(stmt, ast.Compound):
+            nested = self.registers_needed(stmt.statements)
+        else:
+            nested = 0
+        return own + nested
+
+    def statement_exprs(self, stmt):
+        # expressions a statement evaluates unconditionally, in one go
+        if isinstance(stmt, ast.Assign):
+            exprs = [stmt.expr]
+            if isinstance(stmt.target, ast.ArrayAccess):
+                exprs.append(stmt.target.index)
+            return exprs
+        if isinstance(stmt, (ast.If, ast.While, ast.Repeat)):
+            return [stmt.cond]
+        if isinstance(stmt, ast.ProcCall) and stmt.name == 'writeln':
+            return list(stmt.args)
+        return []
+
+    # --- slot form: common subexpressions ------------------------------------------
+
+    def candidate(self, expr):
+        if isinstance(expr, ast.FuncCall):
+            return expr.name == 'length'
+        if isinstance(expr, ast.BinOp) and char_compare(expr):
+            return False
+        return (isinstance(expr, (ast.BinOp, ast.UnOp, ast.ArrayAccess))
+                and expr.etype in _CSE_TYPES and constant(expr) is None)
+
+    def collect(self, expr, chosen, found):
+        if self.candidate(expr):
+            key = ast.dump(expr)
+            found.setdefault(key, []).append(expr)
+            if key in chosen:
+                return
+        for child in children(expr):
+            self.collect(child, chosen, found)
+
+    def plan(self, exprs):
+        # -> {id(node): register} for the subexpressions worth keeping in registers
+        if not exprs or any(has_call(e) for e in exprs):
+            return {}
+        chosen = {}
+        while True:
+            found = {}
+            for e in exprs:
+                self.collect(e, chosen, found)
+            best = None
+            for key, nodes in found.items():
+                if key in chosen or len(nodes) < 2:
+                    continue
+                saving = (len(nodes) - 1) * (self.cost(nodes[0], chosen) - 1) - 2
+                if saving > 0 and (best is None or saving > best[0]):
+                    best = (saving, key, nodes)
+            if best is None:
+                break
+            chosen[best[1]] = best[2]
+        return {id(node): reg for reg, nodes in enumerate(chosen.values()) for node in nodes}
+
+    def cost(self, expr, chosen=()):
+        # instructions emitted for expr in stack form
+        if chosen and ast.dump(expr) in chosen:
+            return 1
+        if isinstance(expr, (ast.Literal, ast.Var)) or constant(expr) is not None:
+            return 1
+        same = identity_operand(expr)
+        if same is not None:
+            return self.cost(same, chosen)
+        if isinstance(expr, ast.ArrayAccess):
+            base, adjust = self.index_parts(expr.index, self.array_low(expr.array.sym))
+            index = 1 if base is None else self.cost(base, chosen) + (2 if adjust else 0)
+            return 2 + index
+        if isinstance(expr, ast.BinOp):
+            total = self.cost(expr.left, chosen) + self.cost(expr.right, chosen) + 1
+            if expr.op == '<>':
+                total += 1
+            if expr.op not in ('and', 'or') and (expr.etype == 'real' or 'real' in (expr.left.etype, expr.right.etype)):
+                total += (expr.left.etype == 'integer') + (expr.right.etype == 'integer')
+            return total
+        if isinstance(expr, ast.UnOp):
+            return self.cost(expr.expr, chosen) + (2 if expr.op == '-' else 1)
+        if isinstance(expr, ast.FuncCall) and expr.name == 'length':
+            return self.cost(expr.args[0], chosen) + 1 + (expr.args[0].etype != 'string')
+        return 10
+
+    def emit_statement(self, stmt):
+        planned = self.plan(self.statement_exprs(stmt))
+        if not planned:
+            return super().emit_statement(stmt)
+        outer_nodes, outer_ready, depth = self.reg_nodes, self.reg_ready, self.reg_depth
+        self.reg_nodes = dict(outer_nodes)
+        self.reg_nodes.update((key, depth + reg) for key, reg in planned.items())
+        self.reg_ready = set(outer_ready)
+        self.reg_depth = depth + len(set(planned.values()))
+        try:
+            super().emit_statement(stmt)
+        finally:
+            self.reg_nodes, self.reg_ready, self.reg_depth = outer_nodes, outer_ready, depth
+
+    # --- slot form: loop-invariant for bounds --------------------------------------
+
+    def hoistable(self, stmt):
+        end = stmt.end
+        if self.cost(end) <= 1 or has_call(end):
+            return False
+        used = {node.name for node in ast.walk(end) if isinstance(node, ast.Var)}
+        if stmt.var.name in used or used & assigned_names(stmt.body):
+            return False
+        # a called subprogram could change a global the bound depends on
+        return not has_user_call(stmt.body) or all(
+            node.sym.kind != 'global' for node in ast.walk(end) if isinstance(node, ast.Var))
+
+    def emit_for(self, stmt):
+        if not self.hoistable(stmt):
+            return super().emit_for(stmt)
+        self.emit_assignment(stmt.var, stmt.start)
+        reg = self.reg_depth
+        self.reg_depth += 1
+        try:
+            self.ensure_type('integer', self.emit_expression(stmt.end))
+            self.emit_register_store(reg)
+            l_start = self.new_label('FOR')
+            l_end = self.new_label('FORE')
+            self.emit(f'{l_start}:')
+            self.emit_load(stmt.var)
+            self.emit_register_load(reg)
+            self.emit('SUPEQ' if stmt.downto else 'INFEQ')
+            self.emit(f'JZ {l_end}')
+            self.emit_for_body(stmt)
+            self.emit_load(stmt.var)
+            self.emit(f'PUSHI { -1 if stmt.downto else 1}')
+            self.emit('ADD')
+            self.emit_store(stmt.var, 'integer')
+            self.emit(f'JUMP {l_start}')
+            self.emit(f'{l_end}:')
+        finally:
+            self.reg_depth -= 1
+
+    # --- tiles -------------------------------------------------------------------
+
+    def emit_expression(self, expr):
+        reg = self.reg_nodes.get(id(expr)) if self.reg_nodes else None
+        if reg is not None and reg in self.reg_ready:
+            self.emit_register_load(reg)
+            return expr.etype
+        typ = self.emit_tiled(expr)
+        if reg is not None:
+            self.emit_register_store(reg)
+            self.emit_register_load(reg)
+            self.reg_ready.add(reg)
+        return typ
+
+    def emit_tiled(self, expr):
+        if isinstance(expr, (ast.BinOp, ast.UnOp)):
+            value = constant(expr)
+            if value is not None:
+                self.emit(f'PUSHI {value}')
+                return expr.etype
+            same = identity_operand(expr)
+            if same is not None:
+                return self.emit_expression(same)
+        return super().emit_expression(expr)
+
+    def constant_text(self, expr):
+        # writeln folds whole constant integer/boolean subtrees, not just literals
+        if isinstance(expr, (ast.BinOp, ast.UnOp)) and expr.etype in ('integer', 'boolean'):
+            value = constant(expr)
+            return None if value is None else str(value)
+        return super().constant_text(expr)
+
+    def emit_binop(self, expr):
+        if self.opt_level >= 2:
+            reduced = self.reduce_binop(expr)
+            if reduced is not expr:
+                return self.emit_expression(reduced)
+        lt, rt = expr.left.etype, expr.right.etype
+        if (self.opt_level == 0 and not has_call(expr.right)) or char_compare(expr) \
+                or expr.op in ('and', 'or') or 'real' not in (lt, rt, expr.etype):
+            return super().emit_binop(expr)
+        # mixed integer/real operands: convert each one right after it is pushed
+        self.emit_expression(expr.left)
+        if lt == 'integer':
+            self.emit('ITOF')
+        self.emit_expression(expr.right)
+        if rt == 'integer':
+            self.emit('ITOF')
+        if expr.op in _INVERSE or expr.op == '=':
+            self.emit_compare(expr.op, 'real')
+            return 'boolean'
+        self.emit_numeric_op(expr.op, 'real')
+        return 'real'
+
+    def emit_unop(self, expr):
+        if expr.op == '-':
+            real = expr.etype == 'real'
+            self.emit('PUSHF 0.0' if real else 'PUSHI 0')
+            self.emit_expression(expr.expr)
+            self.emit('FSUB' if real else 'SUB')
+            return expr.etype
+        inner = expr.expr
+        if isinstance(inner, ast.BinOp) and inner.op in _INVERSE and not char_compare(inner):
+            inverse = ast.BinOp(inner.left, _INVERSE[inner.op], inner.right)
+            inverse.etype = 'boolean'
+            return self.emit_expression(inverse)
+        return super().emit_unop(expr)
+
+    def negation(self, cond):
+        # expression true exactly when cond is false, if one is cheaper than cond itself
+        if isinstance(cond, ast.UnOp) and cond.op == 'not':
+            return cond.expr
+        if isinstance(cond, ast.BinOp) and cond.op == '<>' and not char_compare(cond):
+            equal = ast.BinOp(cond.left, '=', cond.right)
+            equal.etype = 'boolean'
+            return equal
+        return None
+
+    def emit_if(self, stmt):
+        negated = self.negation(stmt.cond)
+        if negated is None:
+            return super().emit_if(stmt)
+        l_then = self.new_label('THEN')
+        l_end = self.new_label('ENDIF')
+        self.emit_expression(negated)
+        self.emit(f'JZ {l_then}')
+        if stmt.else_body:
+            self.emit_statement(stmt.else_body)
+        self.emit(f'JUMP {l_end}')
+        self.emit(f'{l_then}:')
+        self.emit_statement(stmt.then_body)
+        self.emit(f'{l_end}:')
+
+    # --- arrays ------------------------------------------------------------------
+
+    def array_bias(self, sym):
+        low = sym.bounds[0]
+        if sym.kind != 'global' or sym.name in self.escaping_globals:
+            return 0
+        return low if 0 < low <= MAX_BIAS else 0
+
+    def array_low(self, sym):
+        # index of the first element as seen by LOADN/STOREN (strings are 1-based)
+        if sym.bounds is None:
+            return 1
+        return sym.bounds[0] - self.array_bias(sym)
+
+    def init_arrays(self):
+        for sym in self.global_arrays:
+            self.emit(f'PUSHI {sym.size + self.array_bias(sym)}')
+            self.emit('ALLOCN')
+            self.emit(f'STOREG {sym.offset}')
+
+    def index_parts(self, index, low):
+        # index - low as (expression or None, constant adjustment)
+        value = constant(index)
+        if value is not None:
+            return None, value - low
+        if isinstance(index, ast.BinOp) and index.op in ('+', '-') and index.etype == 'integer':
+            c = constant(index.right)
+            if c is not None:
+                return index.left, (c if index.op == '+' else -c) - low
+            c = constant(index.left)
+            if c is not None and index.op == '+':
+                return index.right, c - low
+        return index, -low
+
+    def emit_index(self, index, low):
+        base, adjust = self.index_parts(index, low)
+        if base is None:
+            self.emit(f'PUSHI {adjust}')
+            return
+        self.ensure_type('integer', self.emit_expression(base))
+        if adjust > 0:
+            self.emit(f'PUSHI {adjust}')
+            self.emit('ADD')
+        elif adjust < 0:
+            self.emit(f'PUSHI {-adjust}')
+            self.emit('SUB')
+
+    def emit_element_address(self, target):
+        sym = self.element_target(target)
+        self.emit_push_address(sym.offset, sym.kind)
+        self.emit_index(target.index, self.array_low(sym))
+
+    def emit_load(self, var):
+        if not isinstance(var, ast.ArrayAccess):
+            return super().emit_load(var)
+        sym = var.array.sym
+        self.emit_push_address(sym.offset, sym.kind)
+        self.emit_index(var.index, self.array_low(sym))
+        if sym.bounds is None:
+            self.emit('CHARAT')
+            return 'integer'
+        self.emit('LOADN')
+        return sym.typ
+
+    # --- subprograms -------------------------------------------------------------
+
+    def emit_subprogram(self, sub):
+        outer = self.reg_base, self.reg_kind
+        registers = self.registers_needed(sub.block.statements)
+        # registers sit above the locals, in the same frame
+        self.reg_base, self.reg_kind = sub.frame_size, 'local'
+        try:
+            self.emit(f'{self.mangle_label(f"FN{sub.name}")}:')
+            if sub.frame_size + registers > 0:
+                self.emit(f'PUSHN {sub.frame_size + registers}')
+            self.emit_local_arrays(sub)
+            self.emit_block(sub.block)
+            if isinstance(sub, ast.FunctionDecl):
+                # the result already sits in its slot: copy it to the return global only
+                self.emit_load_offset(sub.ret_sym.offset, 'ret')
+                self.emit(f'STOREG {self.retval_offset}')
+            self.emit_free_arrays(sub)
+            self.emit('RETURN')
+        finally:
+            self.reg_base, self.reg_kind = outer
+
+
+CODEGENS = {'stack': CodeGen, 'slots': SlotCodeGen}
@@ -1,23 +1,151 @@
 from . import ast
+from .consteval import fold_calls
+from .ranges import bounds, loop_bounds
 from .sema import Analyzer
+from .vmcode import READ_INT_LABEL, READ_REAL_LABEL
+
+
+# -O0: straightforward code, binary operands spilled to global temps around the right side
+# -O1: no temp spills for binary operators and call-free array stores; writeln merges
+#      constant arguments into one preformatted string; string literals that may be pushed
+#      more than once are stored in global slots once, at the start of the main block
+# -O2: -O1 plus calls to pure functions with constant arguments evaluated at compile time;
+#      div/mod whose result follows from the value ranges of for variables are dropped,
+#      and integer constants in real operations are pushed as reals instead of ITOF
+OPT_LEVELS = (0, 1, 2)
+DEFAULT_OPT_LEVEL = 1
 
 
 class CodeGenError(Exception):
     pass
 
 
-class CodeGen:
+def has_call(expr):
+    return any(isinstance(node, ast.FuncCall) and node.name != 'length' for node in ast.walk(expr))
+
+
+def escaping_names(sub):
+    # names used other than as the array of an indexing: for a local array, its block
+    # address may then be stored or passed on and outlive the call
+    indexed = set()
+    bare = set()
+    for node in ast.walk(sub.block.statements):
+        if isinstance(node, ast.ArrayAccess):
+            indexed.add(id(node.array))
+        elif isinstance(node, ast.Var) and id(node) not in indexed:
+            bare.add(node.name)
+    return bare
+
+
+def format_real(value):
+    # WRITEF text is up to the VM: only reals printed the same by EWVM (JavaScript number
+    # formatting) and by src.vm (Python repr) are preformatted, i.e. non-integral values
+    # whose shortest form is positional in both
+    if value != int(value) and 1e-4 <= abs(value) < 1e16:
+        return repr(value)
+    return None
+
+
+class ListSink:
+    # keeps every instruction in memory (tests, incremental reuse, .vmb encoding)
     def __init__(self):
-        self.instructions = []
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def close(self):
+        pass
+
+
+class StreamSink:
+    # writes instructions to a text stream as they are emitted, in chunks of lines
+    def __init__(self, stream, chunk=4096):
+        self.stream = stream
+        self.chunk = chunk
+        self.out = []
+
+    def write(self, line):
+        self.out.append(line)
+        if len(self.out) >= self.chunk:
+            self.flush_out()
+
+    def flush_out(self):
+        if self.out:
+            self.stream.write('\n'.join(self.out) + '\n')
+            self.out = []
+
+    def close(self):
+        self.flush_out()
+        self.stream.flush()
+
+
+class CodeGen:
+    # node class -> emitter method name; bound once per instance in __init__
+    STATEMENT_EMITTERS = {
+        ast.Assign: 'emit_assign',
+        ast.If: 'emit_if',
+        ast.While: 'emit_while',
+        ast.For: 'emit_for',
+        ast.Repeat: 'emit_repeat',
+        ast.ProcCall: 'emit_proc_call',
+        ast.Compound: 'emit_compound',
+        ast.NoOp: 'emit_noop',
+    }
+    EXPR_EMITTERS = {
+        ast.Literal: 'emit_literal',
+        ast.Var: 'emit_load',
+        ast.ArrayAccess: 'emit_load',
+        ast.BinOp: 'emit_binop',
+        ast.UnOp: 'emit_unop',
+        ast.FuncCall: 'emit_func_call',
+    }
+    # nodes whose strings may be pushed more than once, and the fields (last first) that
+    # can hold string literals, for string_uses
+    REPEATING = (ast.While, ast.For, ast.Repeat, ast.ProcedureDecl, ast.FunctionDecl)
+    STRING_CHILDREN = {
+        ast.Program: ('block',),
+        ast.Block: ('statements', 'subprograms'),
+        ast.ProcedureDecl: ('block',),
+        ast.FunctionDecl: ('block',),
+        ast.Compound: ('statements',),
+        ast.Assign: ('expr', 'target'),
+        ast.If: ('else_body', 'then_body', 'cond'),
+        ast.While: ('body', 'cond'),
+        ast.For: ('body', 'end', 'start'),
+        ast.Repeat: ('cond', 'body'),
+        ast.ProcCall: ('args',),
+        ast.FuncCall: ('args',),
+        ast.ArrayAccess: ('index',),
+        ast.BinOp: ('right', 'left'),
+        ast.UnOp: ('expr',),
+    }
+    # runtime helper that parses the next token of a line read by a multi-target readln
+    READ_HELPERS = {'integer': READ_INT_LABEL, 'boolean': READ_INT_LABEL, 'real': READ_REAL_LABEL}
+
+    def __init__(self, sink=None, opt_level=DEFAULT_OPT_LEVEL, source_map=False):
+        self.opt_level = opt_level
+        # source map side table: Pascal line of every emitted line, and the emitted line
+        # range of each subprogram and of the main block
+        self.positions = [] if source_map else None
+        self.regions = []
+        self.cur_line = None
+        self.sink = sink if sink is not None else ListSink()
+        # list mode exposes the emitted lines directly
+        self.instructions = getattr(self.sink, 'lines', None)
         self.label_id = 0
-        self.global_offsets = {}
-        self.global_arrays = {}
-        self.global_types = {}
+        self.global_arrays = []
         self.retval_offset = None
         self.temp_offsets = []
         self.temp_depth = 0
-        self.symtab = None
-        self.current_env = None  # maps name -> (kind, typ, offset, extra)
+        self.spills = 0  # operands stored to a temp slot (reported by --stats)
+        self.folded_calls = 0  # pure calls replaced by their result (-O2, idem)
+        self.folded = False  # fold_pure_calls already ran on the program
+        self.var_ranges = {}  # for variable -> value range inside its body (-O2)
+        self.runtime = set()  # runtime helpers called so far, emitted after STOP
+        self.string_pool = {}  # text -> global slot holding it (-O1)
+        self.statement_emitters = {cls: getattr(self, name) for cls, name in self.STATEMENT_EMITTERS.items()}
+        self.expr_emitters = {cls: getattr(self, name) for cls, name in self.EXPR_EMITTERS.items()}
 
     def mangle_label(self, name: str) -> str:
         safe = ''.join(ch for ch in name if ch.isalnum())
@@ -29,194 +157,438 @@ class CodeGen:
         return name
 
     def emit(self, line):
-        self.instructions.append(line)
-
-    def generate(self, program):
-        analyzer = Analyzer()
-        self.symtab = analyzer.analyze(program)
-        self.layout_globals(program)
+        self.sink.write(line)
+        if self.positions is not None:
+            self.positions.append(self.cur_line)
+
+    def generate(self, program, analyzer=None):
+        # the analyzer annotates every expression with its type and resolved Symbol,
+        # so emission below never recomputes types or looks names up again
+        analyzer = analyzer or Analyzer()
+        analyzer.analyze(program)
+        return self.emit_program(program, analyzer)
+
+    def fold_pure_calls(self, program):
+        # -O2, once per program: before emission, or earlier when a caller (the incremental
+        # compiler) needs the folded tree first
+        if self.opt_level >= 2 and not self.folded:
+            self.folded_calls = fold_calls(program)
+            self.folded = True
+
+    def emit_program(self, program, analyzer):
+        # emission only, for a program already annotated by analyzer
+        self.fold_pure_calls(program)
+        if self.opt_level >= 1:
+            self.string_pool = self.pooled_strings(program)
+        self.layout_globals(analyzer)
         main_label = 'MAIN'
         self.emit('START')
         self.emit(f'JUMP {main_label}')
         # emit subprograms first
         for sub in program.block.subprograms:
+            start = self.emitted()
+            self.cur_line = sub.lineno
             self.emit_subprogram(sub)
+            self.regions.append((sub.name, start, self.emitted()))
         # main block
+        start = self.emitted()
+        self.cur_line = program.lineno
         self.emit(f'{main_label}:')
-        self.current_env = None
+        self.init_strings()
         self.init_arrays()
-        self.emit_block(program.block, scope_env=None)
+        self.emit_block(program.block)
+        self.regions.append(('main', start, self.emitted() + 1))
         self.emit('STOP')
+        self.emit_runtime()
+        self.sink.close()
         return self.instructions
 
-    def layout_globals(self, program):
-        offset = 0
-        for decl_group in program.block.declarations:
-            for decl in decl_group:
-                name = decl.name.lower()
-                self.global_offsets[name] = offset
-                self.global_types[name] = decl.vartype
-                if decl.vartype.name == 'array':
-                    self.global_arrays[name] = decl.vartype
-                offset += 1
+    def layout_globals(self, analyzer):
+        self.global_arrays = [sym for sym in analyzer.globals if sym.bounds is not None]
+        offset = analyzer.global_count
         # reserve a global slot for function return values to avoid fp/sp ambiguity
         self.retval_offset = offset
-        self.global_offsets['__retval'] = offset
-        self.global_types['__retval'] = ast.Type('integer')
         offset += 1
+        offset = self.layout_registers(offset)
+        for text in self.string_pool:
+            self.string_pool[text] = offset
+            offset += 1
         # reserve several global temp slots to spill operands across CALLs
         temp_count = 4
         for i in range(temp_count):
-            name = f'__tmp{i}'
-            self.global_offsets[name] = offset
-            self.global_types[name] = ast.Type('integer')
             self.temp_offsets.append(offset)
             offset += 1
 
+    def layout_registers(self, offset):
+        # backends that keep values in global slots reserve them here (see codegen_slots)
+        return offset
+
+    def temp_slot(self, depth):
+        # nesting deeper than the reserved slots: extend the temp area on demand
+        while depth >= len(self.temp_offsets):
+            self.temp_offsets.append(self.temp_offsets[-1] + 1)
+        return self.temp_offsets[depth]
+
+    def pooled_strings(self, program):
+        # PUSHS allocates a new heap string every time it runs: texts that may be pushed
+        # more than once get a global slot, in order of first use
+        uses = self.string_uses(program.block)
+        return {text: None for text, many in uses.items() if many}
+
+    def string_uses(self, node):
+        # text -> whether it may be pushed more than once (used twice, or in a loop or a
+        # subprogram), for every string the emitters below push with PUSHS under node
+        uses = {}
+        children = self.STRING_CHILDREN
+        pending = [(node, False)]
+        pop = pending.pop
+        push = pending.append
+        while pending:
+            item, many = pop()
+            cls = type(item)
+            if cls is list:
+                pending.extend((child, many) for child in reversed(item))
+            elif cls is ast.Literal:
+                if item.typ == 'string':
+                    text = str(item.value)
+                    uses[text] = many or text in uses
+            elif cls is ast.ProcCall and item.name == 'writeln':
+                pieces = self.output_pieces(item.args) if self.opt_level >= 1 else item.args
+                for piece in reversed(pieces):
+                    push((ast.Literal(piece, 'string') if isinstance(piece, str) else piece, many))
+            elif cls is ast.BinOp and self.char_operand(item) is not None:
+                # compared as a character code: the literal becomes a PUSHI
+                push((self.char_operand(item), many))
+            else:
+                fields = children.get(cls)
+                if fields:
+                    if cls in self.REPEATING:
+                        many = True
+                    for name in fields:
+                        child = getattr(item, name)
+                        if child is not None:
+                            push((child, many))
+        return uses
+
+    def char_operand(self, expr):
+        # the non-literal side of a comparison with a one-character string literal
+        if expr.op not in ('=', '<>'):
+            return None
+        left, right = expr.left, expr.right
+        if (isinstance(left, ast.Literal) and left.typ == 'string' and len(str(left.value)) == 1
+                and not isinstance(right, ast.Literal)):
+            return right
+        if (isinstance(right, ast.Literal) and right.typ == 'string' and len(str(right.value)) == 1
+                and not isinstance(left, ast.Literal)):
+            return left
+        return None
+
+    def init_strings(self):
+        for text, slot in self.string_pool.items():
+            self.emit(f'PUSHS "{self.escape_string(text)}"')
+            self.emit(f'STOREG {slot}')
+
     def init_arrays(self):
-        for name, typ in self.global_arrays.items():
-            low, high = typ.range_bounds
-            size = high - low + 1
-            self.emit(f'PUSHI {size}')
+        for sym in self.global_arrays:
+            self.emit(f'PUSHI {sym.size}')
             self.emit('ALLOCN')
-            off = self.global_offsets[name]
-            self.emit(f'STOREG {off}')
+            self.emit(f'STOREG {sym.offset}')
 
-    def emit_block(self, block, scope_env):
-        prev_env = self.current_env
-        if scope_env is not None:
-            self.current_env = scope_env
+    def emit_block(self, block):
         for stmt in block.statements:
             self.emit_statement(stmt)
-        if scope_env is not None:
-            self.current_env = prev_env
-
-    def build_env_for_sub(self, sub):
-        env = {}
-        # parameters: last param at fp[-1] (VM CALL sets fp to sp after popping return addr)
-        param_count = len(sub.params)
-        for idx, p in enumerate(sub.params):
-            off = idx - param_count
-            env[p.name.lower()] = ('param', p.vartype, off, None)
-        # locals and return slot
-        locals_list = []
-        for decl_group in sub.block.declarations:
-            for decl in decl_group:
-                locals_list.append((decl.name.lower(), decl.vartype))
-        # function return slot
-        local_offset_start = 1
-        if isinstance(sub, ast.FunctionDecl):
-            env[sub.name.lower()] = ('ret', sub.return_type, local_offset_start, None)
-            local_offset_start += 1
-        off = local_offset_start
-        for name, typ in locals_list:
-            env[name] = ('local', typ, off, None)
-            off += 1
-        local_count = off - 1
-        return env, local_count
 
     def emit_subprogram(self, sub):
         label = self.mangle_label(f'FN{sub.name}')
-        env, local_count = self.build_env_for_sub(sub)
         self.emit(f'{label}:')
-        if local_count > 0:
-            self.emit(f'PUSHN {local_count}')
-        self.emit_block(sub.block, scope_env=env)
+        if sub.frame_size > 0:
+            self.emit(f'PUSHN {sub.frame_size}')
+        self.emit_local_arrays(sub)
+        self.emit_block(sub.block)
         if isinstance(sub, ast.FunctionDecl):
-            ret_entry = env[sub.name.lower()]
-            _, ret_type, ret_off, _ = ret_entry
+            ret_off = sub.ret_sym.offset
             # place return value at its dedicated slot (ret_off)
-            self.emit_load_offset(ret_off, ret_type)
+            self.emit_load_offset(ret_off, 'ret')
             self.emit(f'STOREL {ret_off}')
             # also store in reserved global so caller can read reliably
-            self.emit_load_offset(ret_off, ret_type)
+            self.emit_load_offset(ret_off, 'ret')
             self.emit(f'STOREG {self.retval_offset}')
+        self.emit_free_arrays(sub)
         self.emit('RETURN')
 
+    def emit_local_arrays(self, sub):
+        # every activation gets its own blocks for the local arrays
+        for sym in sub.local_arrays:
+            self.emit(f'PUSHI {sym.size}')
+            self.emit('ALLOCN')
+            self.emit(f'STOREL {sym.offset}')
+
+    def emit_free_arrays(self, sub):
+        # blocks whose address never leaves the activation are dead once it returns;
+        # the others are left to the VM's collector
+        if not sub.local_arrays:
+            return
+        escaping = escaping_names(sub)
+        for sym in sub.local_arrays:
+            if sym.name not in escaping:
+                self.emit(f'PUSHL {sym.offset}')
+                self.emit('FREE')
+
+    def emitted(self):
+        return len(self.positions) if self.positions is not None else 0
+
     def emit_statement(self, stmt):
-        if isinstance(stmt, ast.Assign):
-            val_type = self.emit_expression(stmt.expr)
-            self.emit_store(stmt.target, val_type)
-        elif isinstance(stmt, ast.If):
-            l_else = self.new_label('ELSE')
-            l_end = self.new_label('ENDIF')
-            self.emit_expression(stmt.cond)
-            self.emit(f'JZ {l_else}')
-            self.emit_statement(stmt.then_body)
-            self.emit(f'JUMP {l_end}')
-            self.emit(f'{l_else}:')
-            if stmt.else_body:
-                self.emit_statement(stmt.else_body)
-            self.emit(f'{l_end}:')
-        elif isinstance(stmt, ast.While):
-            l_start = self.new_label('WH')
-            l_end = self.new_label('WHE')
-            self.emit(f'{l_start}:')
-            self.emit_expression(stmt.cond)
-            self.emit(f'JZ {l_end}')
+        emitter = self.statement_emitters.get(type(stmt))
+        if emitter is None:
+            raise CodeGenError(f'Unsupported statement {stmt}')
+        outer = self.cur_line
+        if stmt.lineno is not None:
+            self.cur_line = stmt.lineno
+        emitter(stmt)
+        self.cur_line = outer
+
+    def emit_assign(self, stmt):
+        target = stmt.target
+        expr = stmt.expr
+        if self.opt_level >= 2 and target.etype == 'real':
+            expr = self.real_constant(expr)
+        if isinstance(target, ast.ArrayAccess) and (
+                has_call(target.index) or self.opt_level >= 1 and not has_call(expr)):
+            # address and index first, value on top: no spill. At O1 this is done whenever
+            # the value has no calls (side effects keep their source order); at any level
+            # when the index calls a function, which could clobber a spilled value's temp
+            self.emit_element_address(target)
+            self.emit_store_element(target, self.emit_expression(expr))
+            return
+        val_type = self.emit_expression(expr)
+        self.emit_store(target, val_type)
+
+    def emit_if(self, stmt):
+        l_else = self.new_label('ELSE')
+        l_end = self.new_label('ENDIF')
+        self.emit_expression(stmt.cond)
+        self.emit(f'JZ {l_else}')
+        self.emit_statement(stmt.then_body)
+        self.emit(f'JUMP {l_end}')
+        self.emit(f'{l_else}:')
+        if stmt.else_body:
+            self.emit_statement(stmt.else_body)
+        self.emit(f'{l_end}:')
+
+    def emit_while(self, stmt):
+        l_start = self.new_label('WH')
+        l_end = self.new_label('WHE')
+        self.emit(f'{l_start}:')
+        self.emit_expression(stmt.cond)
+        self.emit(f'JZ {l_end}')
+        self.emit_statement(stmt.body)
+        self.emit(f'JUMP {l_start}')
+        self.emit(f'{l_end}:')
+
+    def emit_for(self, stmt):
+        self.emit_assignment(stmt.var, stmt.start)
+        l_start = self.new_label('FOR')
+        l_end = self.new_label('FORE')
+        self.emit(f'{l_start}:')
+        self.emit_load(stmt.var)
+        end_type = self.emit_expression(stmt.end)
+        self.ensure_type('integer', end_type)
+        if stmt.downto:
+            self.emit('SUPEQ')
+        else:
+            self.emit('INFEQ')
+        self.emit(f'JZ {l_end}')
+        self.emit_for_body(stmt)
+        self.emit_load(stmt.var)
+        self.emit(f'PUSHI { -1 if stmt.downto else 1}')
+        self.emit('ADD')
+        self.emit_store(stmt.var, 'integer')
+        self.emit(f'JUMP {l_start}')
+        self.emit(f'{l_end}:')
+
+    def emit_for_body(self, stmt):
+        rng = loop_bounds(stmt, self.var_ranges) if self.opt_level >= 2 else None
+        if rng is None:
             self.emit_statement(stmt.body)
-            self.emit(f'JUMP {l_start}')
-            self.emit(f'{l_end}:')
-        elif isinstance(stmt, ast.For):
-            self.emit_assignment(stmt.var, stmt.start)
-            l_start = self.new_label('FOR')
-            l_end = self.new_label('FORE')
-            self.emit(f'{l_start}:')
-            self.emit_load(stmt.var)
-            end_type = self.emit_expression(stmt.end)
-            self.ensure_type('integer', end_type)
-            if stmt.downto:
-                self.emit('SUPEQ')
-            else:
-                self.emit('INFEQ')
-            self.emit(f'JZ {l_end}')
+            return
+        name = stmt.var.name
+        outer = self.var_ranges.get(name)
+        self.var_ranges[name] = rng
+        try:
             self.emit_statement(stmt.body)
-            self.emit_load(stmt.var)
-            self.emit(f'PUSHI { -1 if stmt.downto else 1}')
-            self.emit('ADD')
-            self.emit_store(stmt.var, 'integer')
-            self.emit(f'JUMP {l_start}')
-            self.emit(f'{l_end}:')
-        elif isinstance(stmt, ast.Repeat):
-            l_start = self.new_label('REP')
-            self.emit(f'{l_start}:')
-            for s in stmt.body:
-                self.emit_statement(s)
-            self.emit_expression(stmt.cond)
-            self.emit(f'JZ {l_start}')
-        elif isinstance(stmt, ast.ProcCall):
-            if stmt.name == 'writeln':
-                for arg in stmt.args:
-                    t = self.emit_expression(arg)
-                    self.emit_write(t)
-                self.emit('WRITELN')
-            elif stmt.name == 'readln':
-                for arg in stmt.args:
-                    self.emit_read_into(arg)
+        finally:
+            if outer is None:
+                del self.var_ranges[name]
             else:
-                # user-defined procedure
-                self.emit_call(stmt.name, stmt.args, expect_result=False)
-        elif isinstance(stmt, ast.Compound):
-            for s in stmt.statements:
-                self.emit_statement(s)
-        elif isinstance(stmt, ast.NoOp):
-            return
+                self.var_ranges[name] = outer
+
+    def emit_repeat(self, stmt):
+        l_start = self.new_label('REP')
+        self.emit(f'{l_start}:')
+        for s in stmt.body:
+            self.emit_statement(s)
+        self.emit_expression(stmt.cond)
+        self.emit(f'JZ {l_start}')
+
+    def emit_proc_call(self, stmt):
+        if stmt.name == 'writeln':
+            self.emit_writeln(stmt.args)
+        elif stmt.name == 'readln':
+            if len(stmt.args) > 1 and all(arg.etype in self.READ_HELPERS for arg in stmt.args):
+                self.emit_read_line(stmt.args)
+                return
+            for arg in stmt.args:
+                self.emit_read_into(arg)
         else:
-            raise CodeGenError(f'Unsupported statement {stmt}')
+            # user-defined procedure
+            self.emit_call(stmt.name, stmt.args, expect_result=False)
+
+    def emit_compound(self, stmt):
+        for s in stmt.statements:
+            self.emit_statement(s)
+
+    def emit_noop(self, stmt):
+        return
 
     def emit_read_into(self, target):
+        if not isinstance(target, (ast.Var, ast.ArrayAccess)):
+            raise CodeGenError('readln expects variables')
+        in_place = self.opt_level >= 1 and isinstance(target, ast.ArrayAccess)
+        if in_place:
+            self.emit_element_address(target)
         self.emit('READ')
-        if isinstance(target, (ast.Var, ast.ArrayAccess)):
-            target_type = self.get_lvalue_type(target)
-            if target_type == 'integer':
-                self.emit('ATOI')
-            elif target_type == 'real':
-                self.emit('ATOF')
-            elif target_type == 'boolean':
-                self.emit('ATOI')
+        target_type = target.etype
+        if target_type == 'integer':
+            self.emit('ATOI')
+        elif target_type == 'real':
+            self.emit('ATOF')
+        elif target_type == 'boolean':
+            self.emit('ATOI')
+        if in_place:
+            self.emit_store_element(target, target_type)
+        else:
             self.emit_store(target, target_type)
+
+    def emit_read_line(self, targets):
+        # a single READ for all targets: the line and the scan position stay on the stack
+        # as the first two arguments of each helper call, which parses the next token into
+        # the third one and advances the position in place. String targets would need a
+        # substring instruction the VM lacks, so those keep one line per target.
+        self.emit('READ')
+        self.emit('PUSHI 0')
+        for target in targets:
+            if not isinstance(target, (ast.Var, ast.ArrayAccess)):
+                raise CodeGenError('readln expects variables')
+            label = self.READ_HELPERS[target.etype]
+            self.runtime.add(label)
+            self.emit('PUSHI 0')
+            self.emit(f'PUSHA {label}')
+            self.emit('CALL')
+            self.emit_store(target, target.etype)
+        self.emit('POP 2')
+
+    def emit_runtime(self):
+        # fixed order so the output does not depend on which readln came first
+        self.cur_line = None
+        for label, real in ((READ_INT_LABEL, False), (READ_REAL_LABEL, True)):
+            if label in self.runtime:
+                start = self.emitted()
+                self.emit_read_helper(label, real)
+                self.regions.append((label, start, self.emitted()))
+
+    def emit_read_helper(self, label, real):
+        # fp[-3] line, fp[-2] position, fp[-1] result; locals: 0 length, 1 sign, 2 integer
+        # part, 3 digit, and for reals 4 fraction digits, 5 fraction scale. Blanks (codes
+        # <= 32) are skipped, then an optional '-', digits and, for reals, '.' and digits;
+        # a missing number reads as 0. The entry jumps over a RETURN so that an executor
+        # can replace the first instruction by a native version (see src.vm --batch).
+        end = f'{label}END'
+        self.emit(f'{label}:')
+        self.emit(f'JUMP {label}GO')
+        self.emit('RETURN')
+        self.emit(f'{label}GO:')
+        self.emit(f'PUSHN {6 if real else 4}')
+        self.emit_lines('PUSHL -3', 'STRLEN', 'STOREL 0', 'PUSHI 1', 'STOREL 1')
+        if real:
+            self.emit_lines('PUSHI 1', 'STOREL 5')
+        self.emit(f'{label}SKIP:')
+        self.emit_lines('PUSHL -2', 'PUSHL 0', 'INF', f'JZ {end}')
+        self.emit_lines('PUSHL -3', 'PUSHL -2', 'CHARAT', 'PUSHI 32', 'INFEQ', f'JZ {label}SIGN')
+        self.emit_advance()
+        self.emit(f'JUMP {label}SKIP')
+        self.emit(f'{label}SIGN:')
+        self.emit_lines('PUSHL -3', 'PUSHL -2', 'CHARAT', 'PUSHI 45', 'EQUAL', f'JZ {label}INT')
+        self.emit_lines('PUSHI -1', 'STOREL 1')
+        self.emit_advance()
+        self.emit_digits(f'{label}INT', 2, end, f'{label}DOT' if real else end)
+        if real:
+            self.emit(f'{label}DOT:')
+            self.emit_lines('PUSHL -3', 'PUSHL -2', 'CHARAT', 'PUSHI 46', 'EQUAL', f'JZ {end}')
+            self.emit_advance()
+            self.emit_digits(f'{label}FRAC', 4, end, end, scale=5)
+        self.emit(f'{end}:')
+        if real:
+            self.emit_lines('PUSHL 2', 'ITOF', 'PUSHL 4', 'ITOF', 'PUSHL 5', 'ITOF', 'FDIV', 'FADD',
+                            'PUSHL 1', 'ITOF', 'FMUL')
         else:
-            raise CodeGenError('readln expects variables')
+            self.emit_lines('PUSHL 2', 'PUSHL 1', 'MUL')
+        self.emit_lines('STOREL -1', 'RETURN')
+
+    def emit_digits(self, label, acc, at_end, at_other, scale=None):
+        # acc = acc * 10 + digit while the position holds a decimal digit
+        self.emit(f'{label}:')
+        self.emit_lines('PUSHL -2', 'PUSHL 0', 'INF', f'JZ {at_end}')
+        self.emit_lines('PUSHL -3', 'PUSHL -2', 'CHARAT', 'PUSHI 48', 'SUB', 'STOREL 3')
+        self.emit_lines('PUSHL 3', 'PUSHI 0', 'SUPEQ', 'PUSHL 3', 'PUSHI 9', 'INFEQ', 'AND',
+                        f'JZ {at_other}')
+        self.emit_lines(f'PUSHL {acc}', 'PUSHI 10', 'MUL', 'PUSHL 3', 'ADD', f'STOREL {acc}')
+        if scale is not None:
+            self.emit_lines(f'PUSHL {scale}', 'PUSHI 10', 'MUL', f'STOREL {scale}')
+        self.emit_advance()
+        self.emit(f'JUMP {label}')
+
+    def emit_advance(self):
+        self.emit_lines('PUSHL -2', 'PUSHI 1', 'ADD', 'STOREL -2')
+
+    def emit_lines(self, *lines):
+        for line in lines:
+            self.emit(line)
+
+    def emit_writeln(self, args):
+        pieces = self.output_pieces(args) if self.opt_level >= 1 else args
+        for piece in pieces:
+            if isinstance(piece, str):
+                self.emit_string(piece)
+                self.emit('WRITES')
+            else:
+                self.emit_write(self.emit_expression(piece))
+        self.emit('WRITELN')
+
+    def output_pieces(self, args):
+        # runs of compile-time constant arguments become one preformatted string
+        pieces = []
+        for arg in args:
+            text = self.constant_text(arg)
+            if text is None:
+                pieces.append(arg)
+            elif pieces and isinstance(pieces[-1], str):
+                pieces[-1] += text
+            elif text:
+                pieces.append(text)
+        return pieces
+
+    def constant_text(self, expr):
+        # text written for a constant argument, or None
+        negate = isinstance(expr, ast.UnOp) and expr.op == '-'
+        if negate:
+            expr = expr.expr
+        if not isinstance(expr, ast.Literal):
+            return None
+        if expr.typ == 'string':
+            return None if negate else str(expr.value)
+        if expr.typ == 'integer' or expr.typ == 'boolean':
+            return str(-int(expr.value) if negate else int(expr.value))
+        return format_real(-float(expr.value) if negate else float(expr.value))
 
     def emit_write(self, expr_type):
         if expr_type == 'integer' or expr_type == 'boolean':
@@ -234,39 +606,63 @@ class CodeGen:
 
     def emit_store(self, target, val_type):
         if isinstance(target, ast.Var):
-            target_type, kind, off = self.resolve_name(target.name)
+            sym = target.sym
+            target_type = sym.typ
             if target_type == 'real' and val_type == 'integer':
                 self.emit('ITOF')
                 val_type = 'real'
             self.ensure_type(target_type, val_type)
-            self.emit_store_offset(off, kind)
+            self.emit_store_offset(sym.offset, sym.kind)
         elif isinstance(target, ast.ArrayAccess):
-            base_type, kind, base_off = self.resolve_name(target.array.name)
-            # string indexing handled differently
-            if base_type == 'string':
-                # cannot store into string char
-                raise CodeGenError('Cannot assign to string character')
-            arr_typ = self.get_array_type(target.array.name)
-            low = arr_typ.range_bounds[0]
-            target_type = arr_typ.base.name
-            if target_type == 'real' and val_type == 'integer':
-                self.emit('ITOF')
-                val_type = 'real'
-            self.ensure_type(target_type, val_type)
-            # spill value to temp to rebuild stack as (addr, idx, val)
-            temp_slot = self.temp_offsets[0]
+            target_type = self.element_target(target).typ
+            val_type = self.coerce_value(target_type, val_type)
+            # spill value to temp to rebuild stack as (addr, idx, val); the index may use
+            # temps itself, so it is evaluated one temp level deeper
+            temp_slot = self.temp_slot(self.temp_depth)
             self.emit(f'STOREG {temp_slot}')
-            self.emit_push_address(base_off, kind)
-            idx_type = self.emit_expression(target.index)
-            self.ensure_type('integer', idx_type)
-            if low != 0:
-                self.emit(f'PUSHI {low}')
-                self.emit('SUB')
+            self.spills += 1
+            self.temp_depth += 1
+            try:
+                self.emit_element_address(target)
+            finally:
+                self.temp_depth -= 1
             self.emit(f'PUSHG {temp_slot}')
             self.emit_store_index(target_type)
         else:
             raise CodeGenError('Invalid assignment target')
 
+    def element_target(self, target):
+        sym = target.array.sym
+        # string indexing handled differently
+        if sym.bounds is None:
+            # cannot store into string char
+            raise CodeGenError('Cannot assign to string character')
+        return sym
+
+    def coerce_value(self, target_type, val_type):
+        if target_type == 'real' and val_type == 'integer':
+            self.emit('ITOF')
+            val_type = 'real'
+        self.ensure_type(target_type, val_type)
+        return val_type
+
+    def emit_element_address(self, target):
+        # pushes (base address, 0-based index) of an array element store
+        sym = self.element_target(target)
+        self.emit_push_address(sym.offset, sym.kind)
+        idx_type = self.emit_expression(target.index)
+        self.ensure_type('integer', idx_type)
+        low = sym.bounds[0]
+        if low != 0:
+            self.emit(f'PUSHI {low}')
+            self.emit('SUB')
+
+    def emit_store_element(self, target, val_type):
+        # O1: address and index are already below the value, no temp needed
+        target_type = target.array.sym.typ
+        self.coerce_value(target_type, val_type)
+        self.emit_store_index(target_type)
+
     def emit_store_index(self, val_type):
         # Stack: base, index, value should be in that order for STOREN
         if val_type == 'real':
@@ -276,13 +672,13 @@ class CodeGen:
 
     def emit_load(self, var):
         if isinstance(var, ast.Var):
-            typ, kind, off = self.resolve_name(var.name)
-            self.emit_load_offset(off, kind)
-            return self.normalize_type(typ)
+            sym = var.sym
+            self.emit_load_offset(sym.offset, sym.kind)
+            return sym.typ
         if isinstance(var, ast.ArrayAccess):
-            base_type, kind, base_off = self.resolve_name(var.array.name)
-            if base_type == 'string':
-                self.emit_push_address(base_off, kind)
+            sym = var.array.sym
+            if sym.bounds is None:
+                self.emit_push_address(sym.offset, sym.kind)
                 idx_type = self.emit_expression(var.index)
                 self.ensure_type('integer', idx_type)
                 # adjust from 1-based to 0-based for VM CHARAT
@@ -290,97 +686,153 @@ class CodeGen:
                 self.emit('SUB')
                 self.emit('CHARAT')
                 return 'integer'
-            arr_typ = self.get_array_type(var.array.name)
-            low = arr_typ.range_bounds[0]
-            self.emit_push_address(base_off, kind)
+            low = sym.bounds[0]
+            self.emit_push_address(sym.offset, sym.kind)
             idx_type = self.emit_expression(var.index)
             self.ensure_type('integer', idx_type)
             if low != 0:
                 self.emit(f'PUSHI {low}')
                 self.emit('SUB')
             self.emit('LOADN')
-            return arr_typ.base.name
+            return sym.typ
         raise CodeGenError('Invalid load')
 
     def emit_expression(self, expr):
-        if isinstance(expr, ast.Literal):
-            if expr.typ == 'integer' or expr.typ == 'boolean':
-                self.emit(f'PUSHI {int(expr.value)}')
-            elif expr.typ == 'real':
-                self.emit(f'PUSHF {float(expr.value)}')
-            elif expr.typ == 'string':
-                self.emit(f'PUSHS "{self.escape_string(expr.value)}"')
-            return expr.typ
-        if isinstance(expr, ast.Var):
-            return self.emit_load(expr)
-        if isinstance(expr, ast.ArrayAccess):
-            return self.emit_load(expr)
-        if isinstance(expr, ast.BinOp):
-            # handle char literal vs integer compare
-            if expr.op in ('=', '<>'):
-                if isinstance(expr.left, ast.Literal) and expr.left.typ == 'string' and len(str(expr.left.value)) == 1 and not isinstance(expr.right, ast.Literal):
-                    expr = ast.BinOp(ast.Literal(ord(expr.left.value), 'integer'), expr.op, expr.right)
-                elif isinstance(expr.right, ast.Literal) and expr.right.typ == 'string' and len(str(expr.right.value)) == 1 and not isinstance(expr.left, ast.Literal):
-                    expr = ast.BinOp(expr.left, expr.op, ast.Literal(ord(expr.right.value), 'integer'))
-            temp_slot = self.temp_offsets[self.temp_depth]
-            self.temp_depth += 1
-            try:
-                lt = self.emit_expression(expr.left)
-                # spill left to dedicated temp to survive nested CALLs when evaluating right
-                self.emit(f'STOREG {temp_slot}')
-                rt = self.emit_expression(expr.right)
-                self.emit(f'PUSHG {temp_slot}')
-                self.emit('SWAP')
-            finally:
-                self.temp_depth -= 1
-            op = expr.op
-            if op in ('+', '-', '*', 'div', 'mod', '/',):
-                res_type = self.numeric_result(lt, rt, op)
-                self.coerce_stack(lt, rt, res_type)
-                self.emit_numeric_op(op, res_type)
-                return res_type
-            if op in ('<', '<=', '>', '>=', '=', '<>'):
-                res_type = 'boolean'
-                cmp_type = 'real' if lt == 'real' or rt == 'real' else 'integer'
-                self.coerce_stack(lt, rt, cmp_type)
-                self.emit_compare(op, cmp_type)
-                return res_type
-            if op in ('and', 'or'):
-                self.emit(op.upper())
-                return 'boolean'
-            if op == '+':
-                if lt == 'string' and rt == 'string':
-                    self.emit('CONCAT')
-                    return 'string'
-            raise CodeGenError(f'Unsupported binary op {op}')
-        if isinstance(expr, ast.UnOp):
-            t = self.emit_expression(expr.expr)
-            if expr.op == 'not':
-                self.emit('NOT')
-                return 'boolean'
-            if expr.op == '-':
-                if t == 'real':
-                    self.emit('PUSHF 0.0')
-                else:
-                    self.emit('PUSHI 0')
-                self.emit('SWAP')
-                op = 'FSUB' if t == 'real' else 'SUB'
-                self.emit(op)
-                return t
-            raise CodeGenError(f'Unsupported unary op {expr.op}')
-        if isinstance(expr, ast.FuncCall):
-            if expr.name.lower() == 'length':
-                t = self.emit_expression(expr.args[0])
-                if t != 'string':
-                    # convert non-string to string before STRLEN
-                    self.emit('STRI')
-                self.emit('STRLEN')
-                return 'integer'
-            # user-defined function
-            self.emit_call(expr.name, expr.args, expect_result=True)
-            # assume declared type
-            return self.lookup_type(expr.name)
-        raise CodeGenError(f'Unsupported expression {expr}')
+        emitter = self.expr_emitters.get(type(expr))
+        if emitter is None:
+            raise CodeGenError(f'Unsupported expression {expr}')
+        return emitter(expr)
+
+    def emit_literal(self, expr):
+        if expr.typ == 'integer' or expr.typ == 'boolean':
+            self.emit(f'PUSHI {int(expr.value)}')
+        elif expr.typ == 'real':
+            self.emit(f'PUSHF {float(expr.value)}')
+        elif expr.typ == 'string':
+            self.emit_string(str(expr.value))
+        return expr.typ
+
+    def emit_binop(self, expr):
+        if self.opt_level >= 2:
+            reduced = self.reduce_binop(expr)
+            if reduced is not expr:
+                return self.emit_expression(reduced)
+        # handle char literal vs integer compare
+        if expr.op in ('=', '<>'):
+            if isinstance(expr.left, ast.Literal) and expr.left.typ == 'string' and len(str(expr.left.value)) == 1 and not isinstance(expr.right, ast.Literal):
+                expr = ast.BinOp(ast.Literal(ord(expr.left.value), 'integer'), expr.op, expr.right)
+            elif isinstance(expr.right, ast.Literal) and expr.right.typ == 'string' and len(str(expr.right.value)) == 1 and not isinstance(expr.left, ast.Literal):
+                expr = ast.BinOp(expr.left, expr.op, ast.Literal(ord(expr.right.value), 'integer'))
+        if self.opt_level >= 1 or has_call(expr.right):
+            # arguments are popped after every CALL, so the left operand stays intact
+            # on the stack while the right one is evaluated: no spill needed. A call on
+            # the right never spills, as a recursive call would reuse the same temp
+            lt = self.emit_expression(expr.left)
+            rt = self.emit_expression(expr.right)
+            return self.emit_binop_tail(expr.op, lt, rt)
+        temp_slot = self.temp_slot(self.temp_depth)
+        self.temp_depth += 1
+        try:
+            lt = self.emit_expression(expr.left)
+            # spill left to dedicated temp to survive nested CALLs when evaluating right
+            self.emit(f'STOREG {temp_slot}')
+            self.spills += 1
+            rt = self.emit_expression(expr.right)
+            self.emit(f'PUSHG {temp_slot}')
+            self.emit('SWAP')
+        finally:
+            self.temp_depth -= 1
+        return self.emit_binop_tail(expr.op, lt, rt)
+
+    def reduce_binop(self, expr):
+        # -O2: an equivalent cheaper expression, or expr itself
+        op = expr.op
+        if op == 'div' or op == 'mod':
+            if expr.etype != 'integer':
+                return expr
+            divisor = bounds(expr.right, self.var_ranges)
+            if divisor is None or divisor[0] != divisor[1]:
+                return expr
+            # |x| < |c|: x mod c = x and x div c = 0
+            limit = abs(divisor[0])
+            value = bounds(expr.left, self.var_ranges)
+            if value is None or value[0] <= -limit or value[1] >= limit:
+                return expr
+            if op == 'mod':
+                return expr.left
+            if has_call(expr.left):
+                return expr
+            zero = ast.Literal(0, 'integer')
+            zero.etype = 'integer'
+            return zero
+        if op in ('and', 'or') or 'real' not in (expr.left.etype, expr.right.etype, expr.etype):
+            return expr
+        left = self.real_constant(expr.left)
+        right = self.real_constant(expr.right)
+        if left is expr.left and right is expr.right:
+            return expr
+        reduced = ast.BinOp(left, op, right)
+        reduced.etype = expr.etype
+        return reduced
+
+    def real_constant(self, expr):
+        # an integer constant used as a real is pushed with PUSHF instead of PUSHI + ITOF
+        if expr.etype != 'integer' or has_call(expr):
+            return expr
+        value = bounds(expr, self.var_ranges)
+        if value is None or value[0] != value[1]:
+            return expr
+        literal = ast.Literal(float(value[0]), 'real')
+        literal.etype = 'real'
+        return literal
+
+    def emit_binop_tail(self, op, lt, rt):
+        if op == '+' and lt == 'string' and rt == 'string':
+            self.emit('CONCAT')
+            return 'string'
+        if op in ('+', '-', '*', 'div', 'mod', '/',):
+            res_type = self.numeric_result(lt, rt, op)
+            self.coerce_stack(lt, rt, res_type)
+            self.emit_numeric_op(op, res_type)
+            return res_type
+        if op in ('<', '<=', '>', '>=', '=', '<>'):
+            res_type = 'boolean'
+            cmp_type = 'real' if lt == 'real' or rt == 'real' else 'integer'
+            self.coerce_stack(lt, rt, cmp_type)
+            self.emit_compare(op, cmp_type)
+            return res_type
+        if op in ('and', 'or'):
+            self.emit(op.upper())
+            return 'boolean'
+        raise CodeGenError(f'Unsupported binary op {op}')
+
+    def emit_unop(self, expr):
+        t = self.emit_expression(expr.expr)
+        if expr.op == 'not':
+            self.emit('NOT')
+            return 'boolean'
+        if expr.op == '-':
+            if t == 'real':
+                self.emit('PUSHF 0.0')
+            else:
+                self.emit('PUSHI 0')
+            self.emit('SWAP')
+            op = 'FSUB' if t == 'real' else 'SUB'
+            self.emit(op)
+            return t
+        raise CodeGenError(f'Unsupported unary op {expr.op}')
+
+    def emit_func_call(self, expr):
+        if expr.name == 'length':
+            t = self.emit_expression(expr.args[0])
+            if t != 'string':
+                # convert non-string to string before STRLEN
+                self.emit('STRI')
+            self.emit('STRLEN')
+            return 'integer'
+        # user-defined function; result type resolved by the analyzer
+        self.emit_call(expr.name, expr.args, expect_result=True)
+        return expr.etype
 
     def emit_call(self, name, args, expect_result):
         # push args in order
@@ -388,27 +840,13 @@ class CodeGen:
             self.emit_expression(a)
         self.emit(f'PUSHA {self.mangle_label(f"FN{name}")}')
         self.emit('CALL')
+        if args:
+            # the callee leaves its arguments below fp; drop them to keep the stack balanced
+            self.emit(f'POP {len(args)}')
         if expect_result:
             # retrieve return value from reserved global slot
             self.emit(f'PUSHG {self.retval_offset}')
 
-    def resolve_name(self, name):
-        lname = name.lower()
-        if self.current_env and lname in self.current_env:
-            kind, typ, off, _ = self.current_env[lname]
-            return self.normalize_type(typ), kind, off
-        if lname in self.global_offsets:
-            typ = self.global_types[lname]
-            return self.normalize_type(typ), 'global', self.global_offsets[lname]
-        raise CodeGenError(f'Unknown identifier {name}')
-
-    def get_array_type(self, name):
-        lname = name.lower()
-        if self.current_env and lname in self.current_env:
-            typ = self.current_env[lname][1]
-            return typ
-        return self.global_arrays[lname]
-
     def emit_push_address(self, off, kind):
         if kind == 'global':
             self.emit(f'PUSHG {off}')
@@ -433,18 +871,12 @@ class CodeGen:
         elif kind == 'global':
             self.emit(f'STOREG {off}')
 
-    def lookup_type(self, name):
-        lname = name.lower()
-        if self.current_env and lname in self.current_env:
-            return self.normalize_type(self.current_env[lname][1])
-        if lname in self.global_types:
-            return self.normalize_type(self.global_types[lname])
-        return 'integer'
-
-    def normalize_type(self, typ):
-        if isinstance(typ, ast.Type):
-            return typ.name
-        return typ
+    def emit_string(self, text):
+        slot = self.string_pool.get(text)
+        if slot is None:
+            self.emit(f'PUSHS "{self.escape_string(text)}"')
+        else:
+            self.emit(f'PUSHG {slot}')
 
     def escape_string(self, s: str) -> str:
         # Escape characters for VM string literal using double quotes
@@ -511,12 +943,3 @@ class CodeGen:
             return
         if expected != found:
             raise CodeGenError(f'Type mismatch: expected {expected}, got {found}')
-
-    def get_lvalue_type(self, lvalue):
-        if isinstance(lvalue, ast.Var):
-            sym = self.symtab.lookup(lvalue.name)
-            return sym.typ
-        if isinstance(lvalue, ast.ArrayAccess):
-            typ = self.get_array_type(lvalue.array.name)
-            return typ.base.name
-        raise CodeGenError('Invalid lvalue')
\ No newline at end of file
@@ -0,0 +1,359 @@
+"""Avaliação em tempo de compilação de funções puras (-O2).
+
+Uma FunctionDecl é pura quando o corpo só usa os seus parâmetros, locais e o próprio nome
+(sem globais), não chama procedimentos (o que exclui readln/writeln) e só chama length e
+outras funções puras; a análise é sintática e por isso também serve à compilação
+incremental, antes do Analyzer. As chamadas a funções puras cujos argumentos são
+constantes são executadas por um interpretador da AST com a semântica de src.vm e, se
+terminarem dentro do orçamento de passos, substituídas pelo Literal do resultado.
+"""
+
+import math
+
+from . import ast
+from .ranges import trunc_div
+
+STEP_BUDGET = 20000  # instruções e chamadas executadas por avaliação
+MAX_DEPTH = 100      # chamadas aninhadas (recursão) por avaliação
+INT_RANGE = (-2 ** 31, 2 ** 31 - 1)  # inteiros maiores dependem da VM: não se dobram
+RESULT_TYPES = {'integer': int, 'boolean': int, 'real': float, 'string': str}
+
+
+class Unfoldable(Exception):
+    pass
+
+
+# erros de uma avaliação que apenas impedem a dobragem (divisão por zero, tipos mistos, ...)
+EVAL_ERRORS = (Unfoldable, ArithmeticError, TypeError, ValueError, IndexError, RecursionError)
+
+
+def local_names(sub):
+    '''Nome -> tipo declarado (ast.Type ou nome) dos parâmetros, locais e resultado.'''
+    names = {p.name: p.vartype for p in sub.params}
+    for group in sub.block.declarations:
+        for decl in group:
+            names[decl.name] = decl.vartype
+    names[sub.name] = sub.return_type
+    return names
+
+
+def callees(sub, bound):
+    '''Funções chamadas por sub, ou None se sub não puder ser pura por si só.'''
+    if sub.block.subprograms or any(p.byref for p in sub.params):
+        return None
+    called = set()
+    for node in ast.walk(sub.block.statements):
+        if isinstance(node, ast.Var):
+            if node.name not in bound:
+                return None
+        elif isinstance(node, ast.FuncCall):
+            if node.name != 'length':
+                called.add(node.name)
+        elif isinstance(node, ast.ProcCall):
+            return None
+    return called
+
+
+def pure_functions(program):
+    '''Nome -> FunctionDecl das funções de topo puras.'''
+    calls = {}
+    for sub in program.block.subprograms:
+        if isinstance(sub, ast.FunctionDecl):
+            called = callees(sub, local_names(sub))
+            if called is not None:
+                calls[sub.name] = (sub, called)
+    # uma função que chama outra impura (ou inexistente) deixa também de ser pura
+    changed = True
+    while changed:
+        changed = False
+        for name, (sub, called) in list(calls.items()):
+            if not called <= calls.keys():
+                del calls[name]
+                changed = True
+    return {name: sub for name, (sub, _) in calls.items()}
+
+
+def fold_calls(program):
+    '''Substitui as chamadas puras com argumentos constantes pelo resultado; devolve quantas.'''
+    pure = pure_functions(program)
+    if not pure:
+        return 0
+    folder = Folder(Evaluator(pure))
+    folder.visit(program.block)
+    return folder.folded
+
+
+def type_name(typ):
+    return typ.name if isinstance(typ, ast.Type) else typ
+
+
+class Folder:
+    '''Percorre a árvore trocando, de dentro para fora, as chamadas que o Evaluator resolve.'''
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self.folded = 0
+
+    def visit(self, node):
+        for name in type(node)._fields:
+            value = getattr(node, name)
+            if isinstance(value, ast.Expr):
+                setattr(node, name, self.fold(value))
+            elif isinstance(value, ast.Node):
+                self.visit(value)
+            elif isinstance(value, list):
+                self.visit_list(value)
+
+    def visit_list(self, items):
+        for i, item in enumerate(items):
+            if isinstance(item, ast.Expr):
+                items[i] = self.fold(item)
+            elif isinstance(item, ast.Node):
+                self.visit(item)
+            elif isinstance(item, list):
+                self.visit_list(item)
+
+    def fold(self, expr):
+        self.visit(expr)
+        if not isinstance(expr, ast.FuncCall) or expr.name not in self.evaluator.pure:
+            return expr
+        sub = self.evaluator.pure[expr.name]
+        typ = type_name(sub.return_type)
+        try:
+            value = self.evaluator.constant_call(expr.name, expr.args)
+        except Unfoldable:
+            return expr
+        if type(value) is not RESULT_TYPES.get(typ):
+            return expr
+        if typ == 'real' and not math.isfinite(value):
+            return expr
+        if typ == 'integer' and not INT_RANGE[0] <= value <= INT_RANGE[1]:
+            return expr
+        literal = ast.Literal(value, typ, expr.lineno, expr.col)
+        literal.etype = typ
+        self.folded += 1
+        return literal
+
+
+class Evaluator:
+    '''Interpretador da AST para as funções puras, com a semântica das instruções de src.vm.'''
+
+    def __init__(self, pure):
+        self.pure = pure
+        self.memo = {}
+        self.layouts = {}
+        self.steps = 0
+        self.depth = 0
+
+    def constant_call(self, name, exprs):
+        '''Resultado de name(exprs) com argumentos constantes; levanta Unfoldable se não for possível.'''
+        # os argumentos são avaliados com o orçamento e a profundidade repostos, como a chamada
+        self.steps = 0
+        self.depth = 0
+        try:
+            args = [self.evaluate(arg, {}) for arg in exprs]
+        except EVAL_ERRORS:
+            raise Unfoldable(name) from None
+        return self.call_value(name, args)
+
+    def call_value(self, name, args):
+        '''Resultado de name(args) com args constantes; levanta Unfoldable se não for possível.'''
+        key = (name, tuple((type(v), v) for v in args))
+        if key not in self.memo:
+            self.steps = 0
+            self.depth = 0
+            try:
+                self.memo[key] = self.call(name, list(args))
+            except EVAL_ERRORS:
+                self.memo[key] = None
+        result = self.memo[key]
+        if result is None:
+            raise Unfoldable(name)
+        return result
+
+    def layout(self, sub):
+        # (tipos escalares, arrays locais como (limite inferior, tamanho)), por função
+        layout = self.layouts.get(sub.name)
+        if layout is None:
+            types = {}
+            arrays = {}
+            for name, typ in local_names(sub).items():
+                if isinstance(typ, ast.Type) and typ.name == 'array':
+                    low, high = typ.range_bounds
+                    arrays[name] = (low, high - low + 1)
+                    types[name] = type_name(typ.base)
+                else:
+                    types[name] = type_name(typ)
+            layout = self.layouts[sub.name] = (types, arrays)
+        return layout
+
+    def call(self, name, args):
+        sub = self.pure[name]
+        if len(args) != len(sub.params) or self.depth >= MAX_DEPTH:
+            raise Unfoldable(name)
+        self.tick()
+        types, arrays = self.layout(sub)
+        # como PUSHN/ALLOCN: escalares e elementos começam a 0; os argumentos passam sem ITOF
+        env = dict.fromkeys(types, 0)
+        for decl_name, (low, size) in arrays.items():
+            env[decl_name] = [0] * size
+        for param, value in zip(sub.params, args):
+            env[param.name] = value
+        self.depth += 1
+        try:
+            for stmt in sub.block.statements:
+                self.execute(stmt, env, types, arrays)
+        finally:
+            self.depth -= 1
+        return env[name]
+
+    def tick(self):
+        self.steps += 1
+        if self.steps > STEP_BUDGET:
+            raise Unfoldable('step budget exceeded')
+
+    def execute(self, stmt, env, types, arrays):
+        self.tick()
+        if isinstance(stmt, ast.Assign):
+            value = self.evaluate(stmt.expr, env, arrays)
+            target = stmt.target
+            if isinstance(target, ast.Var):
+                env[target.name] = self.coerce(types[target.name], value)
+            else:
+                name = target.array.name
+                if name not in arrays:
+                    raise Unfoldable(name)
+                low, size = arrays[name]
+                index = self.evaluate(target.index, env, arrays) - low
+                if not 0 <= index < size:
+                    raise Unfoldable(name)
+                env[name][index] = self.coerce(types[name], value)
+        elif isinstance(stmt, ast.If):
+            if self.evaluate(stmt.cond, env, arrays):
+                self.execute(stmt.then_body, env, types, arrays)
+            elif stmt.else_body:
+                self.execute(stmt.else_body, env, types, arrays)
+        elif isinstance(stmt, ast.While):
+            while self.evaluate(stmt.cond, env, arrays):
+                self.execute(stmt.body, env, types, arrays)
+                self.tick()
+        elif isinstance(stmt, ast.For):
+            # o limite é reavaliado em cada iteração, como no código emitido
+            name = stmt.var.name
+            env[name] = self.coerce(types[name], self.evaluate(stmt.start, env, arrays))
+            step = -1 if stmt.downto else 1
+            while (env[name] >= self.evaluate(stmt.end, env, arrays) if stmt.downto
+                   else env[name] <= self.evaluate(stmt.end, env, arrays)):
+                self.execute(stmt.body, env, types, arrays)
+                env[name] = self.integer(env[name] + step)
+                self.tick()
+        elif isinstance(stmt, ast.Repeat):
+            while True:
+                for s in stmt.body:
+                    self.execute(s, env, types, arrays)
+                if self.evaluate(stmt.cond, env, arrays):
+                    break
+                self.tick()
+        elif isinstance(stmt, ast.Compound):
+            for s in stmt.statements:
+                self.execute(s, env, types, arrays)
+        elif not isinstance(stmt, ast.NoOp):
+            raise Unfoldable(type(stmt).__name__)
+
+    def integer(self, value):
+        # um resultado intermédio fora de 32 bits daria a volta numa VM de 32 bits
+        if not INT_RANGE[0] <= value <= INT_RANGE[1]:
+            raise Unfoldable('integer overflow')
+        return value
+
+    def coerce(self, typ, value):
+        # ITOF nas atribuições de inteiros a reais
+        return float(value) if typ == 'real' and type(value) is int else value
+
+    def evaluate(self, expr, env, arrays=None):
+        if isinstance(expr, ast.Literal):
+            if expr.typ == 'boolean':
+                return int(expr.value)
+            return expr.value
+        if isinstance(expr, ast.Var):
+            value = env[expr.name] if expr.name in env else None
+            if value is None or type(value) is list:
+                raise Unfoldable(expr.name)
+            return value
+        if isinstance(expr, ast.ArrayAccess):
+            name = expr.array.name
+            base = env[name] if name in env else None
+            index = self.evaluate(expr.index, env, arrays)
+            if type(base) is str:
+                # CHARAT com o índice 1-based de Pascal
+                if not 1 <= index <= len(base):
+                    raise Unfoldable(name)
+                return ord(base[index - 1])
+            if type(base) is not list:
+                raise Unfoldable(name)
+            low, size = arrays[name]
+            if not 0 <= index - low < size:
+                raise Unfoldable(name)
+            return base[index - low]
+        if isinstance(expr, ast.BinOp):
+            return self.binop(expr.op, self.evaluate(expr.left, env, arrays),
+                              self.evaluate(expr.right, env, arrays))
+        if isinstance(expr, ast.UnOp):
+            value = self.evaluate(expr.expr, env, arrays)
+            if expr.op == 'not':
+                return int(not value)
+            return 0.0 - value if type(value) is float else self.integer(0 - value)
+        if isinstance(expr, ast.FuncCall):
+            args = [self.evaluate(arg, env, arrays) for arg in expr.args]
+            if expr.name == 'length':
+                if len(args) != 1 or type(args[0]) is float:
+                    raise Unfoldable('length')
+                return len(str(args[0]))
+            if expr.name not in self.pure:
+                raise Unfoldable(expr.name)
+            return self.call(expr.name, args)
+        raise Unfoldable(type(expr).__name__)
+
+    def binop(self, op, m, n):
+        if type(m) is str or type(n) is str:
+            if op == '+' and type(m) is str and type(n) is str:
+                return m + n
+            if op not in ('=', '<>'):
+                raise Unfoldable(op)
+            # um literal de um carácter comparado com um código (s[i] = 'a')
+            if type(m) is str and type(n) is int and len(m) == 1:
+                m = ord(m)
+            elif type(n) is str and type(m) is int and len(n) == 1:
+                n = ord(n)
+        real = type(m) is float or type(n) is float
+        if op == '+':
+            return float(m) + float(n) if real else self.integer(m + n)
+        if op == '-':
+            return float(m) - float(n) if real else self.integer(m - n)
+        if op == '*':
+            return float(m) * float(n) if real else self.integer(m * n)
+        if op == '/':
+            return float(m) / float(n)
+        if op == 'div':
+            return float(m) / float(n) if real else self.integer(trunc_div(m, n))
+        if op == 'mod':
+            if real:
+                raise Unfoldable(op)
+            return self.integer(m - n * trunc_div(m, n))
+        if op == '<':
+            return int(m < n)
+        if op == '<=':
+            return int(m <= n)
+        if op == '>':
+            return int(m > n)
+        if op == '>=':
+            return int(m >= n)
+        if op == '=':
+            return int(m == n)
+        if op == '<>':
+            return int(m != n)
+        if op == 'and':
+            return int(bool(m) and bool(n))
+        if op == 'or':
+            return int(bool(m) or bool(n))
+        raise Unfoldable(op)
@@ -0,0 +1,184 @@
+"""Recompilação incremental ao nível do subprograma.
+
+Cada ProcedureDecl/FunctionDecl recebe uma impressão digital formada pela sua subárvore e
+pelas assinaturas dos símbolos globais de que depende (variáveis globais referidas, outros
+subprogramas chamados e o número de globais, que fixa os slots de retorno/temporários, bem
+como o tamanho do pool de strings e o slot de cada string do pool que o subprograma usa).
+Subprogramas cuja impressão digital já foi compilada não voltam a passar pela análise
+semântica nem pelo CodeGen: o bloco de instruções anterior é reutilizado, com as labels
+geradas por new_label renumeradas para não colidirem com as do resto do programa.
+"""
+
+import hashlib
+
+from . import ast
+from .lexer import build_lexer
+from .parser import build_parser
+from .sema import Analyzer
+from .codegen_vm import CodeGen, DEFAULT_OPT_LEVEL
+
+BUILTINS = ('readln', 'writeln', 'length')
+
+
+def free_names(sub):
+    '''Identificadores usados em sub que não são parâmetros, locais nem o próprio nome.'''
+    bound = {p.name for p in sub.params}
+    for group in sub.block.declarations:
+        for decl in group:
+            bound.add(decl.name)
+    bound.add(sub.name)
+    names = set()
+    for node in ast.walk(sub.block):
+        if isinstance(node, ast.Var):
+            names.add(node.name)
+        elif isinstance(node, (ast.FuncCall, ast.ProcCall)):
+            names.add(node.name)
+    return names - bound - set(BUILTINS)
+
+
+def signature(sub):
+    params = ', '.join(ast.dump(p.vartype) for p in sub.params)
+    ret = ast.dump(sub.return_type) if isinstance(sub, ast.FunctionDecl) else None
+    return f'{type(sub).__name__} {sub.name}({params}) -> {ret}'
+
+
+def fingerprints(program, codegen=None):
+    '''Calcula a impressão digital de cada subprograma de topo do programa.
+
+    codegen (com o nível de otimização da compilação) dá o pool de strings do programa.
+    '''
+    globals_sig = {}
+    index = 0
+    for group in program.block.declarations:
+        for decl in group:
+            globals_sig[decl.name] = f'global {index} {ast.dump(decl.vartype)}'
+            index += 1
+    subs_sig = {sub.name: signature(sub) for sub in program.block.subprograms}
+    pool = {}
+    if codegen is not None and codegen.opt_level >= 1:
+        pool = {text: i for i, text in enumerate(codegen.pooled_strings(program))}
+    result = {}
+    for sub in program.block.subprograms:
+        h = hashlib.sha256()
+        h.update(f'globals={index} strings={len(pool)}\n'.encode())
+        if pool:
+            slots = [pool[text] for text in codegen.string_uses(sub)]
+            h.update(f'pool={slots}\n'.encode())
+        for name in sorted(free_names(sub)):
+            dep = globals_sig.get(name) or subs_sig.get(name) or 'undeclared'
+            h.update(f'{name}: {dep}\n'.encode())
+        h.update(ast.dump(sub).encode('utf-8'))
+        result[id(sub)] = h.hexdigest()
+    return result
+
+
+class CachedBlock:
+    def __init__(self, lines, label_start, local_labels):
+        self.lines = lines
+        self.label_start = label_start
+        self.label_count = len(local_labels)
+        self.runtime = set()  # sub-rotinas de runtime chamadas pelo bloco
+        # posições das linhas que definem ou referem labels criadas por new_label
+        self.label_sites = []
+        local = set(local_labels)
+        for i, line in enumerate(lines):
+            target = line[:-1] if line.endswith(':') else line.partition(' ')[2]
+            if target in local:
+                self.label_sites.append(i)
+
+    def relabel(self, new_start):
+        shift = new_start - self.label_start
+        if shift == 0:
+            return self.lines
+        lines = list(self.lines)
+        for i in self.label_sites:
+            line = lines[i]
+            if line.endswith(':'):
+                lines[i] = f'{shift_label(line[:-1], shift)}:'
+            else:
+                op, _, target = line.partition(' ')
+                lines[i] = f'{op} {shift_label(target, shift)}'
+        return lines
+
+
+def shift_label(name, shift):
+    base = name.rstrip('0123456789')
+    return f'{base}{int(name[len(base):]) + shift}'
+
+
+class IncrementalAnalyzer(Analyzer):
+    def __init__(self, unchanged):
+        super().__init__()
+        self.unchanged = unchanged
+
+    def visit_subprogram(self, sub):
+        # já analisado com as mesmas dependências numa compilação anterior
+        if id(sub) in self.unchanged:
+            return
+        super().visit_subprogram(sub)
+
+
+class IncrementalCodeGen(CodeGen):
+    def __init__(self, blocks, opt_level=DEFAULT_OPT_LEVEL):
+        super().__init__(opt_level=opt_level)
+        self.fps = {}
+        self.blocks = blocks
+        self.new_blocks = {}
+        self.reused = 0
+        self.created_labels = []
+
+    def new_label(self, base='L'):
+        name = super().new_label(base)
+        self.created_labels.append(name)
+        return name
+
+    def emit_subprogram(self, sub):
+        fp = self.fps.get(id(sub))
+        cached = self.blocks.get(fp)
+        if cached is not None:
+            self.instructions.extend(cached.relabel(self.label_id))
+            self.label_id += cached.label_count
+            self.runtime |= cached.runtime
+            self.new_blocks[fp] = cached
+            self.reused += 1
+            return
+        start = len(self.instructions)
+        label_start = self.label_id
+        self.created_labels = []
+        runtime = self.runtime
+        self.runtime = set()
+        super().emit_subprogram(sub)
+        block = CachedBlock(self.instructions[start:], label_start, self.created_labels)
+        block.runtime = self.runtime
+        self.runtime = runtime | block.runtime
+        self.new_blocks[fp] = block
+
+
+class IncrementalCompiler:
+    '''Mantém lexer/parser aquecidos e os blocos gerados entre compilações sucessivas.'''
+
+    def __init__(self, lexer=None, parser=None, opt_level=DEFAULT_OPT_LEVEL):
+        self.lexer = lexer or build_lexer()
+        self.parser = parser or build_parser()
+        self.opt_level = opt_level
+        self.blocks = {}
+        self.reused = 0
+        self.compiled = 0
+        self.folded_calls = 0
+
+    def compile(self, source):
+        self.lexer.lineno = 1
+        program = self.parser.parse(source, lexer=self.lexer)
+        codegen = IncrementalCodeGen(self.blocks, self.opt_level)
+        # os resultados dobrados (-O2) entram na subárvore de cada subprograma e, com ela,
+        # na impressão digital: mudar o corpo de uma função pura invalida quem a usa
+        codegen.fold_pure_calls(program)
+        fps = codegen.fps = fingerprints(program, codegen)
+        unchanged = {key for key, fp in fps.items() if fp in self.blocks}
+        instructions = codegen.generate(program, analyzer=IncrementalAnalyzer(unchanged))
+        # só guarda os blocos do programa atual, descartando versões antigas
+        self.blocks = codegen.new_blocks
+        self.reused = codegen.reused
+        self.compiled = len(fps) - codegen.reused
+        self.folded_calls = codegen.folded_calls
+        return '\n'.join(instructions)
@@ -1,3 +1,7 @@
+import re
+import sys
+from collections import namedtuple
+
 import ply.lex as lex
 #___________________________________________________________________________________________________________#
 #### Definição de Palavras Reservadas ####
@@ -112,10 +116,12 @@ def t_ICONST(t):
 
 
 def t_ID(t):
-    # Identificadores; converte para token de palavra reservada se aplicável
+    # Identificadores; normalizados uma única vez para minúsculas e internados, de modo que as
+    # tabelas de símbolos usam a chave diretamente. A grafia original fica em t.spelling.
     r"[A-Za-z_][A-Za-z0-9_]*"
-    t.type = reserved.get(t.value.lower(), 'ID')
-    t.value = t.value
+    t.spelling = t.value
+    t.value = sys.intern(t.value.lower())
+    t.type = reserved.get(t.value, 'ID')
     return t
 
 
@@ -142,6 +148,195 @@ def t_error(t):
     raise SyntaxError(f"Illegal character '{t.value[0]}' at line {t.lexer.lineno}")
 
 
-def build_lexer():
-    '''Constroi e devolve o lexer PLY configurado.'''
+#___________________________________________________________________________________________________________#
+#### Backend rápido (scanner re único) ####
+'''
+Alternativa ao lexer PLY que produz exatamente o mesmo fluxo de tokens (tipos, valores, linhas e
+posições). Todas as regras acima são combinadas numa única regex com grupos nomeados, pela mesma
+ordem de prioridade que o PLY usa (regras-função pela ordem de definição, depois os operadores do
+maior para o menor, num só grupo resolvido por dicionário), e o tipo de cada match vem de
+m.lastgroup. Os tokens são tuplos leves em vez de objetos LexToken.
+'''
+_FAST_RULES = [
+    ('SCONST', r"'(?:[^'\\]|\\.)*'"),
+    ('FCONST', r"\d+\.\d+(?:[eE][-+]?\d+)?"),
+    ('ICONST', r"\d+"),
+    ('ID', r"[A-Za-z_][A-Za-z0-9_]*"),
+    ('NEWLINE', r"\n[ \t\n]*"),
+    ('COMMENT', r"\{[^}]*\}|\(\*[\s\S]*?\*\)"),
+    ('OP', r":=|<>|<=|>=|\.\.|[-+*/=<>;:,.()\[\]]"),
+    ('ERROR', r"[^ \t]"),
+]
+# espaços/tabs (t_ignore) são consumidos como prefixo de cada match
+_fast_regex = re.compile(
+    '[ \t]*(?:' + '|'.join(f'(?P<{name}>{rx})' for name, rx in _FAST_RULES) + ')')
+_fast_finditer = _fast_regex.finditer
+_OPERATORS = {
+    ':=': 'ASSIGN', '<>': 'NE', '<=': 'LE', '>=': 'GE', '..': 'DOTDOT',
+    '+': 'PLUS', '-': 'MINUS', '*': 'TIMES', '/': 'RDIV', '=': 'EQ', '<': 'LT', '>': 'GT',
+    '(': 'LPAREN', ')': 'RPAREN', '[': 'LBRACK', ']': 'RBRACK',
+    ';': 'SEMICOLON', ':': 'COLON', ',': 'COMMA', '.': 'DOT',
+}
+
+
+class Token(namedtuple('Token', 'type value lineno lexpos spelling col')):
+    __slots__ = ()
+    lexer = None  # o yacc só anexa o lexer a tokens que ainda não o tenham
+
+
+def tokenize(data, lineno=1):
+    '''Gera os tokens de data, com a mesma semântica das regras PLY.'''
+    new = tuple.__new__
+    intern = sys.intern
+    get_reserved = reserved.get
+    operators = _OPERATORS
+    for m in _fast_finditer(data):
+        kind = m.lastgroup
+        text = m.group(kind)
+        if kind == 'ID':
+            name = intern(text.lower())
+            yield new(Token, (get_reserved(name, 'ID'), name, lineno, m.start(kind), text, None))
+        elif kind == 'OP':
+            yield new(Token, (operators[text], text, lineno, m.start(kind), None, None))
+        elif kind == 'NEWLINE' or kind == 'COMMENT':
+            lineno += text.count('\n')
+        elif kind == 'ICONST':
+            yield new(Token, (kind, int(text), lineno, m.start(kind), None, None))
+        elif kind == 'FCONST':
+            yield new(Token, (kind, float(text), lineno, m.start(kind), None, None))
+        elif kind == 'SCONST':
+            yield new(Token, (kind, text[1:-1], lineno, m.start(kind), None, None))
+        else:
+            raise SyntaxError(f"Illegal character '{text}' at line {lineno}")
+
+
+class FastLexer:
+    '''Interface mínima de lexer PLY (input/token/lineno/lexdata) sobre tokenize().'''
+
+    def __init__(self):
+        self.lexdata = ''
+        self.lineno = 1
+        self._tokens = iter(())
+
+    def input(self, data):
+        self.lexdata = data
+        self._tokens = tokenize(data, self.lineno)
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def __iter__(self):
+        return self._tokens
+
+
+#___________________________________________________________________________________________________________#
+#### Tokenização em streaming ####
+'''
+Lê a fonte por blocos de um ficheiro (ou stdin) em vez de exigir o texto completo em memória.
+Um match que chega ao fim do bloco pode continuar no bloco seguinte (identificador, número,
+':' de ':=', newline), tal como um comentário ou string ainda por fechar: o grupo PARTIAL
+reconhece esses prefixos incompletos ancorados no fim do bloco. Em ambos os casos o texto
+desde o início do match é guardado e voltado a analisar com o bloco seguinte, pelo que o
+fluxo de tokens é igual ao do lexer PLY sobre o texto inteiro. Como lexdata não existe, cada
+token leva a sua coluna.
+'''
+_STREAM_RULES = [
+    # número que pode continuar no bloco seguinte (1. -> 1.5, 1.5e -> 1.5e10); só casa no fim
+    ('PARTIAL', r"\d+(?:\.\d*(?:[eE][-+]?\d*)?)?\Z"),
+    *_FAST_RULES[:6],
+    # string ou comentário ainda por fechar no fim do bloco
+    ('PARTIAL', r"'(?:[^'\\]|\\.)*\\?\Z|\{[^}]*\Z|\(\*[\s\S]*\Z"),
+    *_FAST_RULES[6:],
+]
+_stream_match = re.compile('[ \t]*(?:' + '|'.join(
+    f'(?P<{name}{i}>{rx})' if name == 'PARTIAL' else f'(?P<{name}>{rx})'
+    for i, (name, rx) in enumerate(_STREAM_RULES)) + ')').match
+_fast_match = _fast_regex.match
+
+STREAM_CHUNK = 64 * 1024
+
+
+def tokenize_stream(stream, chunk_size=STREAM_CHUNK, lineno=1):
+    '''Gera os tokens lidos de stream por blocos de chunk_size caracteres.'''
+    new = tuple.__new__
+    intern = sys.intern
+    get_reserved = reserved.get
+    operators = _OPERATORS
+    buffer = ''
+    base = 0         # posição absoluta de buffer[0]
+    line_start = 0   # posição absoluta do início da linha atual
+    eof = False
+    while not eof:
+        # um token maior do que o bloco faz crescer a leitura seguinte geometricamente
+        chunk = stream.read(max(chunk_size, len(buffer)))
+        eof = not chunk
+        buffer += chunk
+        size = len(buffer)
+        # no último bloco já não há continuação possível: regras exatamente como no PLY
+        match = _fast_match if eof else _stream_match
+        pos = 0
+        while True:
+            m = match(buffer, pos)
+            if m is None:
+                pos = size  # só espaços até ao fim do bloco
+                break
+            kind = m.lastgroup
+            if not eof and (m.end() == size or kind.startswith('PARTIAL')):
+                pos = m.start()
+                break
+            text = m.group(kind)
+            start = base + m.start(kind)
+            pos = m.end()
+            if kind == 'ID':
+                name = intern(text.lower())
+                yield new(Token, (get_reserved(name, 'ID'), name, lineno, start, text,
+                                  start - line_start + 1))
+            elif kind == 'OP':
+                yield new(Token, (operators[text], text, lineno, start, None, start - line_start + 1))
+            elif kind == 'NEWLINE' or kind == 'COMMENT':
+                newlines = text.count('\n')
+                if newlines:
+                    lineno += newlines
+                    line_start = start + text.rfind('\n') + 1
+            elif kind == 'ICONST':
+                yield new(Token, (kind, int(text), lineno, start, None, start - line_start + 1))
+            elif kind == 'FCONST':
+                yield new(Token, (kind, float(text), lineno, start, None, start - line_start + 1))
+            elif kind == 'SCONST':
+                yield new(Token, (kind, text[1:-1], lineno, start, None, start - line_start + 1))
+            else:
+                raise SyntaxError(f"Illegal character '{text}' at line {lineno}")
+        base += pos
+        buffer = buffer[pos:]
+
+
+class StreamLexer:
+    '''Lexer para o yacc que lê de um ficheiro por blocos (parser.parse(lexer=...), sem input).'''
+
+    def __init__(self, stream, chunk_size=STREAM_CHUNK):
+        self.lexdata = ''
+        self.lineno = 1
+        self._tokens = tokenize_stream(stream, chunk_size)
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def __iter__(self):
+        return self._tokens
+
+
+LEXER_BACKENDS = ('ply', 'fast')
+
+
+def line_starts(data):
+    '''Posições (lexpos) em que começa cada linha de data, por ordem.'''
+    return [0, *(m.end() for m in re.finditer('\n', data))]
+
+
+def build_lexer(backend='ply'):
+    '''Constroi e devolve o lexer configurado: PLY (por omissão) ou o backend rápido.'''
+    if backend == 'fast':
+        return FastLexer()
+    if backend != 'ply':
+        raise ValueError(f'Unknown lexer backend {backend!r}')
     return lex.lex()
\ No newline at end of file
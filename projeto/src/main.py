@@ -1,33 +1,213 @@
 import argparse
+import os
+import shutil
+import sys
+import tracemalloc
 from pathlib import Path
 
-from .lexer import build_lexer
+from .lexer import build_lexer, LEXER_BACKENDS, StreamLexer
 from .parser import build_parser
-from .codegen_vm import CodeGen
+from .codegen_vm import StreamSink, OPT_LEVELS, DEFAULT_OPT_LEVEL
+from .codegen_slots import CODEGENS
+from .cache import CompileCache, DEFAULT_MAX_BYTES
+from .watch import Watcher
+from .stats import CompileStats, compile_with_stats
+from . import srcmap, vmb
 
 
-def compile_source(source: str):
-    lexer = build_lexer()
+def parse_source(source: str, lexer_backend='ply'):
+    lexer = build_lexer(lexer_backend)
     parser = build_parser()
-    ast = parser.parse(source, lexer=lexer)
-    codegen = CodeGen()
-    instructions = codegen.generate(ast)
+    return parser.parse(source, lexer=lexer)
+
+
+def parse_stream(stream):
+    '''Analisa a fonte lida de stream por blocos, sem a carregar inteira em memória.'''
+    parser = build_parser()
+    return parser.parse(lexer=StreamLexer(stream))
+
+
+def compile_source(source: str, lexer_backend='ply', opt_level=DEFAULT_OPT_LEVEL, codegen='stack'):
+    generator = CODEGENS[codegen](opt_level=opt_level)
+    instructions = generator.generate(parse_source(source, lexer_backend))
     return '\n'.join(instructions)
 
 
+def compile_with_map(source: str, path=None, lexer_backend='ply', opt_level=DEFAULT_OPT_LEVEL,
+                     codegen='stack'):
+    '''Compila source devolvendo (linhas VM, SourceMap); path é a fonte registada no mapa.'''
+    generator = CODEGENS[codegen](opt_level=opt_level, source_map=True)
+    lines = generator.generate(parse_source(source, lexer_backend))
+    return lines, srcmap.from_codegen(generator, lines, path)
+
+
+def compile_to_stream(source: str, stream, lexer_backend='ply', opt_level=DEFAULT_OPT_LEVEL,
+                      codegen='stack'):
+    '''Compila escrevendo as instruções diretamente em stream, sem juntar o programa numa string.'''
+    generator = CODEGENS[codegen](sink=StreamSink(stream), opt_level=opt_level)
+    generator.generate(parse_source(source, lexer_backend))
+
+
+def compile_stream(instream, out=None, opt_level=DEFAULT_OPT_LEVEL, codegen='stack'):
+    '''Compila a fonte lida de instream; escreve em out ou, sem out, devolve o texto VM.'''
+    cls = CODEGENS[codegen]
+    if out is None:
+        return '\n'.join(cls(opt_level=opt_level).generate(parse_stream(instream)))
+    cls(sink=StreamSink(out), opt_level=opt_level).generate(parse_stream(instream))
+
+
+def compile_cached(source: str, cache, options=None, lexer_backend='ply', opt_level=DEFAULT_OPT_LEVEL,
+                   codegen='stack'):
+    '''compile_source com cache em disco; um hit não passa pelo lexer nem pelo parser.'''
+    key = cache.key(source, dict(options or {}, opt_level=opt_level, codegen=codegen))
+    output = cache.get(key)
+    if output is None:
+        output = compile_source(source, lexer_backend, opt_level, codegen)
+        cache.put(key, output)
+    return output
+
+
+def compile_cached_to_stream(source: str, cache, stream, options=None, lexer_backend='ply',
+                             opt_level=DEFAULT_OPT_LEVEL, codegen='stack'):
+    key = cache.key(source, dict(options or {}, opt_level=opt_level, codegen=codegen))
+    path = cache.lookup(key)
+    if path is None:
+        path = cache.store_with(key, lambda f: compile_to_stream(source, f, lexer_backend, opt_level,
+                                                                 codegen))
+    with open(path, encoding='utf-8') as f:
+        shutil.copyfileobj(f, stream)
+
+
+def write_output(args, lines):
+    if args.format == 'vmb':
+        data = vmb.encode_lines(lines)
+        if args.output:
+            Path(args.output).write_bytes(data)
+        else:
+            sys.stdout.buffer.write(data)
+        return
+    text = '\n'.join(lines) + '\n'
+    if args.output:
+        Path(args.output).write_text(text, encoding='utf-8')
+    else:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+def run_with_stats(args, source, infile):
+    '''Compila fase a fase sob tracemalloc e reporta os tempos/picos em stderr.'''
+    stats = CompileStats()
+    tracemalloc.start()
+    try:
+        lines = compile_with_stats(stats, source=source, stream=infile, lexer_backend=args.lexer,
+                                   opt_level=args.opt_level, codegen=args.codegen)
+        with stats.phase('write'):
+            write_output(args, lines)
+    finally:
+        tracemalloc.stop()
+    print(stats.to_json() if args.stats_format == 'json' else stats.to_text(), file=sys.stderr)
+
+
 def main():
     ap = argparse.ArgumentParser(description='Pascal to VM compiler')
-    ap.add_argument('input', help='Input Pascal file')
+    ap.add_argument('input', nargs='?', help="Input Pascal file ('-' reads from stdin)")
     ap.add_argument('-o', '--output', help='Output VM file (default: stdout)')
+    ap.add_argument('--format', choices=('vm', 'vmb'), default='vm',
+                    help='Output format: VM text (default) or binary .vmb object')
+    ap.add_argument('-O', dest='opt_level', type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL,
+                    help='Optimisation level (default: %(default)s)')
+    ap.add_argument('--codegen', choices=CODEGENS, default='stack',
+                    help='Code generator: operand stack (default) or frame slots as registers')
+    ap.add_argument('--lexer', choices=LEXER_BACKENDS, default='ply',
+                    help='Lexer backend: PLY (default) or the single-regex scanner')
+    ap.add_argument('--stream', action='store_true',
+                    help='Lex the input in chunks instead of reading it whole (implied by -; bypasses the cache)')
+    ap.add_argument('--source-map', action='store_true',
+                    help='Also write <output>.map mapping VM instructions to source lines (needs -o; bypasses the cache)')
+    ap.add_argument('--stats', action='store_true',
+                    help='Print per-phase time, peak memory and counts to stderr (bypasses the cache)')
+    ap.add_argument('--stats-format', choices=('text', 'json'), default='text',
+                    help='Format of the --stats report (default: %(default)s)')
+    ap.add_argument('--cache-dir', help='Compilation cache directory (default: ~/.cache/pascal-vm)')
+    ap.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                    help='Maximum cache size in MiB before LRU eviction (default: %(default)s)')
+    ap.add_argument('--no-cache', action='store_true', help='Always compile, bypassing the cache')
+    ap.add_argument('--cache-stats', action='store_true', help='Print cache hit/miss statistics to stderr')
+    ap.add_argument('--watch', metavar='DIR', help='Recompile changed .pas files in DIR into .vm files')
+    ap.add_argument('--poll', action='store_true', help='Use mtime polling instead of inotify in --watch')
+    ap.add_argument('--debounce', type=int, default=50, help='Debounce window in ms for --watch (default: %(default)s)')
     args = ap.parse_args()
 
-    source = Path(args.input).read_text(encoding='utf-8')
-    output = compile_source(source)
+    if args.watch:
+        if args.codegen != 'stack':
+            ap.error('--watch only supports --codegen stack')
+        Watcher(args.watch, polling=args.poll, debounce=args.debounce / 1000,
+                opt_level=args.opt_level).run()
+        return
+    if not args.input:
+        ap.error('an input file or --watch DIR is required')
+    if args.source_map and not args.output:
+        ap.error('--source-map requires -o')
+    if args.source_map and (args.stream or args.input == '-' or args.stats):
+        ap.error('--source-map cannot be combined with --stream, stdin input or --stats')
 
-    if args.output:
-        Path(args.output).write_text(output + '\n', encoding='utf-8')
+    # a chave da cache precisa do texto completo: em streaming compila-se sempre
+    streaming = args.stream or args.input == '-'
+    cache = source = infile = None
+    if streaming:
+        infile = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
     else:
-        print(output)
+        source = Path(args.input).read_text(encoding='utf-8')
+        if not args.no_cache and not args.stats and not args.source_map:
+            cache = CompileCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+    if args.stats:
+        run_with_stats(args, source, infile)
+    elif args.source_map:
+        lines, source_map = compile_with_map(source, args.input, args.lexer, args.opt_level,
+                                             args.codegen)
+        write_output(args, lines)
+        source_map.save(args.output + '.map')
+    elif args.format == 'vmb':
+        if streaming:
+            output = compile_stream(infile, opt_level=args.opt_level, codegen=args.codegen)
+        else:
+            output = (compile_cached(source, cache, lexer_backend=args.lexer, opt_level=args.opt_level,
+                                     codegen=args.codegen)
+                      if cache else compile_source(source, args.lexer, args.opt_level, args.codegen))
+        data = vmb.encode_lines(output.splitlines())
+        if args.output:
+            Path(args.output).write_bytes(data)
+        else:
+            sys.stdout.buffer.write(data)
+    else:
+        # a compilation error must leave a previous output file untouched: write to a
+        # temporary file next to it and only replace the target once everything is written
+        tmp = f'{args.output}.{os.getpid()}.tmp' if args.output else None
+        out = open(tmp, 'w', encoding='utf-8') if tmp else sys.stdout
+        try:
+            if streaming:
+                compile_stream(infile, out, args.opt_level, args.codegen)
+            elif cache:
+                compile_cached_to_stream(source, cache, out, lexer_backend=args.lexer,
+                                         opt_level=args.opt_level, codegen=args.codegen)
+            else:
+                compile_to_stream(source, out, args.lexer, args.opt_level, args.codegen)
+            if tmp:
+                out.close()
+                os.replace(tmp, args.output)
+        except BaseException:
+            if tmp:
+                out.close()
+                Path(tmp).unlink(missing_ok=True)
+            raise
+    if infile is not None and infile is not sys.stdin:
+        infile.close()
+
+    if cache:
+        cache.record_stats()
+        if args.cache_stats:
+            print(cache.summary(), file=sys.stderr)
 
 
 if __name__ == '__main__':
@@ -5,8 +5,10 @@ Inclui subprogramas, arrays 1D, controlo de fluxo e builtins (readln/writeln, le
 """
 
 import sys
+from bisect import bisect_right
+
 import ply.yacc as yacc
-from .lexer import tokens, build_lexer
+from .lexer import tokens, build_lexer, line_starts
 from . import ast
 
 precedence = (
@@ -27,9 +29,39 @@ precedence = (
 )
 
 
+def _at(p, i):
+    '''Posição (linha e coluna, 1-based) do token i da produção, para os nós da AST.'''
+    col = getattr(p.slice[i], 'col', None)
+    if col is None:
+        # tokens do lexer em streaming já trazem a coluna; os restantes usam lexdata
+        lexpos = p.lexpos(i)
+        col = lexpos - _line_start(p.lexer, lexpos) + 1
+    return {'lineno': p.lineno(i), 'col': col}
+
+
+def _line_start(lexer, lexpos):
+    '''Início da linha de lexpos; os inícios de linha de lexdata são indexados uma vez por fonte.'''
+    data = lexer.lexdata
+    index = getattr(lexer, 'line_index', None)
+    if index is None or index[0] is not data:
+        index = lexer.line_index = (data, line_starts(data))
+    starts = index[1]
+    return starts[bisect_right(starts, lexpos) - 1]
+
+
+def _spelling(p, i):
+    '''Grafia original do identificador i da produção (p[i] vem em minúsculas).'''
+    return getattr(p.slice[i], 'spelling', None) or p[i]
+
+
+def _from(node):
+    '''Herda a posição de um nó filho.'''
+    return {'lineno': node.lineno, 'col': node.col}
+
+
 def p_program(p):
     '''program : PROGRAM ID SEMICOLON block DOT'''
-    p[0] = ast.Program(p[2], p[4])
+    p[0] = ast.Program(p[2], p[4], **_at(p, 1))
 
 
 def p_block(p):
@@ -52,7 +84,9 @@ def p_var_decl_list(p):
     '''var_decl_list : var_decl_list var_decl
                      | var_decl'''
     if len(p) == 3:
-        p[0] = p[1] + [p[2]]
+        # acumula in-place: copiar a lista a cada redução tornaria o parsing quadrático
+        p[1].append(p[2])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
@@ -61,16 +95,19 @@ def p_var_decl(p):
     '''var_decl : id_list COLON type SEMICOLON'''
     ids = p[1]
     vartype = p[3]
-    p[0] = [ast.VarDecl(i, vartype) for i in ids]
+    pos = _at(p, 2)
+    p[0] = [ast.VarDecl(name, vartype, spelling=spelling, **pos) for name, spelling in ids]
 
 
 def p_id_list(p):
     '''id_list : ID
                | id_list COMMA ID'''
+    # pares (nome, grafia original)
     if len(p) == 2:
-        p[0] = [p[1]]
+        p[0] = [(p[1], _spelling(p, 1))]
     else:
-        p[0] = p[1] + [p[3]]
+        p[1].append((p[3], _spelling(p, 3)))
+        p[0] = p[1]
 
 
 def p_type_basic(p):
@@ -78,17 +115,17 @@ def p_type_basic(p):
         | REAL
         | BOOLEAN
         | STRING'''
-    p[0] = ast.Type(p[1].lower())
+    p[0] = ast.Type(p[1], **_at(p, 1))
 
 
 def p_type_array(p):
     '''type : ARRAY LBRACK ICONST DOTDOT ICONST RBRACK OF type'''
-    p[0] = ast.Type('array', base=p[8], range_bounds=(p[3], p[5]))
+    p[0] = ast.Type('array', base=p[8], range_bounds=(p[3], p[5]), **_at(p, 1))
 
 
 def p_compound_statement(p):
     '''compound_statement : BEGIN statement_list END'''
-    p[0] = ast.Compound(p[2])
+    p[0] = ast.Compound(p[2], **_at(p, 1))
 
 
 def p_statement_list(p):
@@ -97,8 +134,9 @@ def p_statement_list(p):
     if len(p) == 2:
         p[0] = [] if isinstance(p[1], ast.NoOp) else [p[1]]
     else:
-        tail = [] if isinstance(p[3], ast.NoOp) else [p[3]]
-        p[0] = p[1] + tail
+        if not isinstance(p[3], ast.NoOp):
+            p[1].append(p[3])
+        p[0] = p[1]
 
 
 def p_statement(p):
@@ -123,17 +161,18 @@ def p_opt_subprograms(p):
         else:
             p[0] = [p[1]]
     else:
-        p[0] = p[1] + [p[2]]
+        p[1].append(p[2])
+        p[0] = p[1]
 
 
 def p_subprogram_decl_proc(p):
     '''subprogram_decl : PROCEDURE ID LPAREN opt_params RPAREN SEMICOLON block SEMICOLON'''
-    p[0] = ast.ProcedureDecl(p[2], p[4], p[7])
+    p[0] = ast.ProcedureDecl(p[2], p[4], p[7], spelling=_spelling(p, 2), **_at(p, 1))
 
 
 def p_subprogram_decl_func(p):
     '''subprogram_decl : FUNCTION ID LPAREN opt_params RPAREN COLON type SEMICOLON block SEMICOLON'''
-    p[0] = ast.FunctionDecl(p[2], p[4], p[7], p[9])
+    p[0] = ast.FunctionDecl(p[2], p[4], p[7], p[9], spelling=_spelling(p, 2), **_at(p, 1))
 
 
 def p_opt_params(p):
@@ -148,58 +187,62 @@ def p_param_list(p):
     if len(p) == 2:
         p[0] = p[1]
     else:
-        p[0] = p[1] + p[3]
+        p[1].extend(p[3])
+        p[0] = p[1]
 
 
 def p_param_section(p):
     '''param_section : id_list COLON type'''
     ids = p[1]
     typ = p[3]
-    p[0] = [ast.Param(i, typ, byref=False) for i in ids]
+    pos = _at(p, 2)
+    p[0] = [ast.Param(name, typ, byref=False, spelling=spelling, **pos) for name, spelling in ids]
 
 
 def p_assignment(p):
     '''assignment_statement : variable ASSIGN expression'''
-    p[0] = ast.Assign(p[1], p[3])
+    p[0] = ast.Assign(p[1], p[3], **_from(p[1]))
 
 
 def p_variable_id(p):
     '''variable : ID'''
-    p[0] = ast.Var(p[1])
+    p[0] = ast.Var(p[1], spelling=_spelling(p, 1), **_at(p, 1))
 
 
 def p_variable_array(p):
     '''variable : ID LBRACK expression RBRACK'''
-    p[0] = ast.ArrayAccess(ast.Var(p[1]), p[3])
+    pos = _at(p, 1)
+    p[0] = ast.ArrayAccess(ast.Var(p[1], spelling=_spelling(p, 1), **pos), p[3], **pos)
 
 
 def p_if_statement(p):
     '''if_statement : IF expression THEN statement ELSE statement
                     | IF expression THEN statement'''
     if len(p) == 7:
-        p[0] = ast.If(p[2], p[4], p[6])
+        p[0] = ast.If(p[2], p[4], p[6], **_at(p, 1))
     else:
-        p[0] = ast.If(p[2], p[4])
+        p[0] = ast.If(p[2], p[4], **_at(p, 1))
 
 
 def p_while_statement(p):
     '''while_statement : WHILE expression DO statement'''
-    p[0] = ast.While(p[2], p[4])
+    p[0] = ast.While(p[2], p[4], **_at(p, 1))
 
 
 def p_repeat_statement(p):
     '''repeat_statement : REPEAT statement_list UNTIL expression'''
-    p[0] = ast.Repeat(p[2], p[4])
+    p[0] = ast.Repeat(p[2], p[4], **_at(p, 1))
 
 
 def p_for_statement(p):
     '''for_statement : FOR ID ASSIGN expression TO expression DO statement
                      | FOR ID ASSIGN expression DOWNTO expression DO statement'''
-    downto = (p[5].lower() == 'downto') if isinstance(p[5], str) else False
+    downto = p.slice[5].type == 'DOWNTO'
+    pos = _at(p, 1)
     if downto:
-        p[0] = ast.For(ast.Var(p[2]), p[4], p[6], p[8], downto=True)
+        p[0] = ast.For(ast.Var(p[2], spelling=_spelling(p, 2), **_at(p, 2)), p[4], p[6], p[8], downto=True, **pos)
     else:
-        p[0] = ast.For(ast.Var(p[2]), p[4], p[6], p[8], downto=False)
+        p[0] = ast.For(ast.Var(p[2], spelling=_spelling(p, 2), **_at(p, 2)), p[4], p[6], p[8], downto=False, **pos)
 
 
 def p_procedure_statement(p):
@@ -210,9 +253,9 @@ def p_procedure_statement(p):
                            | ID LPAREN opt_expr_list RPAREN'''
     if p.slice[1].type in ('READLN', 'WRITELN'):
         args = p[3] if len(p) == 5 else []
-        p[0] = ast.ProcCall(p[1].lower(), args)
+        p[0] = ast.ProcCall(p[1], args, **_at(p, 1))
     else:
-        p[0] = ast.ProcCall(p[1], p[3])
+        p[0] = ast.ProcCall(p[1], p[3], spelling=_spelling(p, 1), **_at(p, 1))
 
 
 def p_opt_expr_list(p):
@@ -227,7 +270,8 @@ def p_expr_list(p):
     if len(p) == 2:
         p[0] = [p[1]]
     else:
-        p[0] = p[1] + [p[3]]
+        p[1].append(p[3])
+        p[0] = p[1]
 
 
 def p_expression_binop(p):
@@ -245,13 +289,13 @@ def p_expression_binop(p):
                   | expression GE expression
                   | expression AND expression
                   | expression OR expression'''
-    p[0] = ast.BinOp(p[1], p[2].lower() if isinstance(p[2], str) else p[2], p[3])
+    p[0] = ast.BinOp(p[1], p[2], p[3], **_at(p, 2))
 
 
 def p_expression_unary(p):
     '''expression : MINUS expression %prec UMINUS
                   | NOT expression'''
-    p[0] = ast.UnOp(p[1].lower() if isinstance(p[1], str) else p[1], p[2])
+    p[0] = ast.UnOp(p[1], p[2], **_at(p, 1))
 
 
 def p_expression_group(p):
@@ -261,12 +305,12 @@ def p_expression_group(p):
 
 def p_expression_call(p):
     '''expression : ID LPAREN opt_expr_list RPAREN'''
-    p[0] = ast.FuncCall(p[1], p[3])
+    p[0] = ast.FuncCall(p[1], p[3], spelling=_spelling(p, 1), **_at(p, 1))
 
 
 def p_expression_length(p):
     '''expression : LENGTH LPAREN expression RPAREN'''
-    p[0] = ast.FuncCall('length', [p[3]])
+    p[0] = ast.FuncCall('length', [p[3]], **_at(p, 1))
 
 
 def p_expression_literal(p):
@@ -276,16 +320,17 @@ def p_expression_literal(p):
                   | TRUE
                   | FALSE'''
     tok = p.slice[1].type
+    pos = _at(p, 1)
     if tok == 'ICONST':
-        p[0] = ast.Literal(p[1], 'integer')
+        p[0] = ast.Literal(p[1], 'integer', **pos)
     elif tok == 'FCONST':
-        p[0] = ast.Literal(p[1], 'real')
+        p[0] = ast.Literal(p[1], 'real', **pos)
     elif tok == 'SCONST':
-        p[0] = ast.Literal(p[1], 'string')
+        p[0] = ast.Literal(p[1], 'string', **pos)
     elif tok == 'TRUE':
-        p[0] = ast.Literal(True, 'boolean')
+        p[0] = ast.Literal(True, 'boolean', **pos)
     else:
-        p[0] = ast.Literal(False, 'boolean')
+        p[0] = ast.Literal(False, 'boolean', **pos)
 
 
 def p_expression_variable(p):
@@ -301,7 +346,8 @@ def p_empty(p):
 def p_error(p):
     """Relata erro sintático com lexema e linha."""
     if p:
-        raise SyntaxError(f"Syntax error at '{p.value}' (line {p.lineno})")
+        # só os IDs trazem grafia; os tokens dos backends rápidos têm spelling=None nos restantes
+        raise SyntaxError(f"Syntax error at '{getattr(p, 'spelling', None) or p.value}' (line {p.lineno})")
     raise SyntaxError('Unexpected end of input')
 
 
@@ -0,0 +1,111 @@
+"""Análise de intervalos de valores das expressões inteiras (-O2).
+
+bounds devolve o intervalo (mínimo, máximo) que uma expressão inteira pode tomar, ou None
+quando não se consegue provar nada: literais, variáveis de ciclos for com limites
+conhecidos (env), aritmética de intervalos em +, -, *, div e mod por constantes,
+length e códigos de carácter. Um intervalo só é aceite se couber em 32 bits, pelo que
+as reescritas que dele dependem valem tanto para os inteiros sem limite de src.vm como
+para uma VM com inteiros de 32 bits que dão a volta.
+"""
+
+from . import ast
+
+INT32 = (-2 ** 31, 2 ** 31 - 1)
+CHAR_CODES = (0, 0x10FFFF)
+
+
+def assigned_names(node):
+    names = set()
+    for item in ast.walk(node):
+        if isinstance(item, ast.Assign):
+            target = item.target
+            names.add(target.array.name if isinstance(target, ast.ArrayAccess) else target.name)
+        elif isinstance(item, ast.For):
+            names.add(item.var.name)
+        elif isinstance(item, ast.ProcCall) and item.name == 'readln':
+            for arg in item.args:
+                names.add(arg.array.name if isinstance(arg, ast.ArrayAccess) else arg.name)
+    return names
+
+
+def has_user_call(node):
+    return any(isinstance(item, (ast.FuncCall, ast.ProcCall)) and item.name not in ('length', 'writeln', 'readln')
+               for item in ast.walk(node))
+
+
+def trunc_div(a, b):
+    q = abs(a) // abs(b)
+    return q if (a >= 0) == (b >= 0) else -q
+
+
+def checked(lo, hi):
+    return (lo, hi) if INT32[0] <= lo <= hi <= INT32[1] else None
+
+
+def bounds(expr, env):
+    '''Intervalo (lo, hi) dos valores de uma expressão inteira, ou None.'''
+    if isinstance(expr, ast.Literal):
+        if expr.typ in ('integer', 'boolean'):
+            value = int(expr.value)
+            return checked(value, value)
+        return None
+    if expr.etype != 'integer':
+        return None
+    if isinstance(expr, ast.Var):
+        return env.get(expr.name)
+    if isinstance(expr, ast.BinOp):
+        a = bounds(expr.left, env)
+        if a is None:
+            return None
+        b = bounds(expr.right, env)
+        if b is None:
+            return None
+        return binop_bounds(expr.op, a, b)
+    if isinstance(expr, ast.UnOp):
+        a = bounds(expr.expr, env) if expr.op == '-' else None
+        return None if a is None else checked(-a[1], -a[0])
+    if isinstance(expr, ast.FuncCall):
+        return (0, INT32[1]) if expr.name == 'length' else None
+    if isinstance(expr, ast.ArrayAccess) and expr.array.sym.bounds is None:
+        return CHAR_CODES
+    return None
+
+
+def binop_bounds(op, a, b):
+    if op == '+':
+        return checked(a[0] + b[0], a[1] + b[1])
+    if op == '-':
+        return checked(a[0] - b[1], a[1] - b[0])
+    if op == '*':
+        products = (a[0] * b[0], a[0] * b[1], a[1] * b[0], a[1] * b[1])
+        return checked(min(products), max(products))
+    if b[0] <= 0 <= b[1]:
+        return None  # o divisor pode ser 0
+    if op == 'div':
+        if b[0] != b[1]:
+            return None
+        ends = (trunc_div(a[0], b[0]), trunc_div(a[1], b[0]))
+        return checked(min(ends), max(ends))
+    if op == 'mod':
+        # o resto tem o sinal do dividendo e |resto| < |divisor|
+        limit = max(abs(b[0]), abs(b[1])) - 1
+        lo = 0 if a[0] >= 0 else max(a[0], -limit)
+        hi = 0 if a[1] <= 0 else min(a[1], limit)
+        return checked(lo, hi)
+    return None
+
+
+def loop_bounds(stmt, env):
+    '''Intervalo da variável de um for dentro do corpo, se o corpo não a puder alterar.'''
+    var = stmt.var
+    if var.etype != 'integer' or var.name in assigned_names(stmt.body):
+        return None
+    # um subprograma chamado no corpo pode alterar uma variável global
+    if var.sym.kind == 'global' and has_user_call(stmt.body):
+        return None
+    start = bounds(stmt.start, env)
+    end = bounds(stmt.end, env)
+    if start is None or end is None:
+        return None
+    lo, hi = (end[0], start[1]) if stmt.downto else (start[0], end[1])
+    return (lo, hi) if lo <= hi else None
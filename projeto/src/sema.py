@@ -6,41 +6,94 @@ class SemanticError(Exception):
 
 
 class Symbol:
-    def __init__(self, name, typ, kind='var', size=1, base=None, bounds=None):
+    def __init__(self, name, typ, kind='var', size=1, base=None, bounds=None, offset=None,
+                 spelling=None):
         self.name = name
-        self.typ = typ
-        self.kind = kind
+        self.spelling = spelling or name  # grafia da declaração, para os diagnósticos
+        self.typ = typ          # tipo escalar (tipo base no caso de arrays)
+        self.kind = kind        # 'global', 'local', 'param', 'ret', 'proc' ou 'func'
         self.size = size
         self.base = base
         self.bounds = bounds
+        self.offset = offset    # slot em gp (global) ou relativo a fp (local/param/ret)
+        self.depth = None       # profundidade do âmbito que o declara (0 = programa)
 
 
 class SymbolTable:
+    '''Âmbitos aninhados resolvidos por um só dicionário nome -> símbolo visível.
+
+    Cada âmbito é um array plano com os seus símbolos pela ordem de declaração; ao declarar,
+    o símbolo que fica escondido é guardado nesse âmbito e reposto no pop, pelo que lookup é
+    um único acesso em vez de percorrer a pilha de âmbitos. O símbolo devolvido é o registo
+    (depth, offset, kind) que o Analyzer liga a cada Var.
+    '''
+
     def __init__(self):
-        self.stack = [dict()]
+        self.bindings = {}
+        self.scopes = [[]]
+        self.shadowed = [[]]
+
+    @property
+    def depth(self):
+        return len(self.scopes) - 1
 
     def push(self):
-        self.stack.append(dict())
+        self.scopes.append([])
+        self.shadowed.append([])
 
     def pop(self):
-        self.stack.pop()
+        '''Fecha o âmbito atual e devolve o array dos seus símbolos.'''
+        bindings = self.bindings
+        for name, outer in reversed(self.shadowed.pop()):
+            if outer is None:
+                del bindings[name]
+            else:
+                bindings[name] = outer
+        return self.scopes.pop()
 
+    # names arrive already lower-cased and interned by the lexer
     def declare(self, name, sym):
-        if name.lower() in self.stack[-1]:
-            raise SemanticError(f"Symbol '{name}' redeclared")
-        self.stack[-1][name.lower()] = sym
+        outer = self.bindings.get(name)
+        depth = len(self.scopes) - 1
+        if outer is not None and outer.depth == depth:
+            raise SemanticError(f"Symbol '{sym.spelling}' redeclared")
+        sym.depth = depth
+        self.scopes[-1].append(sym)
+        self.shadowed[-1].append((name, outer))
+        self.bindings[name] = sym
 
-    def lookup(self, name):
-        lname = name.lower()
-        for scope in reversed(self.stack):
-            if lname in scope:
-                return scope[lname]
-        raise SemanticError(f"Undeclared identifier '{name}'")
+    def lookup(self, name, spelling=None):
+        sym = self.bindings.get(name)
+        if sym is None:
+            raise SemanticError(f"Undeclared identifier '{spelling or name}'")
+        return sym
 
 
 class Analyzer:
+    # node class -> visitor method name; bound once per instance in __init__
+    STATEMENT_VISITORS = {
+        ast.Assign: 'visit_assign',
+        ast.If: 'visit_if',
+        ast.While: 'visit_while',
+        ast.For: 'visit_for',
+        ast.Repeat: 'visit_repeat',
+        ast.ProcCall: 'visit_proc_call',
+        ast.Compound: 'visit_compound',
+        ast.NoOp: 'visit_noop',
+    }
+    EXPR_VISITORS = {
+        ast.Literal: 'visit_literal',
+        ast.Var: 'visit_var',
+        ast.ArrayAccess: 'visit_array_access',
+        ast.FuncCall: 'visit_func_call',
+        ast.BinOp: 'visit_binop',
+        ast.UnOp: 'visit_unop',
+    }
+
     def __init__(self):
         self.table = SymbolTable()
+        self.statement_visitors = {cls: getattr(self, name) for cls, name in self.STATEMENT_VISITORS.items()}
+        self.expr_visitors = {cls: getattr(self, name) for cls, name in self.EXPR_VISITORS.items()}
 
     def analyze(self, node):
         if isinstance(node, ast.Program):
@@ -48,132 +101,208 @@ class Analyzer:
         raise SemanticError('Invalid AST root')
 
     def visit_program(self, node):
-        self.visit_block(node.block)
+        self.globals = []
+        self.global_count = self.visit_block(node.block, kind='global', first_offset=0)
         return self.table
 
-    def visit_block(self, node):
+    def visit_block(self, node, kind='local', first_offset=1):
+        offset = first_offset
         for decl in node.declarations:
             for d in decl:
-                self.declare_var(d)
-        for sub in getattr(node, 'subprograms', []) or []:
+                sym = self.declare_var(d, kind, offset)
+                if kind == 'global':
+                    self.globals.append(sym)
+                offset += 1
+        subprograms = getattr(node, 'subprograms', []) or []
+        # declared up front so calls (including recursive ones) see the return type
+        for sub in subprograms:
+            self.declare_subprogram(sub)
+        for sub in subprograms:
             self.visit_subprogram(sub)
         for stmt in node.statements:
             self.visit_statement(stmt)
+        return offset - first_offset
+
+    def declare_subprogram(self, sub):
+        if isinstance(sub, ast.FunctionDecl):
+            sym = Symbol(sub.name, self.type_name(sub.return_type), kind='func', spelling=sub.spelling)
+        else:
+            sym = Symbol(sub.name, None, kind='proc', spelling=sub.spelling)
+        self.table.declare(sub.name, sym)
 
     def visit_subprogram(self, sub):
         # Enter new scope for params/locals
         self.table.push()
-        if hasattr(sub, 'params'):
-            for p in sub.params:
-                self.declare_param(p)
+        # last param at fp[-1], previous ones below it
+        param_count = len(sub.params)
+        for idx, p in enumerate(sub.params):
+            self.declare_param(p, idx - param_count)
+        first_local = 1
         if isinstance(sub, ast.FunctionDecl):
-            # function identifier acts as variable for return
-            self.table.declare(sub.name, Symbol(sub.name, sub.return_type.name if isinstance(sub.return_type, ast.Type) else sub.return_type, kind='func'))
-        self.visit_block(sub.block)
-        self.table.pop()
+            # function identifier acts as variable for return, stored in local slot 1
+            sub.ret_sym = Symbol(sub.name, self.type_name(sub.return_type), kind='ret', offset=1,
+                                 spelling=sub.spelling)
+            self.table.declare(sub.name, sub.ret_sym)
+            first_local = 2
+        last = first_local - 1 + self.visit_block(sub.block, kind='local', first_offset=first_local)
+        # slots fp[0]..fp[last]: fp[0] is unused but must exist for fp[last] to be in the frame
+        sub.frame_size = last + 1 if last > 0 else 0
+        scope = self.table.pop()
+        sub.local_arrays = [sym for sym in scope if sym.kind == 'local' and sym.bounds is not None]
+
+    def type_name(self, typ):
+        return typ.name if isinstance(typ, ast.Type) else typ
 
-    def declare_var(self, decl):
+    def make_symbol(self, decl, kind, offset):
         typ = decl.vartype
-        bounds = typ.range_bounds
-        size = 1
-        base_type = typ.name
-        if typ.name == 'array':
-            size = (bounds[1] - bounds[0] + 1)
-            base_type = typ.base.name
-        sym = Symbol(decl.name, base_type, kind='var', size=size, base=decl.vartype.base, bounds=bounds)
+        if isinstance(typ, ast.Type) and typ.name == 'array':
+            bounds = typ.range_bounds
+            return Symbol(decl.name, typ.base.name, kind=kind, size=bounds[1] - bounds[0] + 1,
+                          base=typ.base, bounds=bounds, offset=offset, spelling=decl.spelling)
+        return Symbol(decl.name, self.type_name(typ), kind=kind, offset=offset, spelling=decl.spelling)
+
+    def declare_var(self, decl, kind='global', offset=None):
+        sym = self.make_symbol(decl, kind, offset)
         self.table.declare(decl.name, sym)
+        return sym
 
-    def declare_param(self, param):
-        typ = param.vartype
-        base_type = typ.name if isinstance(typ, ast.Type) else typ
-        sym = Symbol(param.name, base_type, kind='param')
+    def declare_param(self, param, offset=None):
+        sym = self.make_symbol(param, 'param', offset)
         self.table.declare(param.name, sym)
+        return sym
 
     def visit_statement(self, node):
-        if isinstance(node, ast.Assign):
-            ltype = self.visit_lvalue(node.target)
-            rtype = self.visit_expr(node.expr)
-            if ltype != rtype and not (ltype == 'real' and rtype == 'integer'):
-                raise SemanticError(f'Type mismatch in assignment to {node.target.name}')
-        elif isinstance(node, ast.If):
-            cond = self.visit_expr(node.cond)
-            if cond != 'boolean':
-                raise SemanticError('Condition in if must be boolean')
-            for s in node.then_body.statements if isinstance(node.then_body, ast.Compound) else [node.then_body]:
-                self.visit_statement(s)
-            if node.else_body:
-                for s in node.else_body.statements if isinstance(node.else_body, ast.Compound) else [node.else_body]:
-                    self.visit_statement(s)
-        elif isinstance(node, ast.While):
-            if self.visit_expr(node.cond) != 'boolean':
-                raise SemanticError('Condition in while must be boolean')
-            for s in node.body.statements if isinstance(node.body, ast.Compound) else [node.body]:
-                self.visit_statement(s)
-        elif isinstance(node, ast.For):
-            self.table.lookup(node.var.name)
-            self.visit_expr(node.start)
-            self.visit_expr(node.end)
-            for s in node.body.statements if isinstance(node.body, ast.Compound) else [node.body]:
-                self.visit_statement(s)
-        elif isinstance(node, ast.Repeat):
-            for s in node.body:
-                self.visit_statement(s)
-            if self.visit_expr(node.cond) != 'boolean':
-                raise SemanticError('Condition in repeat must be boolean')
-        elif isinstance(node, ast.ProcCall):
-            for arg in node.args:
-                self.visit_expr(arg)
-        elif isinstance(node, ast.Compound):
-            for s in node.statements:
-                self.visit_statement(s)
-        elif isinstance(node, ast.NoOp):
-            return
-        else:
+        visitor = self.statement_visitors.get(type(node))
+        if visitor is None:
             raise SemanticError(f'Unknown statement {node}')
+        return visitor(node)
+
+    def visit_body(self, node):
+        for s in node.statements if isinstance(node, ast.Compound) else [node]:
+            self.visit_statement(s)
+
+    def visit_assign(self, node):
+        ltype = self.visit_lvalue(node.target)
+        rtype = self.visit_expr(node.expr)
+        if ltype != rtype and not (ltype == 'real' and rtype == 'integer'):
+            target = node.target.array if isinstance(node.target, ast.ArrayAccess) else node.target
+            raise SemanticError(f"Type mismatch in assignment to '{target.spelling}'")
+
+    def visit_if(self, node):
+        cond = self.visit_expr(node.cond)
+        if cond != 'boolean':
+            raise SemanticError('Condition in if must be boolean')
+        self.visit_body(node.then_body)
+        if node.else_body:
+            self.visit_body(node.else_body)
+
+    def visit_while(self, node):
+        if self.visit_expr(node.cond) != 'boolean':
+            raise SemanticError('Condition in while must be boolean')
+        self.visit_body(node.body)
+
+    def visit_for(self, node):
+        self.visit_lvalue(node.var)
+        self.visit_expr(node.start)
+        self.visit_expr(node.end)
+        self.visit_body(node.body)
+
+    def visit_repeat(self, node):
+        for s in node.body:
+            self.visit_statement(s)
+        if self.visit_expr(node.cond) != 'boolean':
+            raise SemanticError('Condition in repeat must be boolean')
+
+    def visit_proc_call(self, node):
+        for arg in node.args:
+            self.visit_expr(arg)
+
+    def visit_compound(self, node):
+        for s in node.statements:
+            self.visit_statement(s)
+
+    def visit_noop(self, node):
+        return
+
+    def lookup_var(self, node):
+        sym = self.table.lookup(node.name, node.spelling)
+        kind = sym.kind
+        if kind == 'global':
+            pass
+        elif kind in ('proc', 'func'):
+            raise SemanticError(f"'{node.spelling}' is not a variable")
+        elif sym.depth != self.table.depth:
+            # o frame de um subprograma envolvente só seria alcançável por static link
+            raise SemanticError(f"'{node.spelling}' belongs to an enclosing subprogram's frame")
+        node.sym = sym
+        return sym
+
+    def element_type(self, sym):
+        # indexing a string yields the character code
+        if sym.bounds is None and sym.typ == 'string':
+            return 'integer'
+        return sym.typ
 
     def visit_lvalue(self, node):
         if isinstance(node, ast.Var):
-            sym = self.table.lookup(node.name)
-            return sym.typ
+            node.etype = self.lookup_var(node).typ
+            return node.etype
         if isinstance(node, ast.ArrayAccess):
-            sym = self.table.lookup(node.array.name)
+            sym = self.lookup_var(node.array)
             self.visit_expr(node.index)
-            return sym.base.name if sym.base else sym.typ
+            node.etype = self.element_type(sym)
+            return node.etype
         raise SemanticError('Invalid lvalue')
 
     def visit_expr(self, node):
-        if isinstance(node, ast.Literal):
-            return node.typ
-        if isinstance(node, ast.Var):
-            return self.table.lookup(node.name).typ
-        if isinstance(node, ast.ArrayAccess):
-            self.visit_expr(node.index)
-            sym = self.table.lookup(node.array.name)
-            return sym.base.name if sym.base else sym.typ
-        if isinstance(node, ast.FuncCall):
-            if node.name.lower() == 'length':
-                return 'integer'
-            # Unknown function: assume integer result for now
-            try:
-                sym = self.table.lookup(node.name)
-                return sym.typ
-            except SemanticError:
-                return 'integer'
-        if isinstance(node, ast.BinOp):
-            lt = self.visit_expr(node.left)
-            rt = self.visit_expr(node.right)
-            op = node.op
-            if op in ('+', '-', '*', '/', 'div', 'mod'):
-                if lt == 'real' or rt == 'real' or op == '/':
-                    return 'real'
-                return 'integer'
-            if op in ('<', '<=', '>', '>=', '=', '<>'):
-                return 'boolean'
-            if op in ('and', 'or'):
-                return 'boolean'
-        if isinstance(node, ast.UnOp):
-            t = self.visit_expr(node.expr)
-            if node.op == 'not':
-                return 'boolean'
-            return t
-        raise SemanticError('Invalid expression')
\ No newline at end of file
+        visitor = self.expr_visitors.get(type(node))
+        if visitor is None:
+            raise SemanticError('Invalid expression')
+        # every expression node keeps its resolved type for CodeGen
+        node.etype = visitor(node)
+        return node.etype
+
+    def visit_literal(self, node):
+        return node.typ
+
+    def visit_var(self, node):
+        return self.lookup_var(node).typ
+
+    def visit_array_access(self, node):
+        self.visit_expr(node.index)
+        sym = self.lookup_var(node.array)
+        return self.element_type(sym)
+
+    def visit_func_call(self, node):
+        for arg in node.args:
+            self.visit_expr(arg)
+        if node.name == 'length':
+            return 'integer'
+        # Unknown function: assume integer result for now
+        try:
+            sym = self.table.lookup(node.name)
+            return sym.typ or 'integer'
+        except SemanticError:
+            return 'integer'
+
+    def visit_binop(self, node):
+        lt = self.visit_expr(node.left)
+        rt = self.visit_expr(node.right)
+        op = node.op
+        if op == '+' and lt == 'string' and rt == 'string':
+            return 'string'
+        if op in ('+', '-', '*', '/', 'div', 'mod'):
+            if lt == 'real' or rt == 'real' or op == '/':
+                return 'real'
+            return 'integer'
+        if op in ('<', '<=', '>', '>=', '=', '<>'):
+            return 'boolean'
+        if op in ('and', 'or'):
+            return 'boolean'
+        raise SemanticError('Invalid expression')
+
+    def visit_unop(self, node):
+        t = self.visit_expr(node.expr)
+        if node.op == 'not':
+            return 'boolean'
+        return t
@@ -0,0 +1,77 @@
+"""Source maps: das instruções VM de volta às linhas Pascal.
+
+O CodeGen (com source_map=True) regista a linha Pascal de cada linha emitida e o intervalo
+de linhas de cada subprograma. build() converte essa tabela para índices de instrução (as
+labels não contam, tal como no VMProgram) e o resultado pode ser gravado ao lado do .vm:
+
+    {"version": 1, "source": "tests/primo.pas",
+     "lines": [3, 3, 5, ...],                      # linha Pascal de cada instrução (ou null)
+     "subprograms": [["fnname", 2, 40], ["main", 40, 97]]}   # [nome, pc inicial, pc final)
+"""
+
+import json
+from pathlib import Path
+
+VERSION = 1
+
+
+class SourceMapError(Exception):
+    pass
+
+
+class SourceMap:
+    def __init__(self, lines, subprograms, source=None):
+        self.lines = lines                  # pc -> linha Pascal (ou None)
+        self.subprograms = subprograms      # [(nome, início, fim)] por ordem de pc
+        self.source = source
+
+    def line_of(self, pc):
+        return self.lines[pc] if 0 <= pc < len(self.lines) else None
+
+    def subprogram_of(self, pc):
+        for name, start, end in self.subprograms:
+            if start <= pc < end:
+                return name
+        return None
+
+    def to_dict(self):
+        return {
+            'version': VERSION,
+            'source': self.source,
+            'lines': self.lines,
+            'subprograms': [list(region) for region in self.subprograms],
+        }
+
+    def save(self, path):
+        Path(path).write_text(json.dumps(self.to_dict(), separators=(',', ':')) + '\n',
+                              encoding='utf-8')
+
+
+def build(emitted, positions, regions, source=None):
+    '''SourceMap a partir das linhas emitidas e das tabelas do CodeGen.'''
+    if len(emitted) != len(positions):
+        raise SourceMapError('Source positions out of sync with emitted lines')
+    lines = []
+    pc_of_line = []   # índice de linha emitida -> pc da próxima instrução
+    for text, lineno in zip(emitted, positions):
+        pc_of_line.append(len(lines))
+        if not text.endswith(':'):
+            lines.append(lineno)
+    pc_of_line.append(len(lines))
+    subprograms = [(name, pc_of_line[start], pc_of_line[min(end, len(emitted))])
+                   for name, start, end in regions]
+    return SourceMap(lines, subprograms, source)
+
+
+def load(path):
+    try:
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        raise SourceMapError(f'Cannot read source map {path}: {e}') from None
+    if data.get('version') != VERSION:
+        raise SourceMapError(f'Unsupported source map version {data.get("version")}')
+    return SourceMap(data['lines'], [tuple(r) for r in data['subprograms']], data.get('source'))
+
+
+def from_codegen(codegen, emitted, source=None):
+    return build(emitted, codegen.positions, codegen.regions, source)
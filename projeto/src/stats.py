@@ -0,0 +1,117 @@
+"""Instrumentação das fases do compilador (--stats).
+
+Cada fase é medida em tempo de relógio e em pico de memória alocada (tracemalloc, com o pico
+reposto no início da fase). Para separar lexing de parsing, os tokens são primeiro todos
+gerados para uma lista e o parser consome-a depois através de ReplayLexer; a análise
+semântica e a emissão também correm em separado (Analyzer.analyze e CodeGen.emit_program).
+Os valores em modo --stats incluem o custo do próprio tracemalloc.
+"""
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from . import ast
+from .lexer import build_lexer, tokenize_stream
+from .parser import build_parser
+from .sema import Analyzer
+from .codegen_vm import DEFAULT_OPT_LEVEL
+from .codegen_slots import CODEGENS
+
+
+class ReplayLexer:
+    '''Devolve ao yacc tokens já produzidos, com o lexdata original para as colunas.'''
+
+    def __init__(self, tokens, lexdata=''):
+        self.lexdata = lexdata
+        self.lineno = 1
+        self._tokens = iter(tokens)
+
+    def token(self):
+        return next(self._tokens, None)
+
+
+def lex_all(lexer):
+    tokens = []
+    append = tokens.append
+    token = lexer.token
+    while True:
+        tok = token()
+        if tok is None:
+            return tokens
+        append(tok)
+
+
+class CompileStats:
+    def __init__(self):
+        self.phases = []   # (nome, segundos, pico em bytes)
+        self.counts = {}
+
+    @contextmanager
+    def phase(self, name):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if tracing else 0
+            self.phases.append((name, elapsed, peak))
+
+    def as_dict(self):
+        return {
+            'phases': [{'name': name, 'seconds': round(sec, 6), 'peak_bytes': peak}
+                       for name, sec, peak in self.phases],
+            'total_seconds': round(sum(sec for _, sec, _ in self.phases), 6),
+            'counts': dict(self.counts),
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_text(self):
+        lines = [f'{"phase":<14} {"time (ms)":>10} {"peak (KiB)":>11}']
+        for name, sec, peak in self.phases:
+            lines.append(f'{name:<14} {sec * 1000:10.2f} {peak / 1024:11.1f}')
+        total = sum(sec for _, sec, _ in self.phases)
+        lines.append(f'{"total":<14} {total * 1000:10.2f}')
+        lines.append(', '.join(f'{key}={value}' for key, value in self.counts.items()))
+        return '\n'.join(lines)
+
+
+def compile_with_stats(stats, source=None, stream=None, lexer_backend='ply',
+                       opt_level=DEFAULT_OPT_LEVEL, codegen='stack'):
+    '''Compila source (ou o ficheiro stream, lido por blocos) registando cada fase em stats.
+
+    Devolve a lista de linhas VM; a escrita fica a cargo de quem chama (fase 'write').
+    '''
+    with stats.phase('build'):
+        lexer = None if stream is not None else build_lexer(lexer_backend)
+        parser = build_parser()
+    with stats.phase('lex'):
+        if stream is not None:
+            tokens = list(tokenize_stream(stream))
+        else:
+            lexer.input(source)
+            tokens = lex_all(lexer)
+    with stats.phase('parse'):
+        program = parser.parse(lexer=ReplayLexer(tokens, source or ''))
+    with stats.phase('analyze'):
+        analyzer = Analyzer()
+        analyzer.analyze(program)
+    with stats.phase('generate'):
+        generator = CODEGENS[codegen](opt_level=opt_level)
+        lines = generator.emit_program(program, analyzer)
+    labels = sum(1 for line in lines if line.endswith(':'))
+    stats.counts.update({
+        'tokens': len(tokens),
+        'ast_nodes': sum(1 for _ in ast.walk(program)),
+        'instructions': len(lines) - labels,
+        'labels': labels,
+        'temp_spills': generator.spills,
+        'folded_calls': generator.folded_calls,
+    })
+    return lines
@@ -0,0 +1,599 @@
+"""Executor local da VM (ver enunciado/VMdocumentation.txt).
+
+Interpreta um VMProgram (texto .vm ou objeto .vmb) para medir e testar o código gerado sem a
+VM web. Modelo de valores:
+- inteiros e reais são int/float de Python; booleanos são 0/1;
+- strings da String Heap são str de Python (imutáveis, pelo que o endereço é o próprio valor);
+- endereços de blocos estruturados, da pilha e das globais são Address(área, base), e
+  LOAD/STORE/PADD operam sobre area[base + n].
+As globais (gp[n]) vivem numa área própria que cresce conforme é escrita, porque o código
+gerado não as reserva na pilha. O fp aponta para o primeiro slot acima dos argumentos.
+
+Além da saída, cada execução conta as instruções executadas, a profundidade máxima da pilha
+e as alocações na heap estruturada. Com --profile, o programa corre instrução a instrução e
+as contagens/tempos são agregados por linha Pascal usando o source map (<programa>.map).
+
+Em modo batch (--batch) a entrada é lida de uma só vez para um InputBuffer e as sub-rotinas de
+leitura que o compilador gera para readln com vários argumentos (RDINT/RDREAL) passam a
+correr nativamente, sobre os tokens numéricos de cada linha analisados uma única vez.
+
+A heap estruturada (ALLOC/ALLOCN) tem um coletor mark-and-sweep: quando as células vivas
+passam o limiar da próxima recolha, marcam-se os blocos alcançáveis a partir da pilha de
+operandos (que contém os frames) e das globais, seguindo os endereços guardados nos próprios
+blocos, e os restantes deixam de contar. O limiar dobra com a heap viva e nunca passa o
+limite opcional (--heap-limit), que faz a execução falhar se nem depois de recolher houver
+espaço. As strings são str de Python, libertadas pela contagem de referências.
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from . import srcmap, vmprof
+from .vmcode import (OPCODES, OPCODE_INDEX, READ_INT_LABEL, READ_REAL_LABEL, VMCodeError,
+                     parse_text)
+
+DEFAULT_MAX_STEPS = 200_000_000
+# células vivas a partir das quais a primeira recolha da heap estruturada corre
+GC_MIN_CELLS = 1 << 16
+BACKENDS = ('interp', 'aot')
+
+# instruções tratadas diretamente no ciclo principal, pela ordem das comparações
+_FAST_OPS = tuple(OPCODE_INDEX[name] for name in (
+    'PUSHL', 'PUSHG', 'PUSHI', 'STOREL', 'STOREG', 'ADD', 'SUB', 'MUL', 'JZ', 'JUMP', 'SWAP',
+    'INF', 'INFEQ', 'SUP', 'SUPEQ', 'EQUAL', 'NOT', 'LOADN', 'STOREN', 'PADD', 'PUSHA', 'CALL',
+    'RETURN', 'POP', 'STOP'))
+# código fora da tabela de opcodes: entrada de uma sub-rotina de leitura substituída
+_NATIVE_READ = len(OPCODES)
+
+# o mesmo formato que as sub-rotinas RDINT/RDREAL percorrem carácter a carácter
+_INT_TOKEN = re.compile(r'[\x00- ]*(-?)([0-9]*)')
+_REAL_TOKEN = re.compile(r'[\x00- ]*(-?)([0-9]*)(?:\.([0-9]*))?')
+
+
+class VMError(Exception):
+    pass
+
+
+class Address:
+    __slots__ = ('area', 'base')
+
+    def __init__(self, area, base=0):
+        self.area = area
+        self.base = base
+
+    def __eq__(self, other):
+        return isinstance(other, Address) and self.area is other.area and self.base == other.base
+
+    def __hash__(self):
+        return hash((id(self.area), self.base))
+
+    def __repr__(self):
+        return f'Address({id(self.area):#x}+{self.base})'
+
+
+def _trunc_div(m, n):
+    q = abs(m) // abs(n)
+    return q if (m >= 0) == (n >= 0) else -q
+
+
+def _int_token(m):
+    return int(m.group(2) or 0) * (-1 if m.group(1) else 1)
+
+
+def _real_token(m):
+    # mesmas operações (e arredondamentos) que o fim de RDREAL
+    fraction = m.group(3) or ''
+    value = float(int(m.group(2) or 0)) + float(int(fraction or 0)) / float(10 ** len(fraction))
+    return value * float(-1 if m.group(1) else 1)
+
+
+class InputBuffer:
+    '''Entrada inteira em memória: linhas para READ e tokens numéricos por linha.'''
+
+    def __init__(self, text):
+        self.lines = text.split('\n')
+        if self.lines[-1] == '':
+            self.lines.pop()
+        self.tokens = {}    # (linha, real) -> {posição de início: (valor, posição final)}
+
+    @classmethod
+    def read(cls, stream):
+        return cls(stream.read())
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def token(self, line, pos, real):
+        '''(valor, posição seguinte) do número que começa em pos (após brancos).'''
+        table = self.tokens.get((line, real))
+        if table is None:
+            table = self.tokens[line, real] = self.scan(line, real)
+        entry = table.get(pos)
+        if entry is None:
+            # posição que não é o fim de um token anterior
+            m = (_REAL_TOKEN if real else _INT_TOKEN).match(line, pos)
+            entry = ((_real_token if real else _int_token)(m), m.end())
+        return entry
+
+    @staticmethod
+    def scan(line, real):
+        # todos os tokens da linha de uma vez, indexados pela posição onde a leitura começa
+        pattern, convert = (_REAL_TOKEN, _real_token) if real else (_INT_TOKEN, _int_token)
+        table = {}
+        pos = 0
+        while pos not in table:
+            m = pattern.match(line, pos)
+            table[pos] = (convert(m), m.end())
+            pos = m.end()
+        return table
+
+
+def load_program(path):
+    '''VMProgram de um ficheiro .vm (texto) ou .vmb (binário).'''
+    path = Path(path)
+    if path.suffix == '.vmb':
+        from . import vmb
+        return vmb.load(path)
+    return parse_text(path.read_text(encoding='utf-8'))
+
+
+class VM:
+    def __init__(self, program, input_lines=(), out=None, max_steps=DEFAULT_MAX_STEPS,
+                 heap_limit=None):
+        self.program = program
+        self.input = iter(input_lines)
+        # entrada em bloco: as leituras de readln com vários argumentos correm nativamente
+        self.buffer = input_lines if isinstance(input_lines, InputBuffer) else None
+        self.out = out if out is not None else sys.stdout
+        self.max_steps = max_steps
+        self.stack = []
+        self.globals = []
+        # blocos estruturados vivos por ordem de alocação (PUSHST/POPST), indexados por id
+        self.heap = {}
+        self.heap_limit = heap_limit    # máximo de células vivas, ou None
+        self.gc_trigger = GC_MIN_CELLS if heap_limit is None else min(GC_MIN_CELLS, heap_limit)
+        self.live_cells = 0
+        self.peak_cells = 0
+        self.collections = 0
+        self.collected = 0              # blocos recolhidos
+        self.collected_cells = 0
+        self.pc = 0
+        self.fp = 0
+        self.calls = []         # (pc de retorno, fp) por chamada ativa
+        self.steps = 0
+        self.peak_stack = 0
+        self.allocs = 0
+        self.alloc_cells = 0
+        self.frees = 0
+
+    def alloc(self, n):
+        if self.live_cells + n > self.gc_trigger:
+            self.collect()
+            if self.heap_limit is not None and self.live_cells + n > self.heap_limit:
+                raise VMError(f'Heap limit of {self.heap_limit} cells exceeded '
+                              f'({self.live_cells} live, {n} requested)')
+            self.gc_trigger = max(GC_MIN_CELLS, 2 * (self.live_cells + n))
+            if self.heap_limit is not None:
+                self.gc_trigger = min(self.gc_trigger, self.heap_limit)
+        block = [0] * n
+        self.heap[id(block)] = block
+        self.allocs += 1
+        self.alloc_cells += n
+        self.live_cells += n
+        if self.live_cells > self.peak_cells:
+            self.peak_cells = self.live_cells
+        return Address(block, 0)
+
+    def release(self, block):
+        del self.heap[id(block)]
+        self.live_cells -= len(block)
+
+    def collect(self):
+        '''Mark-and-sweep da heap estruturada; raízes na pilha (frames incluídos) e globais.'''
+        heap = self.heap
+        marked = set()
+        pending = [v for v in self.stack if type(v) is Address]
+        pending.extend(v for v in self.globals if type(v) is Address)
+        while pending:
+            key = id(pending.pop().area)
+            if key in heap and key not in marked:
+                marked.add(key)
+                pending.extend(v for v in heap[key] if type(v) is Address)
+        dead = [block for key, block in heap.items() if key not in marked]
+        for block in dead:
+            self.collected_cells += len(block)
+            self.release(block)
+        self.collected += len(dead)
+        self.collections += 1
+
+    def read_line(self):
+        try:
+            line = next(self.input)
+        except StopIteration:
+            raise VMError('READ past end of input') from None
+        return line.rstrip('\n')
+
+    def decode(self):
+        code = self.program.code
+        ops = [OPCODE_INDEX[op] for op, _ in code]
+        args = [arg for _, arg in code]
+        if self.buffer is not None:
+            labels = self.program.label_map()
+            for name, real in ((READ_INT_LABEL, False), (READ_REAL_LABEL, True)):
+                entry = labels.get(name)
+                # só a forma emitida pelo CodeGen: JUMP para o corpo seguido de RETURN
+                if (entry is not None and entry + 1 < len(code)
+                        and code[entry] == ('JUMP', labels.get(name + 'GO'))
+                        and code[entry + 1][0] == 'RETURN'):
+                    ops[entry] = _NATIVE_READ
+                    args[entry] = real
+        return ops, args
+
+    def native_read(self, fp, real):
+        # argumentos da sub-rotina: linha, posição (atualizada) e resultado
+        stack = self.stack
+        value, end = self.buffer.token(stack[fp - 3], stack[fp - 2], real)
+        stack[fp - 2] = end
+        stack[fp - 1] = value
+
+    def fault(self, e):
+        # o pc já avançou para lá da instrução que falhou
+        pc = self.pc - 1
+        if isinstance(e, VMError):
+            return VMError(f'{e} (pc {pc})')
+        code = self.program.code
+        op = code[pc][0] if 0 <= pc < len(code) else '?'
+        return VMError(f'{type(e).__name__} in {op} at pc {pc}: {e}')
+
+    def run(self, backend='interp'):
+        '''Executa até STOP; devolve o próprio VM com as métricas preenchidas.
+
+        backend='aot' corre o programa traduzido para Python por src.vmaot.
+        '''
+        if backend == 'aot':
+            from . import vmaot
+            aot = vmaot.translate(self.program)
+            try:
+                done = aot.execute(self, self.max_steps)
+            except VMError:
+                raise
+            except (IndexError, TypeError, AttributeError, ValueError, ZeroDivisionError) as e:
+                raise VMError(f'{type(e).__name__} in block at pc {self.pc}: {e}') from None
+        else:
+            ops, args = self.decode()
+            try:
+                done = self.execute(ops, args, self.max_steps)
+            except (VMError, IndexError, TypeError, AttributeError, ValueError, ZeroDivisionError) as e:
+                raise self.fault(e) from None
+        if not done:
+            raise VMError(f'Step limit of {self.max_steps} exceeded (pc {self.pc})')
+        return self
+
+    def execute(self, ops, args, limit):
+        '''Corre até STOP (devolve True) ou até self.steps chegar a limit (devolve False).
+
+        O estado (pc, fp, pilha de chamadas) fica no VM, pelo que a execução pode ser
+        retomada; o profiler usa isso para executar uma instrução de cada vez.
+        '''
+        # códigos em variáveis locais: comparações mais rápidas do que com globais
+        (PUSHL, PUSHG, PUSHI, STOREL, STOREG, ADD, SUB, MUL, JZ, JUMP, SWAP, INF, INFEQ, SUP, SUPEQ,
+         EQUAL, NOT, LOADN, STOREN, PADD, PUSHA, CALL, RETURN, POP, STOP) = _FAST_OPS
+        ops_slow = self.slow_op
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        gl = self.globals
+        calls = self.calls
+        fp = self.fp
+        pc = self.pc
+        steps = self.steps
+        peak = self.peak_stack
+        try:
+            while True:
+                op = ops[pc]
+                arg = args[pc]
+                pc += 1
+                steps += 1
+                if op == PUSHL:
+                    push(stack[fp + arg])
+                elif op == PUSHG:
+                    push(gl[arg] if arg < len(gl) else 0)
+                elif op == PUSHI:
+                    push(arg)
+                elif op == STOREL:
+                    stack[fp + arg] = pop()
+                elif op == STOREG:
+                    if arg >= len(gl):
+                        gl.extend([0] * (arg + 1 - len(gl)))
+                    gl[arg] = pop()
+                elif op == ADD:
+                    n = pop()
+                    stack[-1] += n
+                elif op == SUB:
+                    n = pop()
+                    stack[-1] -= n
+                elif op == MUL:
+                    n = pop()
+                    stack[-1] *= n
+                elif op == JZ:
+                    if not pop():
+                        pc = arg
+                elif op == JUMP:
+                    pc = arg
+                elif op == SWAP:
+                    stack[-1], stack[-2] = stack[-2], stack[-1]
+                elif op == INF:
+                    n = pop()
+                    stack[-1] = int(stack[-1] < n)
+                elif op == INFEQ:
+                    n = pop()
+                    stack[-1] = int(stack[-1] <= n)
+                elif op == SUP:
+                    n = pop()
+                    stack[-1] = int(stack[-1] > n)
+                elif op == SUPEQ:
+                    n = pop()
+                    stack[-1] = int(stack[-1] >= n)
+                elif op == EQUAL:
+                    n = pop()
+                    stack[-1] = int(stack[-1] == n)
+                elif op == NOT:
+                    stack[-1] = int(stack[-1] == 0)
+                elif op == LOADN:
+                    n = pop()
+                    a = pop()
+                    n += a.base
+                    if n < 0:
+                        raise IndexError('negative address offset')
+                    push(a.area[n])
+                elif op == STOREN:
+                    v = pop()
+                    n = pop()
+                    a = pop()
+                    n += a.base
+                    if n < 0:
+                        raise IndexError('negative address offset')
+                    a.area[n] = v
+                elif op == PADD:
+                    n = pop()
+                    a = pop()
+                    push(Address(a.area, a.base + n))
+                elif op == PUSHA:
+                    push(arg)
+                elif op == CALL:
+                    calls.append((pc, fp))
+                    pc = pop()
+                    fp = len(stack)
+                elif op == RETURN:
+                    del stack[fp:]
+                    pc, fp = calls.pop()
+                elif op == POP:
+                    del stack[len(stack) - arg:]
+                elif op == STOP:
+                    return True
+                else:
+                    fp = ops_slow(op, arg, fp)
+                if len(stack) > peak:
+                    peak = len(stack)
+                if steps == limit:
+                    break
+        finally:
+            self.pc = pc
+            self.fp = fp
+            self.steps = steps
+            self.peak_stack = peak
+        return False
+
+    def profile(self):
+        '''Executa instrução a instrução; devolve (contagens, tempo em ns) por pc.'''
+        ops, args = self.decode()
+        counts = [0] * len(ops)
+        times = [0] * len(ops)
+        clock = time.perf_counter_ns
+        execute = self.execute
+        try:
+            while True:
+                pc = self.pc
+                start = clock()
+                done = execute(ops, args, self.steps + 1)
+                times[pc] += clock() - start
+                counts[pc] += 1
+                if done:
+                    return counts, times
+                if self.steps >= self.max_steps:
+                    raise VMError(f'Step limit of {self.max_steps} exceeded')
+        except (VMError, IndexError, TypeError, AttributeError, ValueError, ZeroDivisionError) as e:
+            raise self.fault(e) from None
+
+    def slow_op(self, op, arg, fp):
+        '''Instruções menos frequentes; devolve o fp (alterado só por START).'''
+        if op == _NATIVE_READ:
+            self.native_read(fp, arg)
+            return fp
+        name = OPCODES[op][0]
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        if name == 'DIV':
+            n = pop()
+            if isinstance(n, float) or isinstance(stack[-1], float):
+                stack[-1] /= n
+            else:
+                stack[-1] = _trunc_div(stack[-1], n)
+        elif name == 'MOD':
+            n = pop()
+            m = stack[-1]
+            stack[-1] = m - n * _trunc_div(m, n)
+        elif name in ('FADD', 'FSUB', 'FMUL', 'FDIV'):
+            n = float(pop())
+            m = float(stack[-1])
+            stack[-1] = (m + n if name == 'FADD' else m - n if name == 'FSUB'
+                         else m * n if name == 'FMUL' else m / n)
+        elif name in ('FINF', 'FINFEQ', 'FSUP', 'FSUPEQ'):
+            n = pop()
+            m = stack[-1]
+            stack[-1] = int(m < n if name == 'FINF' else m <= n if name == 'FINFEQ'
+                            else m > n if name == 'FSUP' else m >= n)
+        elif name == 'FCOS' or name == 'FSIN':
+            import math
+            stack[-1] = math.cos(stack[-1]) if name == 'FCOS' else math.sin(stack[-1])
+        elif name == 'AND':
+            n = pop()
+            stack[-1] = int(bool(stack[-1]) and bool(n))
+        elif name == 'OR':
+            n = pop()
+            stack[-1] = int(bool(stack[-1]) or bool(n))
+        elif name == 'PUSHF' or name == 'PUSHS':
+            push(arg)
+        elif name == 'PUSHN':
+            stack.extend([0] * arg)
+        elif name == 'PUSHSP':
+            push(Address(stack, len(stack)))
+        elif name == 'PUSHFP':
+            push(Address(stack, fp))
+        elif name == 'PUSHGP':
+            push(Address(self.globals, 0))
+        elif name == 'PUSHST':
+            push(Address(list(self.heap.values())[arg], 0))
+        elif name == 'LOAD':
+            a = pop()
+            push(a.area[a.base + arg])
+        elif name == 'STORE':
+            v = pop()
+            a = pop()
+            a.area[a.base + arg] = v
+        elif name == 'DUP':
+            stack.extend([stack[-1]] * arg)
+        elif name == 'DUPN':
+            n = pop()
+            stack.extend([stack[-1]] * n)
+        elif name == 'COPY':
+            stack.extend(stack[len(stack) - arg:])
+        elif name == 'COPYN':
+            n = pop()
+            stack.extend(stack[len(stack) - n:])
+        elif name == 'POPN':
+            n = pop()
+            del stack[len(stack) - n:]
+        elif name == 'CONCAT':
+            n = pop()
+            stack[-1] = stack[-1] + n
+        elif name == 'CHRCODE':
+            stack[-1] = ord(stack[-1][0])
+        elif name == 'STRLEN':
+            stack[-1] = len(stack[-1])
+        elif name == 'CHARAT':
+            n = pop()
+            stack[-1] = ord(stack[-1][n])
+        elif name == 'ALLOC':
+            push(self.alloc(arg))
+        elif name == 'ALLOCN':
+            push(self.alloc(pop()))
+        elif name == 'FREE':
+            a = pop()
+            if type(a) is not Address or id(a.area) not in self.heap:
+                raise VMError('FREE of an address that is not a live heap block')
+            self.release(a.area)
+            a.area.clear()  # acessos posteriores ao bloco falham com IndexError
+            self.frees += 1
+        elif name == 'POPST':
+            self.release(next(reversed(self.heap.values())))
+        elif name == 'ATOI':
+            stack[-1] = int(stack[-1].strip())
+        elif name == 'ATOF':
+            stack[-1] = float(stack[-1].strip())
+        elif name == 'ITOF':
+            stack[-1] = float(stack[-1])
+        elif name == 'FTOI':
+            stack[-1] = int(stack[-1])
+        elif name == 'STRI' or name == 'STRF':
+            stack[-1] = str(stack[-1])
+        elif name == 'CHECK':
+            low, high = arg
+            if not low <= stack[-1] <= high:
+                raise VMError(f'CHECK failed: {stack[-1]} not in [{low}, {high}]')
+        elif name == 'WRITEI' or name == 'WRITES':
+            self.out.write(str(pop()))
+        elif name == 'WRITEF':
+            self.out.write(str(float(pop())))
+        elif name == 'WRITECHR':
+            self.out.write(chr(pop()))
+        elif name == 'WRITELN':
+            self.out.write('\n')
+        elif name == 'READ':
+            push(self.read_line())
+        elif name == 'START':
+            fp = len(stack)
+        elif name == 'NOP':
+            pass
+        elif name == 'ERR':
+            raise VMError(arg)
+        else:
+            raise VMError(f'Unsupported instruction {name}')
+        return fp
+
+    def summary(self):
+        return (f'{self.steps} instructions executed, peak stack {self.peak_stack}, '
+                f'{self.allocs} heap allocation(s) ({self.alloc_cells} cells), {self.frees} free(s), '
+                f'peak live heap {self.peak_cells} cells, {self.collections} collection(s) '
+                f'reclaiming {self.collected} block(s) ({self.collected_cells} cells)')
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Run a VM program (.vm or .vmb)')
+    ap.add_argument('program', help='Program file (.vm text or .vmb binary)')
+    ap.add_argument('--input', help='Read input lines from this file instead of stdin')
+    ap.add_argument('--batch', action='store_true',
+                    help='Read the whole input up front and parse multi-value readln lines natively')
+    ap.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS)
+    ap.add_argument('--heap-limit', type=int,
+                    help='Maximum live cells in the structured heap (collected before failing)')
+    ap.add_argument('--stats', action='store_true', help='Print execution counters to stderr')
+    ap.add_argument('--backend', choices=BACKENDS, default='interp',
+                    help='Interpreter (default) or ahead-of-time translation to Python')
+    ap.add_argument('--profile', action='store_true',
+                    help='Report instruction counts and time per Pascal line to stderr')
+    ap.add_argument('--map', help='Source map for --profile (default: <program>.map if present)')
+    ap.add_argument('--top', type=int, default=20, help='Hot lines shown by --profile')
+    args = ap.parse_args()
+    if args.profile and args.backend != 'interp':
+        ap.error('--profile needs the interpreter backend')
+    try:
+        program = load_program(args.program)
+    except VMCodeError as e:
+        sys.exit(f'error: {e}')
+    source_map = None
+    if args.profile:
+        map_path = args.map or args.program + '.map'
+        if args.map or Path(map_path).exists():
+            try:
+                source_map = srcmap.load(map_path)
+            except srcmap.SourceMapError as e:
+                sys.exit(f'error: {e}')
+            if len(source_map.lines) != len(program.code):
+                sys.exit(f'error: source map {map_path} does not match {args.program}')
+    lines = open(args.input, encoding='utf-8') if args.input else sys.stdin
+    if args.batch:
+        lines = InputBuffer.read(lines)
+    vm = VM(program, lines, max_steps=args.max_steps, heap_limit=args.heap_limit)
+    try:
+        if args.profile:
+            counts, times = vm.profile()
+        else:
+            vm.run(args.backend)
+    except VMError as e:
+        sys.stdout.flush()
+        sys.exit(f'vm error: {e}')
+    finally:
+        sys.stdout.flush()
+    if args.stats:
+        print(vm.summary(), file=sys.stderr)
+    if args.profile:
+        print('\n'.join(vmprof.report(program, counts, times, source_map, args.top)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+"""Tradução antecipada (AOT) de código VM para Python.
+
+Cada bloco básico do VMProgram é traduzido para código Python em que a pilha de operandos
+dentro do bloco é modelada por variáveis locais (t0, t1, ...): só os valores que sobram no
+fim do bloco, ou que uma instrução precisa de ver na pilha real, são escritos em vm.stack.
+Os blocos formam cadeias: os sucessores de cada bloco (fallthrough, JUMP e os dois ramos
+de JZ) são traduzidos em linha até um limite, e uma cadeia que volta ao seu início fica num
+`while True` de Python, pelo que os ciclos internos não passam pelo despacho. O despacho entre cadeias é uma árvore binária de `if`
+sobre o pc inicial, e todo o programa é compilado uma única vez com compile().
+
+Instruções sem tradução (FREE, PUSHSP, CHECK, ...) chamam VM.slow_op, a mesma rotina do
+interpretador, depois de escrever a pilha virtual na pilha real. As contagens de instruções
+(vm.steps) são exatas; vm.peak_stack só é medido nas fronteiras entre cadeias, e um erro é
+reportado com o pc inicial da cadeia em que ocorreu.
+"""
+
+import math
+
+from .vm import Address, VMError, _trunc_div
+from .vmcode import OPCODE_INDEX
+
+# blocos traduzidos por cadeia, somando os dois ramos de cada JZ (limita a duplicação)
+CHAIN_LIMIT = 16
+
+TERMINATORS = {'JUMP', 'JZ', 'CALL', 'RETURN', 'STOP', 'ERR'}
+
+_COMPARE = {'INF': '<', 'INFEQ': '<=', 'SUP': '>', 'SUPEQ': '>=', 'EQUAL': '==',
+            'FINF': '<', 'FINFEQ': '<=', 'FSUP': '>', 'FSUPEQ': '>='}
+_ARITH = {'ADD': '+', 'SUB': '-', 'MUL': '*', 'CONCAT': '+'}
+_FARITH = {'FADD': '+', 'FSUB': '-', 'FMUL': '*', 'FDIV': '/'}
+
+
+def _div(m, n):
+    if isinstance(n, float) or isinstance(m, float):
+        return m / n
+    return _trunc_div(m, n)
+
+
+def _mod(m, n):
+    return m - n * _trunc_div(m, n)
+
+
+def literal(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return f'float({str(value)!r})'
+    return repr(value)
+
+
+def find_leaders(code):
+    leaders = {0}
+    for pc, (op, arg) in enumerate(code):
+        if op in ('JUMP', 'JZ', 'PUSHA'):
+            leaders.add(arg)
+        if op in TERMINATORS:
+            leaders.add(pc + 1)
+    return sorted(pc for pc in leaders if pc < len(code))
+
+
+def int_literal(text):
+    try:
+        return int(text.strip('()'))
+    except ValueError:
+        return None
+
+
+def division(op, a, b):
+    '''DIV/MOD com o caso de inteiros não negativos em linha (// e % de Python coincidem aí).'''
+    conds = []
+    for text, positive in ((a, False), (b, True)):
+        value = int_literal(text)
+        if value is None:
+            conds.append(f'{text} > 0' if positive else f'{text} >= 0')
+            if op == 'DIV':
+                conds.append(f'{text}.__class__ is int')
+        elif value < 0 or (positive and value == 0):
+            conds.append('False')
+    helper = f'_div({a}, {b})' if op == 'DIV' else f'_mod({a}, {b})'
+    if 'False' in conds:
+        return helper
+    fast = f'{a} // {b}' if op == 'DIV' else f'{a} % {b}'
+    return f'{fast} if {" and ".join(conds)} else {helper}' if conds else fast
+
+
+class Value:
+    '''Entrada da pilha virtual: nome/literal Python, ou expressão booleana por materializar.'''
+    __slots__ = ('text', 'boolean')
+
+    def __init__(self, text, boolean=False):
+        self.text = text
+        self.boolean = boolean
+
+    def value(self):
+        return f'(1 if {self.text} else 0)' if self.boolean else self.text
+
+
+class BlockWriter:
+    '''Traduz uma cadeia de blocos para linhas de Python com indentação relativa.'''
+
+    def __init__(self, code, leaders, out, indent):
+        self.code = code
+        self.leaders = leaders
+        self.out = out
+        self.indent = indent
+        self.vs = []
+        self.temps = 0
+
+    def line(self, text, extra=0):
+        self.out.append('    ' * (self.indent + extra) + text)
+
+    def temp(self, expr):
+        name = f't{self.temps}'
+        self.temps += 1
+        self.line(f'{name} = {expr}')
+        return name
+
+    def push_temp(self, expr):
+        self.vs.append(Value(self.temp(expr)))
+
+    def pop(self):
+        if self.vs:
+            return self.vs.pop()
+        return Value(self.temp('pop()'))
+
+    def flush(self):
+        values = [v.value() for v in self.vs]
+        if len(values) == 1:
+            self.line(f'push({values[0]})')
+        elif values:
+            self.line(f'stack.extend(({", ".join(values)}))')
+        self.vs = []
+
+    def materialize(self, v):
+        return Value(self.temp(v.value())) if v.boolean else v
+
+    def instruction(self, pc, op, arg):
+        '''Traduz uma instrução que não termina o bloco.'''
+        pop = self.pop
+        if op == 'PUSHI' or op == 'PUSHF' or op == 'PUSHS' or op == 'PUSHA':
+            text = literal(arg)
+            self.vs.append(Value(f'({text})' if text.startswith('-') else text))
+        elif op == 'PUSHG':
+            self.push_temp(f'gl[{arg}]')
+        elif op == 'PUSHL':
+            self.push_temp(f'stack[fp + {arg}]' if arg >= 0 else f'stack[fp - {-arg}]')
+        elif op == 'STOREG':
+            self.line(f'gl[{arg}] = {pop().value()}')
+        elif op == 'STOREL':
+            v = pop().value()
+            self.line(f'stack[fp + {arg}] = {v}' if arg >= 0 else f'stack[fp - {-arg}] = {v}')
+        elif op in _ARITH:
+            b = pop().value()
+            a = pop().value()
+            self.push_temp(f'{a} {_ARITH[op]} {b}')
+        elif op in _FARITH:
+            b = pop().value()
+            a = pop().value()
+            self.push_temp(f'float({a}) {_FARITH[op]} float({b})')
+        elif op == 'DIV' or op == 'MOD':
+            b = self.materialize(pop()).text
+            a = self.materialize(pop()).text
+            self.push_temp(division(op, a, b))
+        elif op in _COMPARE:
+            b = pop().value()
+            a = pop().value()
+            self.vs.append(Value(f'{a} {_COMPARE[op]} {b}', boolean=True))
+        elif op == 'NOT':
+            v = pop()
+            self.vs.append(Value(f'not ({v.text})' if v.boolean else f'{v.text} == 0', boolean=True))
+        elif op == 'AND' or op == 'OR':
+            b = pop()
+            a = pop()
+            # operandos já avaliados: o curto-circuito de Python só afeta o custo
+            word = 'and' if op == 'AND' else 'or'
+            self.vs.append(Value(f'({a.text}) {word} ({b.text})', boolean=True))
+        elif op == 'SWAP':
+            b = pop()
+            a = pop()
+            self.vs.extend((b, a))
+        elif op == 'DUP':
+            v = self.materialize(pop())
+            self.vs.extend([v] * (arg + 1))
+        elif op == 'POP':
+            n = arg
+            while n and self.vs:
+                self.vs.pop()
+                n -= 1
+            if n:
+                self.line(f'del stack[len(stack) - {n}:]')
+        elif op == 'LOADN':
+            n = pop().value()
+            a = pop().value()
+            i = self.temp(f'{a}.base + {n}')
+            self.line(f'if {i} < 0: raise IndexError("negative address offset")')
+            self.push_temp(f'{a}.area[{i}]')
+        elif op == 'STOREN':
+            v = pop().value()
+            n = pop().value()
+            a = pop().value()
+            i = self.temp(f'{a}.base + {n}')
+            self.line(f'if {i} < 0: raise IndexError("negative address offset")')
+            self.line(f'{a}.area[{i}] = {v}')
+        elif op == 'PADD':
+            n = pop().value()
+            a = pop().value()
+            self.push_temp(f'Address({a}.area, {a}.base + {n})')
+        elif op == 'LOAD':
+            a = pop().value()
+            self.push_temp(f'{a}.area[{a}.base + {arg}]')
+        elif op == 'STORE':
+            v = pop().value()
+            a = pop().value()
+            self.line(f'{a}.area[{a}.base + {arg}] = {v}')
+        elif op == 'WRITEI' or op == 'WRITES':
+            self.line(f'write(str({pop().value()}))')
+        elif op == 'WRITEF':
+            self.line(f'write(str(float({pop().value()})))')
+        elif op == 'WRITECHR':
+            self.line(f'write(chr({pop().value()}))')
+        elif op == 'WRITELN':
+            self.line("write('\\n')")
+        elif op == 'READ':
+            self.push_temp('read_line()')
+        elif op in ('ATOI', 'ATOF', 'ITOF', 'FTOI', 'STRI', 'STRF', 'STRLEN', 'CHRCODE'):
+            a = pop().value()
+            self.push_temp({'ATOI': f'int({a}.strip())', 'ATOF': f'float({a}.strip())',
+                            'ITOF': f'float({a})', 'FTOI': f'int({a})', 'STRI': f'str({a})',
+                            'STRF': f'str({a})', 'STRLEN': f'len({a})',
+                            'CHRCODE': f'ord({a}[0])'}[op])
+        elif op == 'CHARAT':
+            n = pop().value()
+            a = pop().value()
+            self.push_temp(f'ord({a}[{n}])')
+        elif op == 'ALLOC':
+            # o coletor parte da pilha real: tem de estar completa
+            self.flush()
+            self.push_temp(f'alloc({arg})')
+        elif op == 'PUSHN':
+            self.flush()
+            self.line(f'stack.extend([0] * {arg})')
+        elif op == 'NOP':
+            pass
+        else:
+            # sem tradução: a pilha real tem de estar completa para o interpretador
+            self.flush()
+            self.line(f'fp = slow_op({OPCODE_INDEX[op]}, args[{pc}], fp)')
+
+    def edge(self, target, head, on_path):
+        """Salto para target: continue no ciclo da cadeia, tradução em linha ou saída."""
+        if target == head:
+            self.line('continue')
+        elif target >= len(self.code):
+            self.line('raise VMError("Execution ran past the end of the program")')
+        elif target in on_path or self.budget <= 0:
+            self.line(f'pc = {target}')
+            self.line('break')
+        else:
+            self.path(target, head, on_path | {target})
+
+    def chain(self, head):
+        """Cadeia de blocos a partir de head, dentro de um `while True` próprio."""
+        self.line('while True:')
+        self.indent += 1
+        self.line(f'if steps >= limit: pc = {head}; break')
+        self.budget = CHAIN_LIMIT
+        self.path(head, head, {head})
+        self.indent -= 1
+
+    def path(self, block, head, on_path):
+        """Traduz block e os sucessores ainda não vistos neste caminho (ambos os ramos de JZ)."""
+        code = self.code
+        self.budget -= 1
+        end = block + 1
+        while end < len(code) and end not in self.leaders:
+            end += 1
+        self.line(f'steps += {end - block}')
+        last_op, last_arg = code[end - 1]
+        body_end = end - 1 if last_op in TERMINATORS else end
+        for pc in range(block, body_end):
+            op, arg = code[pc]
+            self.instruction(pc, op, arg)
+        if last_op == 'JZ':
+            cond = self.pop()
+            self.flush()
+            self.line(f'if not ({cond.text}):')
+            self.indent += 1
+            self.edge(last_arg, head, on_path)
+            self.indent -= 1
+            self.edge(end, head, on_path)
+        elif last_op == 'JUMP':
+            self.flush()
+            self.edge(last_arg, head, on_path)
+        elif last_op == 'CALL':
+            target = self.pop().value()
+            self.flush()
+            self.line(f'calls.append(({end}, fp))')
+            self.line('fp = len(stack)')
+            self.line(f'pc = {target}')
+            self.line('break')
+        elif last_op == 'RETURN':
+            self.flush()
+            self.line('del stack[fp:]')
+            self.line('pc, fp = calls.pop()')
+            self.line('break')
+        elif last_op == 'STOP':
+            self.flush()
+            self.line(f'pc = {end}')
+            self.line('done = True')
+            self.line('break')
+        elif last_op == 'ERR':
+            self.flush()
+            self.line(f'raise VMError({last_arg!r})')
+        else:
+            self.flush()
+            self.edge(end, head, on_path)
+
+
+def dispatch(heads, out, indent, writer_for):
+    '''Árvore binária de if sobre pc para as cadeias em heads (ordenadas).'''
+    if len(heads) == 1:
+        writer_for(heads[0], indent)
+        return
+    mid = len(heads) // 2
+    out.append('    ' * indent + f'if pc < {heads[mid]}:')
+    dispatch(heads[:mid], out, indent + 1, writer_for)
+    out.append('    ' * indent + 'else:')
+    dispatch(heads[mid:], out, indent + 1, writer_for)
+
+
+class AotProgram:
+    def __init__(self, program, source, leaders):
+        self.program = program
+        self.source = source
+        self.leaders = leaders
+        namespace = {'Address': Address, 'VMError': VMError, '_div': _div, '_mod': _mod}
+        exec(compile(source, '<vm-aot>', 'exec'), namespace)
+        self.function = namespace['run_aot']
+
+    def execute(self, vm, limit):
+        '''Corre até STOP (True) ou até vm.steps chegar a limit (False), como VM.execute.'''
+        if vm.pc not in self.leaders:
+            raise VMError(f'Cannot enter translated code at pc {vm.pc}')
+        globals_used = [arg for op, arg in self.program.code if op in ('PUSHG', 'STOREG')]
+        if globals_used and len(vm.globals) <= max(globals_used):
+            vm.globals.extend([0] * (max(globals_used) + 1 - len(vm.globals)))
+        args = [arg for _, arg in self.program.code]
+        return self.function(vm, args, limit)
+
+
+def translate(program):
+    '''AotProgram com o código Python gerado para program (um VMProgram).'''
+    code = program.code
+    leaders = find_leaders(code)
+    leader_set = set(leaders)
+    out = [
+        'def run_aot(vm, args, limit):',
+        '    stack = vm.stack',
+        '    push = stack.append',
+        '    pop = stack.pop',
+        '    gl = vm.globals',
+        '    calls = vm.calls',
+        '    write = vm.out.write',
+        '    read_line = vm.read_line',
+        '    slow_op = vm.slow_op',
+        '    alloc = vm.alloc',
+        '    pc = vm.pc',
+        '    fp = vm.fp',
+        '    steps = vm.steps',
+        '    peak = vm.peak_stack',
+        '    done = False',
+        '    try:',
+        '        while not done:',
+        '            if steps >= limit:',
+        '                break',
+        '            if len(stack) > peak:',
+        '                peak = len(stack)',
+    ]
+    if code:
+        def writer_for(head, indent):
+            BlockWriter(code, leader_set, out, indent).chain(head)
+        dispatch(leaders, out, 3, writer_for)
+    else:
+        out.append('            raise VMError("Empty program")')
+    out += [
+        '    finally:',
+        '        vm.pc = pc',
+        '        vm.fp = fp',
+        '        vm.steps = steps',
+        '        vm.peak_stack = peak',
+        '    return done',
+        '',
+    ]
+    return AotProgram(program, '\n'.join(out), leader_set)
@@ -0,0 +1,177 @@
+"""Formato objeto binário .vmb para programas VM.
+
+Layout (little-endian):
+- cabeçalho: magic b'VMB\\0', versão u16, flags u16, crc32 do corpo u32,
+  nº de instruções u32, nº de strings u32, nº de labels u32;
+- corpo: pool de strings internadas (varint tamanho + UTF-8), tabela de labels
+  (varint índice do nome no pool + varint offset de instrução já resolvido) e código
+  (1 byte de opcode + operandos: inteiros em varint zigzag, reais em f64, strings e
+  labels como índices varint no pool/tabela).
+
+O loader usa mmap e devolve um VMProgram pronto a executar, sem re-tokenizar texto nem
+resolver labels.
+"""
+
+import mmap
+import struct
+import zlib
+
+from .vmcode import (OPCODES, OPCODE_INDEX, NONE, INT, FLOAT, STR, LABEL, INT2,
+                     VMProgram, VMCodeError, parse_lines)
+
+MAGIC = b'VMB\0'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIII')
+F64 = struct.Struct('<d')
+
+
+class VMBError(VMCodeError):
+    pass
+
+
+def write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def zigzag(n):
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+
+def unzigzag(n):
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+
+
+def encode(program):
+    '''Serializa um VMProgram para bytes .vmb.'''
+    pool = []
+    pool_index = {}
+
+    def intern(s):
+        idx = pool_index.get(s)
+        if idx is None:
+            idx = pool_index[s] = len(pool)
+            pool.append(s)
+        return idx
+
+    label_index = {}
+    label_table = bytearray()
+    for i, (name, target) in enumerate(program.labels):
+        label_index[name] = i
+        write_varint(label_table, intern(name))
+        write_varint(label_table, target)
+
+    code = bytearray()
+    for pc, (op, arg) in enumerate(program.code):
+        code.append(OPCODE_INDEX[op])
+        kind = OPCODES[OPCODE_INDEX[op]][1]
+        if kind == INT:
+            write_varint(code, zigzag(arg))
+        elif kind == FLOAT:
+            code += F64.pack(arg)
+        elif kind == STR:
+            write_varint(code, intern(arg))
+        elif kind == LABEL:
+            name = program.label_refs.get(pc)
+            if name is None:
+                # salto sem nome conhecido: cria label sintética para o destino
+                name = f'__L{arg}'
+                if name not in label_index:
+                    label_index[name] = len(label_index)
+                    write_varint(label_table, intern(name))
+                    write_varint(label_table, arg)
+            write_varint(code, label_index[name])
+        elif kind == INT2:
+            write_varint(code, zigzag(arg[0]))
+            write_varint(code, zigzag(arg[1]))
+
+    strings = bytearray()
+    for s in pool:
+        data = s.encode('utf-8')
+        write_varint(strings, len(data))
+        strings += data
+    body = bytes(strings + label_table + code)
+    header = HEADER.pack(MAGIC, VERSION, 0, zlib.crc32(body), len(program.code),
+                         len(pool), len(label_index))
+    return header + body
+
+
+def encode_lines(lines):
+    return encode(parse_lines(lines))
+
+
+def decode(buf):
+    '''Reconstroi um VMProgram a partir de um buffer (bytes, memoryview ou mmap).'''
+    if len(buf) < HEADER.size:
+        raise VMBError('Truncated .vmb header')
+    magic, version, _flags, crc, n_code, n_strings, n_labels = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise VMBError('Not a .vmb file')
+    if version != VERSION:
+        raise VMBError(f'Unsupported .vmb version {version}')
+    view = memoryview(buf)
+    data = view[HEADER.size:]
+    if zlib.crc32(data) != crc:
+        data.release()
+        view.release()
+        raise VMBError('Checksum mismatch in .vmb file')
+
+    pos = 0
+
+    def varint():
+        nonlocal pos
+        result = shift = 0
+        while True:
+            b = data[pos]
+            pos += 1
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                return result
+            shift += 7
+
+    try:
+        pool = []
+        for _ in range(n_strings):
+            size = varint()
+            pool.append(str(data[pos:pos + size], 'utf-8'))
+            pos += size
+        labels = []
+        for _ in range(n_labels):
+            name = pool[varint()]
+            labels.append((name, varint()))
+        code = []
+        label_refs = {}
+        for pc in range(n_code):
+            op, kind = OPCODES[data[pos]]
+            pos += 1
+            if kind == NONE:
+                code.append((op, None))
+            elif kind == INT:
+                code.append((op, unzigzag(varint())))
+            elif kind == FLOAT:
+                code.append((op, F64.unpack_from(data, pos)[0]))
+                pos += F64.size
+            elif kind == STR:
+                code.append((op, pool[varint()]))
+            elif kind == LABEL:
+                name, target = labels[varint()]
+                label_refs[pc] = name
+                code.append((op, target))
+            else:
+                a = unzigzag(varint())
+                code.append((op, (a, unzigzag(varint()))))
+    except IndexError:
+        raise VMBError('Corrupt .vmb body') from None
+    finally:
+        data.release()
+        view.release()
+    return VMProgram(code, labels, label_refs)
+
+
+def load(path):
+    '''Carrega um ficheiro .vmb via mmap.'''
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return decode(mm)
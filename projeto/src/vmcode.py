@@ -0,0 +1,180 @@
+"""Representação estruturada do código VM.
+
+Tabela de opcodes da VM (ver enunciado/VMdocumentation.txt) com o tipo de operando de cada
+instrução, parsing do formato textual emitido pelo CodeGen e formatação de volta para texto.
+É a base partilhada pelo formato binário (.vmb) e pelas ferramentas que consomem código VM.
+"""
+
+# Tipos de operando
+NONE = 0
+INT = 1
+FLOAT = 2
+STR = 3
+LABEL = 4
+INT2 = 5
+
+# Ordem fixa: o índice na lista é o código do opcode no formato binário.
+OPCODES = [
+    # Operações inteiras
+    ('ADD', NONE), ('SUB', NONE), ('MUL', NONE), ('DIV', NONE), ('MOD', NONE),
+    ('NOT', NONE), ('INF', NONE), ('INFEQ', NONE), ('SUP', NONE), ('SUPEQ', NONE),
+    # Operações reais
+    ('FADD', NONE), ('FSUB', NONE), ('FMUL', NONE), ('FDIV', NONE), ('FCOS', NONE),
+    ('FSIN', NONE), ('FINF', NONE), ('FINFEQ', NONE), ('FSUP', NONE), ('FSUPEQ', NONE),
+    # Endereços e strings
+    ('PADD', NONE), ('CONCAT', NONE), ('CHRCODE', NONE), ('STRLEN', NONE), ('CHARAT', NONE),
+    # Heap
+    ('ALLOC', INT), ('ALLOCN', NONE), ('FREE', NONE), ('POPST', NONE),
+    # Igualdade e conversões
+    ('EQUAL', NONE), ('ATOI', NONE), ('ATOF', NONE), ('ITOF', NONE), ('FTOI', NONE),
+    ('STRI', NONE), ('STRF', NONE),
+    # Empilhar
+    ('PUSHI', INT), ('PUSHN', INT), ('PUSHF', FLOAT), ('PUSHS', STR), ('PUSHG', INT),
+    ('PUSHL', INT), ('PUSHSP', NONE), ('PUSHFP', NONE), ('PUSHGP', NONE), ('PUSHST', INT),
+    ('LOAD', INT), ('LOADN', NONE), ('DUP', INT), ('DUPN', NONE), ('COPY', INT), ('COPYN', NONE),
+    # Desempilhar e arquivar
+    ('POP', INT), ('POPN', NONE), ('STOREL', INT), ('STOREG', INT), ('STORE', INT), ('STOREN', NONE),
+    # Diversos
+    ('CHECK', INT2), ('SWAP', NONE), ('AND', NONE), ('OR', NONE),
+    # Entrada/saída
+    ('WRITEI', NONE), ('WRITEF', NONE), ('WRITES', NONE), ('WRITELN', NONE), ('WRITECHR', NONE),
+    ('READ', NONE),
+    # Controlo
+    ('PUSHA', LABEL), ('JUMP', LABEL), ('JZ', LABEL), ('CALL', NONE), ('RETURN', NONE),
+    ('START', NONE), ('NOP', NONE), ('ERR', STR), ('STOP', NONE),
+]
+
+OPCODE_INDEX = {name: code for code, (name, _) in enumerate(OPCODES)}
+OPERAND_KIND = dict(OPCODES)
+
+# Sub-rotinas de leitura emitidas pelo CodeGen para readln com vários argumentos. A primeira
+# instrução salta para o corpo e a segunda é RETURN, para que um executor possa substituir a
+# entrada por uma implementação nativa (ver VM em modo batch).
+READ_INT_LABEL = 'RDINT'
+READ_REAL_LABEL = 'RDREAL'
+
+
+class VMCodeError(Exception):
+    pass
+
+
+class VMProgram:
+    def __init__(self, code, labels, label_refs=None):
+        self.code = code                      # list[(op, arg)]; saltos com arg = índice destino
+        self.labels = labels                  # list[(nome, índice)] pela ordem de definição
+        self.label_refs = label_refs or {}    # pc -> nome da label usada no operando
+
+    def label_map(self):
+        return {name: target for name, target in self.labels}
+
+
+def unescape_string(s):
+    '''Inverte CodeGen.escape_string (\\\\ e \\").'''
+    out = []
+    i = 0
+    while i < len(s):
+        ch = s[i]
+        if ch == '\\' and i + 1 < len(s):
+            i += 1
+            ch = s[i]
+        out.append(ch)
+        i += 1
+    return ''.join(out)
+
+
+def escape_string(s):
+    return s.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def parse_operand(op, kind, text, lineno):
+    try:
+        if kind == INT:
+            return int(text)
+        if kind == FLOAT:
+            return float(text)
+        if kind == STR:
+            if len(text) < 2 or text[0] != '"' or text[-1] != '"':
+                raise ValueError(text)
+            return unescape_string(text[1:-1])
+        if kind == INT2:
+            a, b = text.replace(',', ' ').split()
+            return (int(a), int(b))
+        return text
+    except ValueError:
+        raise VMCodeError(f"Invalid operand '{text}' for {op} at line {lineno}") from None
+
+
+def parse_lines(lines):
+    '''Converte linhas de texto VM num VMProgram com as labels resolvidas.'''
+    code = []
+    labels = []
+    pending = []  # (pc, nome) de operandos label por resolver
+    for lineno, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line:
+            continue
+        if line.endswith(':') and ' ' not in line:
+            labels.append((line[:-1], len(code)))
+            continue
+        op, _, rest = line.partition(' ')
+        op = op.upper()
+        kind = OPERAND_KIND.get(op)
+        if kind is None:
+            raise VMCodeError(f"Unknown instruction '{op}' at line {lineno}")
+        rest = rest.strip()
+        if kind == NONE:
+            if rest:
+                raise VMCodeError(f"Instruction {op} takes no operand (line {lineno})")
+            code.append((op, None))
+            continue
+        if not rest:
+            raise VMCodeError(f"Missing operand for {op} at line {lineno}")
+        if kind == LABEL:
+            pending.append((len(code), rest))
+        code.append((op, parse_operand(op, kind, rest, lineno)))
+    targets = {}
+    for name, target in labels:
+        if name in targets:
+            raise VMCodeError(f"Label '{name}' redefined")
+        targets[name] = target
+    label_refs = {}
+    for pc, name in pending:
+        if name not in targets:
+            raise VMCodeError(f"Undefined label '{name}'")
+        code[pc] = (code[pc][0], targets[name])
+        label_refs[pc] = name
+    return VMProgram(code, labels, label_refs)
+
+
+def parse_text(text):
+    return parse_lines(text.splitlines())
+
+
+def format_instruction(op, arg, label=None):
+    kind = OPERAND_KIND[op]
+    if kind == NONE:
+        return op
+    if kind == LABEL:
+        return f'{op} {label if label is not None else arg}'
+    if kind == STR:
+        return f'{op} "{escape_string(arg)}"'
+    if kind == FLOAT:
+        return f'{op} {float(arg)}'
+    if kind == INT2:
+        return f'{op} {arg[0]}, {arg[1]}'
+    return f'{op} {arg}'
+
+
+def format_program(program):
+    '''Gera as linhas de texto VM (labels incluídas) de um VMProgram.'''
+    by_target = {}
+    for name, target in program.labels:
+        by_target.setdefault(target, []).append(name)
+    lines = []
+    for pc, (op, arg) in enumerate(program.code):
+        for name in by_target.get(pc, ()):
+            lines.append(f'{name}:')
+        lines.append(format_instruction(op, arg, program.label_refs.get(pc)))
+    for name in by_target.get(len(program.code), ()):
+        lines.append(f'{name}:')
+    return lines
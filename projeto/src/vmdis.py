@@ -0,0 +1,37 @@
+"""Disassembler .vmb -> texto VM.
+
+Uso: python -m src.vmdis programa.vmb [-o programa.vm]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from . import vmb
+from .vmcode import format_program
+
+
+def disassemble(path):
+    '''Devolve o texto VM equivalente ao ficheiro .vmb indicado.'''
+    return '\n'.join(format_program(vmb.load(path)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Disassemble a .vmb file into VM text')
+    ap.add_argument('input', help='Input .vmb file')
+    ap.add_argument('-o', '--output', help='Output VM file (default: stdout)')
+    args = ap.parse_args()
+
+    try:
+        text = disassemble(args.input)
+    except vmb.VMBError as e:
+        sys.exit(f'vmdis: {e}')
+
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Relatório de hotspots do profiler da VM.
+
+Agrega as contagens e tempos por instrução devolvidos por VM.profile() por linha Pascal (via
+source map) e por subprograma. Sem source map, os subprogramas são deduzidos das labels
+FN<nome>/MAIN emitidas pelo CodeGen e o relatório por linha fica por instrução VM.
+"""
+
+from pathlib import Path
+
+from .vmcode import format_instruction
+
+
+def regions_from_labels(program):
+    '''[(nome, início, fim)] a partir das labels de entrada dos subprogramas.'''
+    starts = sorted((target, name[2:] if name.startswith('FN') else 'main')
+                    for name, target in program.labels
+                    if name.startswith('FN') or name == 'MAIN')
+    regions = []
+    for i, (start, name) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(program.code)
+        regions.append((name, start, end))
+    return regions
+
+
+def aggregate(keys, counts, times):
+    totals = {}
+    for key, count, ns in zip(keys, counts, times):
+        if count:
+            entry = totals.setdefault(key, [0, 0])
+            entry[0] += count
+            entry[1] += ns
+    return totals
+
+
+def report(program, counts, times, source_map=None, top=20):
+    '''Linhas de texto do relatório, ordenadas por tempo.'''
+    n = len(program.code)
+    regions = source_map.subprograms if source_map else regions_from_labels(program)
+    region_of = ['<start>'] * n
+    for name, start, end in regions:
+        for pc in range(start, min(end, n)):
+            region_of[pc] = name
+    total_count = sum(counts) or 1
+    total_ns = sum(times) or 1
+
+    source_lines = []
+    if source_map and source_map.source:
+        try:
+            source_lines = Path(source_map.source).read_text(encoding='utf-8').splitlines()
+        except OSError:
+            pass
+
+    out = [f'{total_count} instructions, {total_ns / 1e6:.1f} ms (profiling overhead included)', '']
+    out.append(f'{"subprogram":<20} {"instrs":>10} {"%":>6} {"time (ms)":>10} {"%":>6}')
+    by_region = aggregate(region_of, counts, times)
+    for name, (count, ns) in sorted(by_region.items(), key=lambda kv: -kv[1][1]):
+        out.append(f'{name:<20} {count:>10} {count / total_count * 100:>6.1f} '
+                   f'{ns / 1e6:>10.2f} {ns / total_ns * 100:>6.1f}')
+    out.append('')
+
+    if source_map:
+        by_line = aggregate(source_map.lines[:n], counts, times)
+        out.append(f'{"line":>6} {"instrs":>10} {"time (ms)":>10} {"%":>6}  source')
+        for line, (count, ns) in sorted(by_line.items(), key=lambda kv: -kv[1][1])[:top]:
+            text = source_lines[line - 1].strip() if line and 0 < line <= len(source_lines) else ''
+            label = line if line is not None else '-'
+            out.append(f'{label:>6} {count:>10} {ns / 1e6:>10.2f} {ns / total_ns * 100:>6.1f}  {text}')
+    else:
+        out.append(f'{"pc":>6} {"count":>10} {"time (ms)":>10} {"%":>6}  instruction')
+        hot = sorted((pc for pc in range(n) if counts[pc]), key=lambda pc: -times[pc])[:top]
+        for pc in hot:
+            op, arg = program.code[pc]
+            text = format_instruction(op, arg, program.label_refs.get(pc))
+            out.append(f'{pc:>6} {counts[pc]:>10} {times[pc] / 1e6:>10.2f} '
+                       f'{times[pc] / total_ns * 100:>6.1f}  {text}')
+    return out
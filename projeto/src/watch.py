@@ -0,0 +1,168 @@
+"""Modo watch: recompila ficheiros .pas alterados para os .vm correspondentes.
+
+Usa inotify (via ctypes, sem dependências externas) quando disponível e recorre a polling
+de mtimes caso contrário. As alterações são agrupadas com debounce e cada ficheiro tem o
+seu IncrementalCompiler, todos a partilhar o mesmo lexer/parser já construído.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from .incremental import IncrementalCompiler
+from .lexer import build_lexer
+from .parser import build_parser
+from .codegen_vm import DEFAULT_OPT_LEVEL
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    '''Observa diretorias com inotify; devolve os .pas tocados em cada espera.'''
+
+    def __init__(self, root):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        for dirpath, _, _ in os.walk(root):
+            self.add_dir(dirpath)
+
+    def add_dir(self, path):
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        self.dirs[wd] = path
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        pos = 0
+        while pos < len(data):
+            wd, mask, _cookie, length = EVENT.unpack_from(data, pos)
+            pos += EVENT.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            path = os.path.join(self.dirs.get(wd, ''), name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_dir(path)
+            elif name.endswith('.pas'):
+                changed.add(Path(path))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    '''Alternativa portátil: compara mtimes dos .pas a cada intervalo.'''
+
+    def __init__(self, root, interval=0.2):
+        self.root = Path(root)
+        self.interval = interval
+        self.mtimes = self.scan()
+
+    def scan(self):
+        mtimes = {}
+        for path in self.root.rglob('*.pas'):
+            try:
+                mtimes[path] = path.stat().st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return mtimes
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        current = self.scan()
+        changed = {p for p, m in current.items() if self.mtimes.get(p) != m}
+        self.mtimes = current
+        return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(root, polling=False):
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root)
+
+
+class Watcher:
+    def __init__(self, root, polling=False, debounce=0.05, out=sys.stderr, opt_level=DEFAULT_OPT_LEVEL):
+        self.root = Path(root)
+        self.opt_level = opt_level
+        self.debounce = debounce
+        self.out = out
+        self.watcher = make_watcher(self.root, polling)
+        # parser aquecido, partilhado por todos os ficheiros
+        self.lexer = build_lexer()
+        self.parser = build_parser()
+        self.compilers = {}
+
+    def rebuild(self, path):
+        compiler = self.compilers.get(path)
+        if compiler is None:
+            compiler = IncrementalCompiler(self.lexer, self.parser, self.opt_level)
+            self.compilers[path] = compiler
+        start = time.perf_counter()
+        try:
+            source = path.read_text(encoding='utf-8')
+            output = compiler.compile(source)
+        except FileNotFoundError:
+            self.compilers.pop(path, None)
+            return
+        except Exception as e:  # erro de compilação: reporta e continua a observar
+            print(f'{time.strftime("%H:%M:%S")} {path}: error: {e}', file=self.out, flush=True)
+            return
+        target = path.with_suffix('.vm')
+        target.write_text(output + '\n', encoding='utf-8')
+        elapsed = (time.perf_counter() - start) * 1000
+        total = compiler.reused + compiler.compiled
+        print(f'{time.strftime("%H:%M:%S")} {path} -> {target.name} in {elapsed:.1f} ms '
+              f'({compiler.reused}/{total} subprograms reused)', file=self.out, flush=True)
+
+    def run(self):
+        for path in sorted(self.root.rglob('*.pas')):
+            self.rebuild(path)
+        print(f'watching {self.root} ({type(self.watcher).__name__})', file=self.out, flush=True)
+        try:
+            while True:
+                changed = self.watcher.wait(1.0)
+                if not changed:
+                    continue
+                # debounce: junta eventos até haver uma pausa
+                while True:
+                    more = self.watcher.wait(self.debounce)
+                    if not more:
+                        break
+                    changed |= more
+                for path in sorted(changed):
+                    self.rebuild(path)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.watcher.close()